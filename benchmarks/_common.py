@@ -0,0 +1,142 @@
+"""
+Общие утилиты бенчмарков: запуск uvicorn с нужным окружением
+и простой нагрузочный клиент на httpx с подсчётом перцентилей.
+"""
+import asyncio
+import os
+import socket
+import subprocess  # nosec B404 - бенчмарк запускает локальный uvicorn
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import cycle
+from pathlib import Path
+from typing import Any, Iterator, Sequence, Union
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Запрос нагрузки: путь (GET) или (метод, путь, kwargs для httpx.request — json=, content=, headers=)
+Call = Union[str, tuple[str, str, dict[str, Any]]]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def run_server(env: dict[str, str] | None = None, workers: int = 1) -> Iterator[str]:
+    """Поднимает uvicorn src.main:app в отдельном процессе и ждёт /health."""
+    port = free_port()
+    proc = subprocess.Popen(  # nosec B603 - аргументы формируются здесь же
+        [
+            sys.executable, "-m", "uvicorn", "src.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=REPO_ROOT,
+        env={**os.environ, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(base_url + "/health", timeout=1).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[k]
+
+
+@dataclass
+class LoadResult:
+    requests: int
+    errors: int
+    seconds: float
+    latencies: list[float]
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def pct_ms(self, p: float) -> float:
+        return percentile(self.latencies, p) * 1000
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.rps, 1),
+            "p50_ms": round(self.pct_ms(50), 2),
+            "p95_ms": round(self.pct_ms(95), 2),
+            "p99_ms": round(self.pct_ms(99), 2),
+        }
+
+
+async def _load(base_url: str, paths: Sequence[Call], concurrency: int, total: int) -> LoadResult:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+    targets = cycle(paths)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                call = next(targets)
+                t0 = time.perf_counter()
+                try:
+                    if isinstance(call, str):
+                        r = await client.get(call)
+                    else:
+                        method, path, kwargs = call
+                        r = await client.request(method, path, **kwargs)
+                    ok = r.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return LoadResult(requests=len(latencies), errors=errors, seconds=elapsed, latencies=latencies)
+
+
+def run_load(base_url: str, paths: Sequence[Call], concurrency: int, total: int) -> LoadResult:
+    """Гоняет запросы по кругу из paths, держа concurrency запросов в полёте."""
+    return asyncio.run(_load(base_url, paths, concurrency, total))
+
+
+def format_table(rows: list[dict]) -> str:
+    if not rows:
+        return ""
+    headers = list(rows[0])
+    widths = [max(len(str(h)), *(len(str(r[h])) for r in rows)) for h in headers]
+    lines = ["  ".join(str(h).ljust(w) for h, w in zip(headers, widths))]
+    for r in rows:
+        lines.append("  ".join(str(r[h]).ljust(w) for h, w in zip(headers, widths)))
+    return "\n".join(lines)
@@ -0,0 +1,52 @@
+"""
+Сравнение DB_MODE=sync и DB_MODE=async под высокой конкуррентностью.
+
+Запуск (нужен PostgreSQL из docker-compose или локальный, DATABASE_URL):
+
+    python -m benchmarks.bench_db_modes --concurrency 200 --requests 20000
+
+Для каждого режима поднимается отдельный uvicorn, нагрузка — смесь
+GET /books/{id} и обеих OPS-ручек по засеянным данным.
+"""
+import argparse
+import json
+
+import httpx
+
+from benchmarks._common import format_table, run_load, run_server
+
+
+def _workload(base_url: str) -> list[str]:
+    branches = httpx.get(base_url + "/branches", params={"limit": 20}).json()
+    books = httpx.get(base_url + "/books", params={"limit": 20}).json()
+    paths = []
+    for branch in branches:
+        for book in books:
+            paths.append(f"/books/{book['id']}")
+            paths.append(f"/branches/{branch['id']}/books/{book['id']}/copies")
+            paths.append(f"/branches/{branch['id']}/books/{book['id']}/faculties")
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    rows = []
+    for mode in args.modes:
+        with run_server({"DB_MODE": mode}) as base_url:
+            paths = _workload(base_url)
+            run_load(base_url, paths, args.concurrency, args.warmup)
+            result = run_load(base_url, paths, args.concurrency, args.requests)
+        rows.append({"mode": mode, "concurrency": args.concurrency, **result.summary()})
+
+    print(json.dumps(rows, indent=2) if args.json else format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Пропускная способность в зависимости от размера пула соединений.
+
+    python -m benchmarks.bench_pool --sizes 1 2 5 10 20 --concurrency 64 --requests 5000
+    python -m benchmarks.bench_pool --sizes 5 --pre-ping both
+    python -m benchmarks.bench_pool --pgbouncer --null-pool   # DATABASE_URL указывает на PgBouncer
+
+Для каждого размера поднимается отдельный uvicorn с DB_POOL_SIZE=N и
+DB_MAX_OVERFLOW=0 (пул ровно N), ops-кэш выключен, чтобы каждый запрос
+доходил до БД. Кроме rps и перцентилей выводится среднее ожидание из
+/metrics: слота сессии в get_db (в sync-режиме очередь к пулу стоит
+там) и соединения из самого пула.
+"""
+import argparse
+import json
+import re
+
+import httpx
+
+from benchmarks._common import format_table, run_load, run_server
+
+
+# Среднее ожидание: слота сессии в get_db (sync-режим) и соединения из пула.
+WAIT_METRICS = {"db_session_wait_seconds": "slot_wait_ms", "db_pool_checkout_wait_seconds": "pool_wait_ms"}
+
+
+def _workload(base_url: str) -> list[str]:
+    branches = httpx.get(base_url + "/branches", params={"limit": 10}).json()
+    books = httpx.get(base_url + "/books", params={"limit": 20}).json()
+    paths = ["/circulation/top?limit=10"]
+    for book in books:
+        paths.append(f"/books/{book['id']}")
+        paths.append(f"/books/{book['id']}/availability")
+        for branch in branches:
+            paths.append(f"/branches/{branch['id']}/books/{book['id']}/copies")
+    return paths
+
+
+def _waits(base_url: str, metric: str) -> tuple[float, float]:
+    """(сумма, число) наблюдений гистограммы metric по всем меткам с начала работы сервера."""
+    text = httpx.get(base_url + "/metrics").text
+    total = count = 0.0
+    for name, value in re.findall(rf"^{metric}_(sum|count)(?:\{{[^}}]*\}})? (\S+)$", text, re.M):
+        if name == "sum":
+            total += float(value)
+        else:
+            count += float(value)
+    return total, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=300)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--pre-ping", choices=["on", "off", "both"], default="on")
+    parser.add_argument("--pgbouncer", action="store_true", help="DB_PGBOUNCER=1 (без prepared statements)")
+    parser.add_argument("--null-pool", action="store_true", help="DB_POOL=null; --sizes игнорируется")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    pre_pings = ["on", "off"] if args.pre_ping == "both" else [args.pre_ping]
+    sizes = [None] if args.null_pool else args.sizes
+
+    rows = []
+    for size in sizes:
+        for pre_ping in pre_pings:
+            env = {
+                "DB_MODE": args.mode,
+                "DB_POOL_PRE_PING": "1" if pre_ping == "on" else "0",
+                "DB_PGBOUNCER": "1" if args.pgbouncer else "0",
+                "DB_POOL": "null" if args.null_pool else "queue",
+                "OPS_CACHE_SIZE": "0",
+            }
+            if size is not None:
+                env.update(DB_POOL_SIZE=str(size), DB_MAX_OVERFLOW="0")
+            with run_server(env) as base_url:
+                paths = _workload(base_url)
+                run_load(base_url, paths, args.concurrency, args.warmup)
+                before = {m: _waits(base_url, m) for m in WAIT_METRICS}
+                result = run_load(base_url, paths, args.concurrency, args.requests)
+                after = {m: _waits(base_url, m) for m in WAIT_METRICS}
+            rows.append({"pool": "null" if size is None else size, "pre_ping": pre_ping, **result.summary()})
+            for metric, column in WAIT_METRICS.items():
+                n = after[metric][1] - before[metric][1]
+                rows[-1][column] = round((after[metric][0] - before[metric][0]) / n * 1000, 2) if n else 0.0
+
+    print(json.dumps(rows, indent=2) if args.json else format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Сериализация списка книг: штатный путь FastAPI против src.serialization.
+
+    python -m benchmarks.bench_serialization --rows 500 10000 --repeat 50
+
+БД не нужна: строки собираются в памяти в том же виде, что отдаёт
+db.execute(select(...)).all().
+
+- fastapi — Pydantic-объект на строку (как было в list_books) и
+  serialize_response по response_model=List[Book];
+- dicts+orjson — rows_to_dicts и orjson (текущий путь);
+- dicts+json — то же с json из stdlib (если orjson не установлен).
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi._compat import ModelField
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from benchmarks._common import format_table, percentile
+from src import serialization
+from src.schemas import Book
+
+
+def _rows(n: int):
+    values = ((i, f"Книга {i}", f"Автор {i % 97}", 1900 + i % 120) for i in range(1, n + 1))
+    return IteratorResult(SimpleResultMetaData(["id", "title", "author", "year"]), values).all()
+
+
+def _fastapi(rows, field: ModelField) -> bytes:
+    content = [Book(id=r.id, title=r.title, author=r.author, year=r.year) for r in rows]
+    return asyncio.run(serialize_response(field=field, response_content=content, dump_json=True))
+
+
+def _stdlib(rows) -> bytes:
+    return json.dumps(serialization.rows_to_dicts(rows, Book), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 10000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    field = create_model_field(name="Response_list_books", type_=List[Book], mode="serialization")
+    paths = {"fastapi": lambda rows: _fastapi(rows, field), "dicts+json": _stdlib}
+    if serialization.orjson is not None:
+        paths["dicts+orjson"] = lambda rows: serialization.dumps(serialization.rows_to_dicts(rows, Book))
+
+    results = []
+    for n in args.rows:
+        rows = _rows(n)
+        bodies = {name: fn(rows) for name, fn in paths.items()}
+        if len(set(bodies.values())) != 1:
+            raise SystemExit("тела ответов различаются")
+        for name, fn in paths.items():
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                fn(rows)
+                timings.append(time.perf_counter() - t0)
+            results.append({
+                "rows": n,
+                "path": name,
+                "p50_ms": round(percentile(timings, 50) * 1000, 2),
+                "p95_ms": round(percentile(timings, 95) * 1000, 2),
+                "bytes": len(bodies[name]),
+            })
+
+    print(json.dumps(results, indent=2) if args.json else format_table(results))
+
+
+if __name__ == "__main__":
+    main()
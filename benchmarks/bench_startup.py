@@ -0,0 +1,74 @@
+"""
+Время старта: подготовка БД (ensure_schema + seed_data) и готовность
+uvicorn с несколькими воркерами.
+
+Запуск (нужен PostgreSQL, DATABASE_URL):
+
+    python -m benchmarks.bench_startup --repeat 20 --workers 1 4 8
+
+in-process — вызовы on_startup() подряд в одном процессе: число
+SQL-запросов и время (первый вызов включает установку соединения).
+uvicorn — от запуска процесса до первого успешного GET /health.
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks._common import format_table, percentile, run_server
+
+
+def _in_process(repeat: int) -> list[dict]:
+    from src import main
+
+    statements = 0
+
+    def _count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(Engine, "before_cursor_execute", _count)
+    timings, counts = [], []
+    try:
+        for _ in range(repeat):
+            statements = 0
+            t0 = time.perf_counter()
+            main.on_startup()
+            timings.append(time.perf_counter() - t0)
+            counts.append(statements)
+    finally:
+        event.remove(Engine, "before_cursor_execute", _count)
+
+    warm = timings[1:] or timings
+    return [
+        {"case": "on_startup (первый)", "statements": counts[0], "ms": round(timings[0] * 1000, 2)},
+        {
+            "case": "on_startup (p50 повторных)",
+            "statements": max(counts[1:] or counts),
+            "ms": round(percentile(warm, 50) * 1000, 2),
+        },
+    ]
+
+
+def _uvicorn(workers: int) -> dict:
+    t0 = time.perf_counter()
+    with run_server(workers=workers):
+        ready = time.perf_counter() - t0
+    return {"case": f"uvicorn --workers {workers}", "statements": "", "ms": round(ready * 1000, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4])
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    rows = _in_process(args.repeat) + [_uvicorn(w) for w in args.workers]
+    print(json.dumps(rows, indent=2, ensure_ascii=False) if args.json else format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Хранение результатов бенчмарков и сравнение между коммитами.
+
+Каждый прогон bench_api пишет JSON в benchmarks/results/ (каталог
+в .gitignore и переживает git checkout): коммит, признак незакоммиченных
+изменений, параметры, объём данных и строки по сценариям.
+
+    python -m benchmarks.history list
+    python -m benchmarks.history compare                  # два последних прогона
+    python -m benchmarks.history compare OLD.json NEW.json
+"""
+import argparse
+import json
+import subprocess  # nosec B404 - только git rev-parse / status
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks._common import REPO_ROOT, format_table
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def save_run(name: str, params: dict, dataset: dict, rows: list[dict], directory: Path = RESULTS_DIR) -> Path:
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    now = datetime.now(timezone.utc)
+    run = {
+        "benchmark": name,
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": now.isoformat(timespec="seconds"),
+        "params": params,
+        "dataset": dataset,
+        "results": rows,
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{now:%Y%m%dT%H%M%S}-{name}-{commit}.json"
+    path.write_text(json.dumps(run, indent=2, ensure_ascii=False))
+    return path
+
+
+def load_run(path: Path) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def _runs(directory: Path = RESULTS_DIR) -> list[Path]:
+    return sorted(directory.glob("*.json"))
+
+
+def _change(old: float, new: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "-"
+
+
+def _key(row: dict) -> str:
+    return f"{row['mode']}/{row['scenario']}" if "mode" in row else row["scenario"]
+
+
+def compare(old: dict, new: dict) -> list[dict]:
+    """Строки по сценариям, общим для обоих прогонов: rps и p95/p99 до и после."""
+    before = {_key(row): row for row in old["results"]}
+    rows = []
+    for row in new["results"]:
+        prev = before.get(_key(row))
+        if prev is None:
+            continue
+        rows.append({
+            "scenario": _key(row),
+            "rps": f"{prev['rps']} -> {row['rps']}",
+            "rps_change": _change(prev["rps"], row["rps"]),
+            "p95_ms": f"{prev['p95_ms']} -> {row['p95_ms']}",
+            "p95_change": _change(prev["p95_ms"], row["p95_ms"]),
+            "p99_ms": f"{prev['p99_ms']} -> {row['p99_ms']}",
+            "errors": f"{prev['errors']} -> {row['errors']}",
+        })
+    return rows
+
+
+def _label(run: dict) -> str:
+    return f"{run['commit']}{'+dirty' if run['dirty'] else ''} ({run['created_at']})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    cmp = sub.add_parser("compare")
+    cmp.add_argument("runs", nargs="*", type=Path, help="старый и новый JSON; по умолчанию два последних")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        rows = []
+        for path in _runs():
+            run = load_run(path)
+            rows.append({"file": path.name, "benchmark": run["benchmark"], "commit": _label(run)})
+        print(format_table(rows))
+        return
+
+    paths = args.runs or _runs()[-2:]
+    if len(paths) != 2:
+        parser.error("нужно два прогона")
+    old, new = (load_run(p) for p in paths)
+    print(f"{_label(old)} -> {_label(new)}")
+    for what in ("params", "dataset"):
+        if old[what] != new[what]:
+            print(f"ВНИМАНИЕ: {what} различаются: {old[what]} -> {new[what]}")
+    print(format_table(compare(old, new)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Допуск запросов (admission control) и сброс нагрузки.
+
+Когда БД тормозит, запросы копятся в threadpool и в очереди к пулу
+соединений, пока не начнут отваливаться по таймауту все подряд. Здесь
+у каждого класса маршрутов свой лимит одновременно выполняемых запросов
+и ограниченная очередь:
+
+- read  — дешёвые чтения (карточка книги, филиала, выдача, поиск);
+- ops   — OPS-чтения (экземпляры, факультеты, доступность, их batch);
+- write — запись;
+- bulk  — списки, экспорт, импорт: их режем первыми.
+
+/health, /metrics и /cache/stats не ограничиваются. Свободный слот —
+запрос идёт сразу; иначе ждёт в очереди не дольше ADMISSION_QUEUE_TIMEOUT;
+очередь полна или время вышло — сразу 503 с Retry-After. Отдельные лимиты
+и есть приоритет: сколько бы ни пришло списков, запись и health получают
+свои слоты и потоки.
+
+Включается ADMISSION_ENABLED=1 (по умолчанию выключено: лимиты по
+умолчанию не знают ни размера пула, ни числа воркеров — их подбирают под
+развёртывание). Настройки: ADMISSION_<CLASS>_LIMIT / _QUEUE
+(CLASS — READ, OPS, WRITE, BULK), ADMISSION_QUEUE_TIMEOUT,
+ADMISSION_RETRY_AFTER. В sync-режиме сумма лимитов должна быть меньше
+threadpool AnyIO (40 потоков), иначе очередь снова окажется в нём.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match, Router
+
+from src.metrics import ADMISSION, ADMISSION_WAIT
+
+READ = "read"
+OPS = "ops"
+WRITE = "write"
+BULK = "bulk"
+
+READ_METHODS = ("GET", "HEAD")
+
+EXEMPT_PATHS = {"/health", "/metrics", "/cache/stats", "/changes"}
+OPS_PATHS = {
+    "/branches/{branch_id}/books/{book_id}/copies",
+    "/copies/batch",
+    "/branches/{branch_id}/books/{book_id}/faculties",
+    "/branches/{branch_id}/books/faculties/batch",
+    "/books/{book_id}/availability",
+    "/books/availability/batch",
+}
+BULK_ROUTES = {
+    ("GET", "/books"),
+    ("GET", "/branches"),
+    ("GET", "/faculties"),
+    ("GET", "/faculties/{faculty_id}/books"),
+    ("GET", "/branches/{branch_id}/books/faculties"),
+    ("GET", "/export/{name}"),
+    ("POST", "/books/import"),
+}
+
+# (лимит, очередь) по умолчанию: сумма лимитов < 40 потоков threadpool,
+# очереди записи и OPS длиннее — их сбрасываем последними
+DEFAULT_LIMITS = {READ: (12, 128), OPS: (12, 256), WRITE: (8, 256), BULK: (4, 16)}
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "0").strip().lower() not in ("0", "false", "no")
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+
+def route_class(method: str, path: str) -> str | None:
+    """Класс маршрута по методу и шаблону пути; None — не ограничивать."""
+    if path in EXEMPT_PATHS:
+        return None
+    if path in OPS_PATHS:
+        return OPS
+    if (method, path) in BULK_ROUTES:
+        return BULK
+    return READ if method in READ_METHODS else WRITE
+
+
+class Limiter:
+    """Не больше limit одновременно, не больше queue ждущих (FIFO), ожидание не дольше timeout."""
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """True — слот получен (вернуть через release), False — запрос надо сбросить."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            ADMISSION.inc(1, self.name, "admitted")
+            return True
+        if len(self._waiters) >= self.queue:
+            ADMISSION.inc(1, self.name, "rejected")
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        started = time.perf_counter()
+        try:
+            # wait, а не wait_for: future не отменяется, и слот, выданный
+            # одновременно с таймаутом, не теряется
+            await asyncio.wait([future], timeout=self.timeout)
+        except asyncio.CancelledError:
+            # клиент ушёл, пока ждал
+            if future.done():
+                self.release()
+            else:
+                self._waiters.remove(future)
+                future.cancel()
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - started, self.name)
+        if future.done():
+            ADMISSION.inc(1, self.name, "queued")
+            return True
+        self._waiters.remove(future)
+        future.cancel()
+        ADMISSION.inc(1, self.name, "timeout")
+        return False
+
+    def release(self) -> None:
+        # слот переходит первому ждущему, active не меняется
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "queue": self.queue, "active": self.active, "waiting": self.waiting}
+
+
+def _from_env(name: str) -> Limiter:
+    limit, queue = DEFAULT_LIMITS[name]
+    prefix = f"ADMISSION_{name.upper()}_"
+    return Limiter(name, int(os.getenv(prefix + "LIMIT", limit)), int(os.getenv(prefix + "QUEUE", queue)))
+
+
+limiters: dict[str, Limiter] = {name: _from_env(name) for name in DEFAULT_LIMITS}
+
+
+class AdmissionMiddleware:
+    """
+    Чистый ASGI. Маршрут ищется по router.routes (роутер потом сопоставит
+    его ещё раз — это десятки регулярок на запрос).
+    """
+
+    def __init__(self, app, router: Router):
+        self.app = app
+        self.router = router
+
+    def _route(self, scope):
+        partial = None
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                return route
+            if match is Match.PARTIAL and partial is None:
+                partial = route
+        return partial
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        name = route_class(scope["method"], getattr(route, "path", "")) if route is not None else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[name]
+        if not await limiter.acquire():
+            # для MetricsMiddleware: сброшенный запрос учитывается по своему маршруту
+            scope["route"] = route
+            response = JSONResponse(
+                {"detail": "Сервер перегружен, повторите запрос позже"},
+                status_code=503,
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,311 @@
+"""
+Async-версии CRUD- и OPS-эндпоинтов для DB_MODE=async.
+
+Маршруты и схемы те же, что в src/main.py, и тела те же — из src.service:
+обработчик-корутина вызывает их через AsyncSession.run_sync, то есть в
+greenlet поверх async-драйвера. Запрос, ожидающий БД, не занимает поток из
+threadpool FastAPI, поэтому число одновременных запросов на воркер ограничено
+пулом соединений, а не размером threadpool.
+"""
+from typing import List
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src import etags, queries, repository, search, service
+from src.cache import COPIES, FACULTIES, ops_aflight, ops_cache
+from src.db import get_async_db
+from src.pagination import MAX_PAGE_LIMIT
+from src.schemas import (
+    Book,
+    BookAvailability,
+    BookAvailabilityBatchResponse,
+    BookBase,
+    BookCirculation,
+    BookFacultiesBatchResponse,
+    BookFacultiesResponse,
+    BookFacultyLinksRequest,
+    BookFacultyLinksResponse,
+    BookIdsRequest,
+    BookSearchHit,
+    Branch,
+    BranchBase,
+    BranchBookInfo,
+    CirculationStats,
+    CirculationTopItem,
+    CopiesBatchRequest,
+    CopiesBatchResponse,
+    Faculty,
+    FacultyBook,
+    Loan,
+    LoanCreate,
+)
+from src.streaming import aiter_ndjson
+
+router = APIRouter()
+
+
+def _ndjson_response(table: str, after_id: int | None, limit: int | None) -> StreamingResponse:
+    """Каталог в памяти отдаёт поток сам, PostgreSQL — через async-движок."""
+    if repository.CATALOG_BACKEND == "memory":
+        chunks = repository.memory_catalog.stream(table, after_id, limit)
+    else:
+        stmt = queries.PAGES[table](after_id)
+        chunks = aiter_ndjson(stmt if limit is None else stmt.limit(limit))
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+
+# ==========================
+# BOOKS
+# ==========================
+
+@router.get("/books", response_model=List[Book], dependencies=[Depends(etags.aconditional(etags.BOOKS))])
+async def list_books(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if stream:
+        return _ndjson_response("books", after_id, limit)
+    return await db.run_sync(service.list_books, response, after_id, limit)
+
+
+@router.get("/books/search", response_model=List[BookSearchHit])
+async def search_books(
+    response: Response,
+    q: str = Query(min_length=1, max_length=search.MAX_QUERY_LENGTH),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = Query(None, pattern=search.CURSOR_PATTERN),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.search_books, response, q, limit, cursor)
+
+
+@router.get("/books/{book_id}", response_model=Book, dependencies=[Depends(etags.aconditional(etags.BOOKS))])
+async def get_book(book_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.get_book, book_id)
+
+
+@router.post("/books", response_model=Book, status_code=201)
+async def create_book(data: BookBase, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.create_book, data)
+
+
+@router.put("/books/{book_id}", response_model=Book)
+async def update_book(book_id: int, data: BookBase, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.update_book, book_id, data)
+
+
+# ==========================
+# BRANCHES
+# ==========================
+
+@router.get(
+    "/branches", response_model=List[Branch], dependencies=[Depends(etags.aconditional(etags.BRANCHES))]
+)
+async def list_branches(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if stream:
+        return _ndjson_response("branches", after_id, limit)
+    return await db.run_sync(service.list_branches, response, after_id, limit)
+
+
+@router.get(
+    "/branches/{branch_id}", response_model=Branch, dependencies=[Depends(etags.aconditional(etags.BRANCHES))]
+)
+async def get_branch(branch_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.get_branch, branch_id)
+
+
+@router.post("/branches", response_model=Branch, status_code=201)
+async def create_branch(data: BranchBase, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.create_branch, data)
+
+
+@router.put("/branches/{branch_id}", response_model=Branch)
+async def update_branch(branch_id: int, data: BranchBase, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.update_branch, branch_id, data)
+
+
+# ==========================
+# FACULTIES
+# ==========================
+
+@router.get(
+    "/faculties", response_model=List[Faculty], dependencies=[Depends(etags.aconditional(etags.FACULTIES))]
+)
+async def list_faculties(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if stream:
+        return _ndjson_response("faculties", after_id, limit)
+    return await db.run_sync(service.list_faculties, response, after_id, limit)
+
+
+@router.get("/faculties/{faculty_id}/books", response_model=List[FacultyBook])
+async def list_faculty_books(
+    faculty_id: int,
+    response: Response,
+    branch_id: int | None = Query(None, ge=0),
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.list_faculty_books, response, faculty_id, branch_id, after_id, limit)
+
+
+# ==========================
+# OPS (ТЗ)
+# ==========================
+
+BRANCH_BOOK_FACULTIES_TABLES = (etags.BRANCHES, etags.STOCK, etags.BOOK_FACULTIES, etags.FACULTIES)
+
+
+async def _ops_cached(db: AsyncSession, kind: str, branch_id: int, book_id: int, load) -> tuple:
+    """Как _ops_cached в src.main, но промахи сводит ops_aflight."""
+    key = (kind, branch_id, book_id)
+    cached = ops_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = ops_cache.generation
+
+    async def fill():
+        result = await db.run_sync(load, branch_id, book_id)
+        ops_cache.set(key, result, generation)
+        return result
+
+    return await ops_aflight.do((*key, generation), fill)
+
+
+@router.get("/branches/{branch_id}/books/{book_id}/copies", response_model=BranchBookInfo)
+async def get_copies_in_branch(
+    branch_id: int, book_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+):
+    info, etag = await _ops_cached(db, COPIES, branch_id, book_id, service.copies)
+    etags.respond(request, response, etag)
+    return info
+
+
+@router.post("/copies/batch", response_model=CopiesBatchResponse)
+async def get_copies_batch(data: CopiesBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.copies_batch, data)
+
+
+@router.get("/branches/{branch_id}/books/{book_id}/faculties", response_model=BookFacultiesResponse)
+async def get_book_faculties(
+    branch_id: int, book_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+):
+    result, etag = await _ops_cached(db, FACULTIES, branch_id, book_id, service.book_faculties)
+    etags.respond(request, response, etag)
+    return result
+
+
+@router.get(
+    "/branches/{branch_id}/books/faculties",
+    response_model=List[BookFacultiesResponse],
+    dependencies=[Depends(etags.aconditional(*BRANCH_BOOK_FACULTIES_TABLES))],
+)
+async def list_branch_book_faculties(
+    branch_id: int,
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.list_branch_book_faculties, response, branch_id, after_id, limit)
+
+
+@router.post("/branches/{branch_id}/books/faculties/batch", response_model=BookFacultiesBatchResponse)
+async def get_book_faculties_batch(branch_id: int, data: BookIdsRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.book_faculties_batch, branch_id, data)
+
+
+@router.post("/branches/{branch_id}/books/{book_id}/faculties/{faculty_id}", response_model=BookFacultiesResponse)
+async def add_book_faculty(branch_id: int, book_id: int, faculty_id: int, db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(service.add_book_faculty, branch_id, book_id, faculty_id)
+    return (await _ops_cached(db, FACULTIES, branch_id, book_id, service.book_faculties))[0]
+
+
+@router.post("/book-faculties/batch", response_model=BookFacultyLinksResponse)
+async def add_book_faculties(data: BookFacultyLinksRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.add_book_faculties, data)
+
+
+@router.post("/book-faculties/batch/delete", response_model=BookFacultyLinksResponse)
+async def remove_book_faculties(data: BookFacultyLinksRequest, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.remove_book_faculties, data)
+
+
+# ==========================
+# LOANS
+# ==========================
+
+@router.post("/branches/{branch_id}/books/{book_id}/checkout", response_model=Loan, status_code=201)
+async def checkout_book(branch_id: int, book_id: int, data: LoanCreate, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.checkout_book, branch_id, book_id, data)
+
+
+@router.post("/loans/{loan_id}/checkin", response_model=Loan)
+async def checkin_book(loan_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.checkin_book, loan_id)
+
+
+@router.get("/loans/{loan_id}", response_model=Loan)
+async def get_loan(loan_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.get_loan, loan_id)
+
+
+# ==========================
+# CIRCULATION
+# ==========================
+
+@router.get("/books/{book_id}/circulation", response_model=BookCirculation)
+async def get_book_circulation(book_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.book_circulation, book_id)
+
+
+@router.get("/branches/{branch_id}/circulation", response_model=List[CirculationStats])
+async def list_branch_circulation(
+    branch_id: int,
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.list_branch_circulation, response, branch_id, after_id, limit)
+
+
+@router.get("/circulation/top", response_model=List[CirculationTopItem])
+async def get_circulation_top(
+    limit: int = Query(10, ge=1, le=100),
+    by: str = Query("loans", pattern="^(loans|students)$"),
+    branch_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.circulation_top, limit, by, branch_id)
+
+
+# ==========================
+# AVAILABILITY
+# ==========================
+
+@router.get("/books/{book_id}/availability", response_model=BookAvailability)
+async def get_book_availability(book_id: int, branches: bool = True, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.book_availability, book_id, branches)
+
+
+@router.post("/books/availability/batch", response_model=BookAvailabilityBatchResponse)
+async def get_books_availability(data: BookIdsRequest, branches: bool = True, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(service.books_availability, data, branches)
@@ -0,0 +1,265 @@
+"""
+Подготовка БД при старте воркера: схема и сиды.
+
+Схема: отпечаток DDL (sha256 от CREATE TABLE/INDEX по метаданным моделей
+плюс EXTRA_DDL) хранится в таблице schema_version. Если он совпадает, старт
+обходится одним SELECT; иначе схема создаётся под advisory lock, и из многих
+одновременно стартующих воркеров DDL выполняет только первый.
+
+Сиды: несколько set-based запросов (INSERT ... ON CONFLICT / NOT EXISTS по
+массивам значений) в одной транзакции под тем же advisory lock, вместо
+SELECT на каждую строку.
+"""
+import hashlib
+from typing import Sequence
+
+from sqlalchemy import Column, DateTime, Engine, Integer, MetaData, String, Table, func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from src.models import Base
+from src.search import SEARCH_DDL
+
+# Идемпотентный DDL, который create_all не покрывает (индексы-выражения,
+# триггеры, расширения). Входит в отпечаток схемы.
+# Части сводки book_availability_shards на книгу: выдачи одной книги в разных
+# филиалах обновляют разные строки, чтение суммирует не больше стольких строк.
+AVAILABILITY_SHARDS = 16
+
+# Пересчёт сводки с нуля; SHARE-блокировка не даёт параллельным записям
+# в branch_stock проскочить между снимком и вставкой. Части без фонда
+# (и с устаревшим разбиением) уходят вместе с DELETE.
+AVAILABILITY_RECOMPUTE: list[str] = [
+    "LOCK TABLE branch_stock IN SHARE MODE",
+    "DELETE FROM book_availability_shards",
+    f"""
+    INSERT INTO book_availability_shards (book_id, shard, total_copies, branch_count)
+    SELECT book_id, branch_id % {AVAILABILITY_SHARDS}, SUM(copies), COUNT(*) FILTER (WHERE copies > 0)
+    FROM branch_stock
+    GROUP BY 1, 2
+    """,  # nosec B608: подставляется только константа модуля
+]
+
+# Идемпотентный DDL, который create_all не покрывает (индексы-выражения,
+# триггеры, расширения). Входит в отпечаток схемы.
+EXTRA_DDL: list[str] = [
+    # Сводка до разбиения на части: одна строка на книгу, которую блокировала
+    # каждая выдача этой книги в любом филиале.
+    "DROP TABLE IF EXISTS book_availability",
+    # book_availability_shards: сумма copies и число филиалов с copies > 0 по
+    # (книга, branch_id % AVAILABILITY_SHARDS). Триггер применяет к части
+    # дельту каждой изменённой строки branch_stock: запись — +1 UPDATE по ключу,
+    # чтение итога — сумма не больше AVAILABILITY_SHARDS строк по индексу.
+    # TRUNCATE branch_stock сводку не трогает.
+    f"""
+    CREATE OR REPLACE FUNCTION book_availability_apply() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.book_id = NEW.book_id
+                AND OLD.branch_id % {AVAILABILITY_SHARDS} = NEW.branch_id % {AVAILABILITY_SHARDS} THEN
+            UPDATE book_availability_shards
+            SET total_copies = total_copies + NEW.copies - OLD.copies,
+                branch_count = branch_count + (NEW.copies > 0)::int - (OLD.copies > 0)::int
+            WHERE book_id = NEW.book_id AND shard = NEW.branch_id % {AVAILABILITY_SHARDS};
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE book_availability_shards
+            SET total_copies = total_copies - OLD.copies,
+                branch_count = branch_count - (OLD.copies > 0)::int
+            WHERE book_id = OLD.book_id AND shard = OLD.branch_id % {AVAILABILITY_SHARDS};
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            INSERT INTO book_availability_shards (book_id, shard, total_copies, branch_count)
+            VALUES (NEW.book_id, NEW.branch_id % {AVAILABILITY_SHARDS}, NEW.copies, (NEW.copies > 0)::int)
+            ON CONFLICT (book_id, shard) DO UPDATE
+            SET total_copies = book_availability_shards.total_copies + EXCLUDED.total_copies,
+                branch_count = book_availability_shards.branch_count + EXCLUDED.branch_count;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,  # nosec B608: подставляется только константа модуля
+    """
+    CREATE OR REPLACE TRIGGER branch_stock_availability
+    AFTER INSERT OR DELETE OR UPDATE OF copies, book_id, branch_id ON branch_stock
+    FOR EACH ROW EXECUTE FUNCTION book_availability_apply()
+    """,
+    *AVAILABILITY_RECOMPUTE,
+    *SEARCH_DDL,
+]
+
+_BOOTSTRAP_LOCK_KEY = 0x626F6F74  # "boot"
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("version", String(64), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+
+def schema_fingerprint(metadata: MetaData = Base.metadata, extra_ddl: Sequence[str] = ()) -> str:
+    dialect = postgresql.dialect()
+    parts = []
+    for table in metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=dialect)))
+        parts.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes)
+    parts.extend(extra_ddl)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _current_version(conn) -> str | None:
+    if conn.scalar(text("SELECT to_regclass('schema_version')")) is None:
+        return None
+    return conn.scalar(select(schema_version.c.version).where(schema_version.c.id == 1))
+
+
+def ensure_schema(engine: Engine, metadata: MetaData = Base.metadata, extra_ddl: Sequence[str] | None = None) -> bool:
+    """Создаёт схему, если записанная версия не совпадает. True — DDL выполнялся."""
+    extra_ddl = EXTRA_DDL if extra_ddl is None else extra_ddl
+    version = schema_fingerprint(metadata, extra_ddl)
+
+    with engine.connect() as conn:
+        if _current_version(conn) == version:
+            return False
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BOOTSTRAP_LOCK_KEY})
+        # пока ждали lock, схему мог создать другой воркер
+        if _current_version(conn) == version:
+            return False
+        metadata.create_all(conn)
+        # create_all пропускает существующие таблицы целиком, включая новые индексы
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        for ddl in extra_ddl:
+            conn.execute(text(ddl))
+        schema_version.create(conn, checkfirst=True)
+        stmt = insert(schema_version).values(id=1, version=version)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[schema_version.c.id],
+                set_={"version": stmt.excluded.version, "applied_at": func.now()},
+            )
+        )
+    return True
+
+
+# ==========================
+# SEED
+# ==========================
+
+# Ключ у филиалов и факультетов — name, у книг — title (уникальных индексов
+# на них нет, поэтому «вставить, если нет» через NOT EXISTS под advisory lock).
+_SEED_BRANCHES = text(
+    """
+    WITH v AS (
+        SELECT * FROM unnest(CAST(:names AS text[]), CAST(:addresses AS text[])) AS v(name, address)
+    ),
+    upd AS (
+        UPDATE branches AS b
+        SET address = v.address
+        FROM v
+        WHERE b.name = v.name
+          AND v.address IS NOT NULL
+          AND b.address IS DISTINCT FROM v.address
+    )
+    INSERT INTO branches (name, address)
+    SELECT v.name, v.address FROM v
+    WHERE NOT EXISTS (SELECT 1 FROM branches AS b WHERE b.name = v.name)
+    """
+)
+
+_SEED_BOOKS = text(
+    """
+    WITH v AS (
+        SELECT * FROM unnest(CAST(:titles AS text[]), CAST(:authors AS text[]), CAST(:years AS integer[]))
+            AS v(title, author, year)
+    ),
+    upd AS (
+        UPDATE books AS b
+        SET author = v.author, year = v.year
+        FROM v
+        WHERE b.title = v.title
+          AND (b.author IS DISTINCT FROM v.author OR b.year IS DISTINCT FROM v.year)
+    )
+    INSERT INTO books (title, author, year)
+    SELECT v.title, v.author, v.year FROM v
+    WHERE NOT EXISTS (SELECT 1 FROM books AS b WHERE b.title = v.title)
+    """
+)
+
+_SEED_FACULTIES = text(
+    """
+    INSERT INTO faculties (name)
+    SELECT v.name FROM unnest(CAST(:names AS text[])) AS v(name)
+    WHERE NOT EXISTS (SELECT 1 FROM faculties AS f WHERE f.name = v.name)
+    """
+)
+
+# Если имя встречается несколько раз, берётся запись с наименьшим id.
+# Существующий фонд не трогается: copies меняют выдачи и возвраты (loans),
+# и перезапуск не должен сбрасывать их к посевному значению.
+_SEED_STOCK = text(
+    """
+    INSERT INTO branch_stock (branch_id, book_id, copies)
+    SELECT br.id, bk.id, v.copies
+    FROM unnest(CAST(:branches AS text[]), CAST(:titles AS text[]), CAST(:copies AS integer[]))
+        AS v(branch, title, copies)
+    CROSS JOIN LATERAL (SELECT id FROM branches WHERE name = v.branch ORDER BY id LIMIT 1) AS br
+    CROSS JOIN LATERAL (SELECT id FROM books WHERE title = v.title ORDER BY id LIMIT 1) AS bk
+    ON CONFLICT (branch_id, book_id) DO NOTHING
+    """
+)
+
+_SEED_BOOK_FACULTIES = text(
+    """
+    INSERT INTO book_faculties (branch_id, book_id, faculty_id)
+    SELECT br.id, bk.id, f.id
+    FROM unnest(CAST(:branches AS text[]), CAST(:titles AS text[]), CAST(:faculties AS text[]))
+        AS v(branch, title, faculty)
+    CROSS JOIN LATERAL (SELECT id FROM branches WHERE name = v.branch ORDER BY id LIMIT 1) AS br
+    CROSS JOIN LATERAL (SELECT id FROM books WHERE title = v.title ORDER BY id LIMIT 1) AS bk
+    CROSS JOIN LATERAL (SELECT id FROM faculties WHERE name = v.faculty ORDER BY id LIMIT 1) AS f
+    ON CONFLICT DO NOTHING
+    """
+)
+
+
+def seed_catalog(
+    db: Session,
+    *,
+    branches: Sequence[tuple[str, str | None]] = (),
+    books: Sequence[tuple[str, str, int | None]] = (),
+    faculties: Sequence[str] = (),
+    stock: Sequence[tuple[str, str, int]] = (),
+    book_faculties: Sequence[tuple[str, str, str]] = (),
+) -> None:
+    """
+    Идемпотентно досеивает справочники. Связи задаются именами:
+    stock — (филиал, название книги, copies), book_faculties — (филиал, книга, факультет).
+    Коммит — за вызывающим.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BOOTSTRAP_LOCK_KEY})
+    if branches:
+        names, addresses = zip(*branches)
+        db.execute(_SEED_BRANCHES, {"names": list(names), "addresses": list(addresses)})
+    if books:
+        titles, authors, years = zip(*books)
+        db.execute(_SEED_BOOKS, {"titles": list(titles), "authors": list(authors), "years": list(years)})
+    if faculties:
+        db.execute(_SEED_FACULTIES, {"names": list(faculties)})
+    if stock:
+        branch_names, titles, copies = zip(*stock)
+        db.execute(_SEED_STOCK, {"branches": list(branch_names), "titles": list(titles), "copies": list(copies)})
+    if book_faculties:
+        branch_names, titles, faculty_names = zip(*book_faculties)
+        db.execute(
+            _SEED_BOOK_FACULTIES,
+            {"branches": list(branch_names), "titles": list(titles), "faculties": list(faculty_names)},
+        )
@@ -0,0 +1,233 @@
+"""
+Массовая загрузка книг (CSV или NDJSON) через COPY ... FROM STDIN.
+
+Строки читаются потоком, проверяются пачками по IMPORT_BATCH_SIZE и пачкой же
+уходят через COPY во временную staging-таблицу. В конце staging одним запросом
+сливается в books: книга с тем же (title, author) обновляет год, новая —
+вставляется. Всё происходит в одной транзакции, поэтому при ошибке БД
+не остаётся полузагруженного списка. В памяти живёт не больше одной пачки
+и не больше MAX_REPORTED_ERRORS описаний отклонённых строк.
+
+CLI:
+    python -m src.bulk_import books.csv
+    python -m src.bulk_import books.ndjson --format ndjson
+"""
+import argparse
+import codecs
+import csv
+import json
+import sys
+from typing import Iterable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src import changes, etags
+from src.db import SessionLocal
+from src.schemas import BookBase, BookImportError, BookImportReport
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "ndjson")
+
+TEXT_LIMIT = 255  # String(255) у books.title / books.author
+
+# Две параллельные загрузки могли бы вставить одну и ту же книгу дважды.
+# Блокировка берётся только на слияние: чтение тела и COPY в staging идут параллельно.
+_IMPORT_LOCK_KEY = 0x626F6F6B  # "book"
+
+_CREATE_STAGING = text(
+    """
+    CREATE TEMP TABLE books_import_staging (
+        line integer NOT NULL,
+        title varchar(255) NOT NULL,
+        author varchar(255) NOT NULL,
+        year integer
+    ) ON COMMIT DROP
+    """
+)
+
+# Дубликаты внутри файла схлопываются: побеждает последняя строка.
+_MERGE = text(
+    """
+    WITH src AS (
+        SELECT DISTINCT ON (title, author) title, author, year
+        FROM books_import_staging
+        ORDER BY title, author, line DESC
+    ),
+    upd AS (
+        UPDATE books AS b
+        SET year = src.year
+        FROM src
+        WHERE b.title = src.title
+          AND b.author = src.author
+          AND b.year IS DISTINCT FROM src.year
+        RETURNING b.id
+    ),
+    ins AS (
+        INSERT INTO books (title, author, year)
+        SELECT src.title, src.author, src.year
+        FROM src
+        WHERE NOT EXISTS (
+            SELECT 1 FROM books AS b WHERE b.title = src.title AND b.author = src.author
+        )
+        RETURNING id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM src) AS distinct_rows,
+        (SELECT COUNT(*) FROM upd) AS updated,
+        (SELECT COUNT(*) FROM ins) AS inserted
+    """
+)
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Режет поток байтов на строки (с сохранением перевода строки)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_records(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Отдаёт (номер строки, запись, ошибка разбора)."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        missing = [c for c in ("title", "author") if c not in (reader.fieldnames or ())]
+        if missing:
+            yield 1, None, f"в заголовке CSV нет колонок: {', '.join(missing)}"
+            return
+        for record in reader:
+            if None in record:
+                yield reader.line_num, None, "лишние значения в строке"
+                continue
+            if record.get("year") == "":
+                record["year"] = None
+            yield reader.line_num, record, None
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, None, "некорректный JSON"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "ожидается JSON-объект"
+                continue
+            yield line_no, record, None
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def _validate(record: dict) -> tuple[tuple | None, str | None]:
+    try:
+        book = BookBase.model_validate(record)
+    except ValidationError as exc:
+        err = exc.errors()[0]
+        field = ".".join(str(p) for p in err["loc"])
+        return None, f"{field}: {err['msg']}"
+    title, author = book.title.strip(), book.author.strip()
+    if not title or not author:
+        return None, "title и author не должны быть пустыми"
+    if len(title) > TEXT_LIMIT or len(author) > TEXT_LIMIT:
+        return None, f"title и author не длиннее {TEXT_LIMIT} символов"
+    return (title, author, book.year), None
+
+
+class BookImporter:
+    def __init__(self, db: Session, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.report = BookImportReport(received=0, inserted=0, updated=0, unchanged=0, rejected=0, errors=[])
+        self._batch: list[tuple] = []
+        self._staged = 0
+
+        db.execute(_CREATE_STAGING)
+
+    def reject(self, line: int, error: str) -> None:
+        self.report.rejected += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(BookImportError(line=line, error=error))
+
+    def add(self, line: int, record: dict) -> None:
+        row, error = _validate(record)
+        if error:
+            self.reject(line, error)
+            return
+        self._batch.append((line, *row))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._batch:
+            return
+        raw = self.db.connection().connection.driver_connection
+        with raw.cursor() as cur:
+            with cur.copy("COPY books_import_staging (line, title, author, year) FROM STDIN") as copy:
+                for row in self._batch:
+                    copy.write_row(row)
+        self._staged += len(self._batch)
+        self._batch.clear()
+
+    def finish(self) -> BookImportReport:
+        self._flush()
+        if self._staged:
+            self.db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _IMPORT_LOCK_KEY})
+            distinct_rows, updated, inserted = self.db.execute(_MERGE).one()
+            self.report.updated = updated
+            self.report.inserted = inserted
+            self.report.unchanged = distinct_rows - updated - inserted
+            if updated or inserted:
+                etags.bump(self.db, etags.BOOKS)
+                changes.publish(self.db, changes.event(changes.BOOK, "import", inserted=inserted, updated=updated))
+        self.db.commit()
+        return self.report
+
+
+def import_books(db: Session, lines: Iterable[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> BookImportReport:
+    importer = BookImporter(db, batch_size=batch_size)
+    try:
+        for line, record, error in iter_records(lines, fmt):
+            importer.report.received += 1
+            if error:
+                importer.reject(line, error)
+            else:
+                importer.add(line, record)
+        return importer.finish()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Массовая загрузка книг через COPY")
+    parser.add_argument("path", help="CSV (title,author,year) или NDJSON; '-' — stdin")
+    parser.add_argument("--format", choices=FORMATS, help="по умолчанию — по расширению файла")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    db = SessionLocal()
+    try:
+        if args.path == "-":
+            report = import_books(db, sys.stdin, fmt, args.batch_size)
+        else:
+            with open(args.path, encoding="utf-8-sig", newline="") as f:
+                report = import_books(db, f, fmt, args.batch_size)
+    finally:
+        db.close()
+
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
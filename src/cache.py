@@ -0,0 +1,132 @@
+"""
+Кэш ответов OPS-эндпоинтов (copies / faculties) внутри процесса.
+
+Ключ — (вид ответа, branch_id, book_id). Записи вытесняются по LRU при
+превышении размера и протухают по TTL. Записи эндпоинты сбрасывают точечно:
+add_book_faculty — пару, update_book / update_branch — все пары книги или
+филиала. Кэш у каждого воркера свой, поэтому TTL ограничивает, насколько
+долго другой воркер может отдавать устаревший ответ.
+
+Настройки: OPS_CACHE_SIZE (0 — кэш выключен), OPS_CACHE_TTL (секунды).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+COPIES = "copies"
+FACULTIES = "faculties"
+
+_MISSING = object()
+
+
+class TTLLRUCache:
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Растёт при каждой инвалидации. Читатель запоминает его до похода в БД
+        # и передаёт в set(): если за это время была запись, ответ мог
+        # устареть и в кэш не кладётся.
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self.generation += 1
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+ops_cache = TTLLRUCache(
+    maxsize=int(os.getenv("OPS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("OPS_CACHE_TTL", "30")),
+)
+
+
+# Промахи ops-кэша: одинаковые одновременные запросы идут в БД один раз.
+# В ключе полёта — generation кэша, чтобы запрос, пришедший после записи,
+# не получил результат чтения, начатого до неё.
+ops_flight = SingleFlight()
+ops_aflight = AsyncSingleFlight()
+
+
+def invalidate_pair(branch_id: int, book_id: int) -> None:
+    ops_cache.invalidate((COPIES, branch_id, book_id))
+    ops_cache.invalidate((FACULTIES, branch_id, book_id))
+
+
+def invalidate_book(book_id: int) -> None:
+    ops_cache.invalidate_where(lambda key: key[2] == book_id)
+
+
+def invalidate_branch(branch_id: int) -> None:
+    ops_cache.invalidate_where(lambda key: key[1] == branch_id)
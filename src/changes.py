@@ -0,0 +1,331 @@
+"""
+Лента изменений каталога и остатков: PostgreSQL NOTIFY -> SSE / WebSocket.
+
+Публикация. Запись в каталог (src.repository) вызывает publish в транзакции
+самих данных, после etags.bump — клиент, получивший событие, сразу видит
+новый ETag: события пишутся в change_events и тем же коммитом, что и данные,
+уходят в pg_notify, так что событие есть ровно у закоммиченных изменений.
+Вставка идёт под транзакционным advisory lock, поэтому порядок коммитов
+совпадает с порядком id и клиент, продолживший с последнего полученного
+seq, ничего не пропускает. publish — последний запрос перед коммитом:
+лок держится от него до коммита, а не всю запись данных. Событие
+компактное — только ключи:
+
+    {"op": "checkout", "seq": 17, "data": {"delta": -1, "book_id": 2, "branch_id": 1}, "entity": "stock"}
+
+остальное клиент дочитывает обычным GET (с If-None-Match).
+
+Раздача. В каждом воркере ChangeFeed держит одно LISTEN-соединение (оно
+поднимается с первым подписчиком) и раскладывает текст уведомления по
+очередям подписчиков без повторной сериализации. Подписчик с after
+(Last-Event-ID) сначала получает пропущенное из change_events, затем живые
+события; дубли на стыке отсекаются по seq. Не успевающий подписчик с
+переполненной очередью получает накопленное, и поток закрывается: клиент
+переподключается с Last-Event-ID и добирает из журнала. Если after старше
+хранимого журнала — событие reset: состояние нужно перечитать целиком.
+
+CHANGE_FEED_URL — куда держать LISTEN (по умолчанию DATABASE_URL; через
+PgBouncer в transaction-режиме LISTEN не работает, нужен прямой адрес),
+CHANGE_FEED_QUEUE — очередь подписчика, CHANGE_FEED_HEARTBEAT — пинг
+в секундах, CHANGE_FEED_RETENTION — сколько секунд хранить журнал.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Iterable
+
+import anyio
+import psycopg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from src.db import SessionLocal, get_database_url
+from src.schemas import BookFacultyLinkResult
+
+logger = logging.getLogger(__name__)
+
+BOOK = "book"
+BRANCH = "branch"
+BOOK_FACULTY = "book_faculty"
+STOCK = "stock"
+ENTITIES = (BOOK, BRANCH, BOOK_FACULTY, STOCK)
+
+CHANNEL = "change_feed"
+QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE", "1000"))
+HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+RETENTION = int(os.getenv("CHANGE_FEED_RETENTION", str(24 * 3600)))
+PRUNE_INTERVAL = 3600.0
+RECONNECT_DELAY = 1.0
+REPLAY_PAGE = 1000
+
+_PUBLISH_LOCK_KEY = 0x66656564  # "feed"
+
+# Текст события один и тот же в NOTIFY и при догонке из журнала.
+_PAYLOAD = "jsonb_build_object('seq', id, 'entity', entity, 'op', op, 'data', data)::text"
+
+# Sort по n читает весь вход (и с ним lock) до первой строки INSERT,
+# поэтому лок берётся раньше, чем nextval выдаёт id.
+_PUBLISH = text(
+    f"""
+    WITH lock AS MATERIALIZED (SELECT pg_advisory_xact_lock(:key)),
+    published AS (
+        INSERT INTO change_events (entity, op, data)
+        SELECT e ->> 'entity', e ->> 'op', e -> 'data'
+        FROM lock, jsonb_array_elements(CAST(:events AS jsonb)) WITH ORDINALITY AS t(e, n)
+        ORDER BY n
+        RETURNING id, entity, op, data
+    )
+    SELECT pg_notify(:channel, {_PAYLOAD}) FROM published ORDER BY id
+    """  # nosec B608: подставляется только константа _PAYLOAD, значения — параметрами
+)
+_REPLAY = text(
+    f"""
+    SELECT id, {_PAYLOAD} AS payload
+    FROM change_events
+    WHERE id > :after AND (CAST(:entities AS text[]) IS NULL OR entity = ANY(CAST(:entities AS text[])))
+    ORDER BY id
+    LIMIT :limit
+    """  # nosec B608: подставляется только константа _PAYLOAD, значения — параметрами
+)
+_CATCH_UP = f"SELECT {_PAYLOAD} FROM change_events WHERE id > %s ORDER BY id LIMIT %s"  # nosec B608: только _PAYLOAD
+_OLDEST = text("SELECT min(id) FROM change_events")
+# Последнее событие не удаляется никогда: по нему видно, что журнал обрезан.
+_PRUNE = """
+    DELETE FROM change_events
+    WHERE created_at < now() - make_interval(secs => %s)
+      AND id < (SELECT max(id) FROM change_events)
+"""
+
+
+def event(entity: str, op: str, **data) -> dict:
+    return {"entity": entity, "op": op, "data": data}
+
+
+def stock_event(op: str, branch_id: int, book_id: int) -> dict:
+    """Выдача (checkout, -1) или возврат (checkin, +1) экземпляра."""
+    return event(STOCK, op, branch_id=branch_id, book_id=book_id, delta=-1 if op == "checkout" else 1)
+
+
+def link_events(items: Iterable[BookFacultyLinkResult], done: str) -> list[dict]:
+    """События по реально изменённым привязкам; op — added / removed."""
+    return [
+        event(BOOK_FACULTY, done, branch_id=x.branch_id, book_id=x.book_id, faculty_id=x.faculty_id)
+        for x in items
+        if x.status == done
+    ]
+
+
+# ==========================
+# PUBLISH
+# ==========================
+
+def _publish_params(events: tuple[dict, ...]) -> dict:
+    return {"events": json.dumps(events, ensure_ascii=False), "channel": CHANNEL, "key": _PUBLISH_LOCK_KEY}
+
+
+def publish(db: Session, *events: dict) -> None:
+    """Вызывать в транзакции изменённых данных, последним перед коммитом; сам не коммитит."""
+    if events:
+        db.execute(_PUBLISH, _publish_params(events))
+
+
+# ==========================
+# FAN-OUT
+# ==========================
+
+class _Subscriber:
+    __slots__ = ("queue", "entities", "overflowed")
+
+    def __init__(self, entities: frozenset[str]):
+        self.queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue(QUEUE_SIZE)
+        self.entities = entities
+        self.overflowed = False
+
+
+def _reset_payload(seq: int) -> str:
+    return json.dumps({"seq": seq, "entity": "feed", "op": "reset", "data": {}})
+
+
+def _replay_page(after: int, entities: frozenset[str], first: bool) -> tuple[int | None, list]:
+    with SessionLocal() as db:
+        oldest = db.scalar(_OLDEST) if first else None
+        params = {"after": after, "entities": sorted(entities) or None, "limit": REPLAY_PAGE}
+        return oldest, db.execute(_REPLAY, params).all()
+
+
+class ChangeFeed:
+    """Одно LISTEN-соединение на воркер и очереди подписчиков в его event loop."""
+
+    def __init__(self, url: str | None = None):
+        self.url = url
+        self.last_seq = 0
+        self._subscribers: set[_Subscriber] = set()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ready = asyncio.Event()
+        self._pruned_at = 0.0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _conninfo(self) -> str:
+        url = make_url(self.url or os.getenv("CHANGE_FEED_URL") or get_database_url())
+        return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        if self._loop is not loop:
+            # новый event loop (перезапуск приложения) — старые подписчики мертвы
+            self._loop = loop
+            self._subscribers = set()
+            self._ready = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    await self._catch_up(conn)
+                    self._ready.set()
+                    while True:
+                        async for notify in conn.notifies(timeout=HEARTBEAT):
+                            self._dispatch(notify.payload)
+                        await self._prune(conn)
+            except psycopg.Error as exc:
+                logger.warning("change feed: LISTEN-соединение потеряно: %s", exc)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _catch_up(self, conn: psycopg.AsyncConnection) -> None:
+        """После (пере)подключения: события, закоммиченные без нас, — из журнала."""
+        if not self._ready.is_set():
+            cur = await conn.execute("SELECT COALESCE(max(id), 0) FROM change_events")
+            self.last_seq = (await cur.fetchone())[0]
+            return
+        while True:
+            cur = await conn.execute(_CATCH_UP, (self.last_seq, REPLAY_PAGE))
+            rows = await cur.fetchall()
+            for (payload,) in rows:
+                self._dispatch(payload)
+            if len(rows) < REPLAY_PAGE:
+                return
+
+    async def _prune(self, conn: psycopg.AsyncConnection) -> None:
+        if time.monotonic() - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
+        await conn.execute(_PRUNE, (RETENTION,))
+
+    def _dispatch(self, payload: str) -> None:
+        message = json.loads(payload)
+        seq = message["seq"]
+        if seq <= self.last_seq:
+            return
+        self.last_seq = seq
+        for sub in list(self._subscribers):
+            if sub.entities and message["entity"] not in sub.entities:
+                continue
+            try:
+                sub.queue.put_nowait((seq, payload))
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self._subscribers.discard(sub)
+
+    async def events(
+        self, after: int | None = None, entities: frozenset[str] = frozenset()
+    ) -> AsyncIterator[tuple[int, str] | None]:
+        """
+        (seq, JSON события) после after по порядку seq; None — прошло
+        HEARTBEAT секунд без событий. Заканчивается, если подписчик отстал.
+        """
+        await self.start()
+        sub = _Subscriber(entities)
+        self._subscribers.add(sub)
+        try:
+            await self._ready.wait()
+            last = self.last_seq if after is None else after
+            first = True
+            while after is not None:
+                oldest, rows = await run_in_threadpool(_replay_page, last, entities, first)
+                if first and oldest is not None and oldest > after + 1:
+                    last = self.last_seq
+                    yield last, _reset_payload(last)
+                    break
+                first = False
+                for seq, payload in rows:
+                    last = seq
+                    yield seq, payload
+                if len(rows) < REPLAY_PAGE:
+                    break
+
+            while not (sub.overflowed and sub.queue.empty()):
+                try:
+                    seq, payload = await asyncio.wait_for(sub.queue.get(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if seq > last:
+                    last = seq
+                    yield seq, payload
+        finally:
+            self._subscribers.discard(sub)
+
+
+async def sse(events: AsyncIterator[tuple[int, str] | None]) -> AsyncIterator[bytes]:
+    """Server-Sent Events: id — seq (браузер вернёт его в Last-Event-ID), пинг — комментарий."""
+    yield f"retry: {int(RECONNECT_DELAY * 1000)}\n\n".encode()
+    async for item in events:
+        if item is None:
+            yield b": ping\n\n"
+        else:
+            yield f"id: {item[0]}\nevent: change\ndata: {item[1]}\n\n".encode()
+
+
+PING = json.dumps({"entity": "feed", "op": "ping", "data": {}})
+
+
+async def serve_websocket(websocket: WebSocket, events: AsyncIterator[tuple[int, str] | None]) -> None:
+    """
+    Шлёт события текстовыми сообщениями, пока клиент не закроет соединение.
+    Закрытие ловится сразу (а не на следующей отправке), чтобы подписчик
+    не занимал очередь. Отставший подписчик закрывается с кодом 1013:
+    переподключиться с after = последний seq.
+    """
+    async with anyio.create_task_group() as tg:
+        async def send() -> None:
+            try:
+                async for item in events:
+                    await websocket.send_text(PING if item is None else item[1])
+                await websocket.close(code=1013)
+            except WebSocketDisconnect:
+                pass
+            tg.cancel_scope.cancel()
+
+        async def receive() -> None:
+            async for _ in websocket.iter_text():
+                pass
+            tg.cancel_scope.cancel()
+
+        tg.start_soon(send)
+        tg.start_soon(receive)
+
+
+# Лента воркера; слушатель останавливается на shutdown (см. src.main).
+feed = ChangeFeed()
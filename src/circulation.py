@@ -0,0 +1,65 @@
+"""
+Пересчёт статистики выдач (circulation_stats, book_readers) по истории loans.
+
+В обычной работе счётчики ведутся инкрементально запросами выдачи и возврата
+(src.queries.checkout / checkin). Пересчёт нужен после ручных правок loans,
+восстановления из бэкапа или появления статистики на уже наполненной БД:
+он делает несколько set-based запросов в одной транзакции и на это время
+блокирует запись в loans (SHARE), чтобы не потерять выдачи, идущие параллельно.
+
+CLI:
+    python -m src.circulation rebuild
+"""
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+_REBUILD = (
+    "LOCK TABLE loans IN SHARE MODE",
+    "TRUNCATE book_readers, circulation_stats",
+    """
+    INSERT INTO book_readers (branch_id, book_id, student_id)
+    SELECT DISTINCT branch_id, book_id, student_id FROM loans
+    """,
+    """
+    INSERT INTO circulation_stats (branch_id, book_id, loans_total, active_loans, students, last_loan_at)
+    SELECT
+        branch_id,
+        book_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE returned_at IS NULL),
+        COUNT(DISTINCT student_id),
+        MAX(issued_at)
+    FROM loans
+    GROUP BY branch_id, book_id
+    """,
+)
+
+
+def rebuild_stats(db: Session) -> int:
+    """Пересчитывает статистику с нуля; возвращает число пар (филиал, книга)."""
+    try:
+        for sql in _REBUILD:
+            result = db.execute(text(sql))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return result.rowcount
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Статистика выдач")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    from src.db import SessionLocal
+
+    with SessionLocal() as db:
+        pairs = rebuild_stats(db)
+    print(f"circulation_stats: {pairs} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Хуки на ошибки (требование 5 README): ответы 4xx, 5xx и необработанные исключения.
+
+ErrorHooksMiddleware (чистый ASGI) на пути запроса только собирает
+ErrorEvent — статус, маршрут, до BODY_LIMIT байт тела ответа, исключение —
+и кладёт его в ограниченную очередь без ожидания. Фоновый поток разбирает
+очередь пачками (до ERROR_HOOKS_BATCH событий или раз в
+ERROR_HOOKS_FLUSH_INTERVAL секунд): вызывает хуки, зарегистрированные на вид
+события, затем отдаёт пачку каждому sink. Разбор тела и форматирование
+traceback — тоже в фоне. Медленный хук или sink задерживает только этот
+поток; очередь при этом заполняется, и дальше действует ERROR_HOOKS_OVERFLOW:
+
+* drop (по умолчанию) — новые события отбрасываются, пока не освободится место;
+* sample — после половины очереди принимается доля ERROR_HOOKS_SAMPLE_RATE
+  событий, при полной очереди — ни одного.
+
+Потери видны в error_hook_dropped_total, упавшие хуки и sink'и — в
+error_hook_failures_total (и в логе); на ответ они не влияют.
+
+Sinks — ERROR_HOOKS_SINKS через запятую (по умолчанию нет):
+file — NDJSON в ERROR_HOOKS_FILE, table — таблица error_log,
+webhook — POST JSON-массива пачки на ERROR_HOOKS_WEBHOOK_URL.
+Выключается всё ERROR_HOOKS_ENABLED=0.
+
+    @error_hooks.on_error(error_hooks.SERVER_ERROR, error_hooks.EXCEPTION)
+    def page_on_call(event): ...
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+import urllib.request
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple, Protocol, Sequence
+
+from sqlalchemy import insert
+
+from src.db import SessionLocal
+from src.metrics import ERROR_DROPPED, ERROR_EVENTS, ERROR_FAILURES
+from src.models import ErrorLogEntry
+
+logger = logging.getLogger(__name__)
+
+CLIENT_ERROR = "client_error"  # 4xx
+SERVER_ERROR = "server_error"  # 5xx, отданный обработчиком
+EXCEPTION = "exception"  # необработанное исключение (клиент получит 500)
+KINDS = (CLIENT_ERROR, SERVER_ERROR, EXCEPTION)
+
+DROP = "drop"
+SAMPLE = "sample"
+
+ERROR_HOOKS_ENABLED = os.getenv("ERROR_HOOKS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+QUEUE_SIZE = int(os.getenv("ERROR_HOOKS_QUEUE", "1000"))
+BATCH_SIZE = int(os.getenv("ERROR_HOOKS_BATCH", "100"))
+FLUSH_INTERVAL = float(os.getenv("ERROR_HOOKS_FLUSH_INTERVAL", "1"))
+OVERFLOW = os.getenv("ERROR_HOOKS_OVERFLOW", DROP).strip().lower()
+SAMPLE_RATE = float(os.getenv("ERROR_HOOKS_SAMPLE_RATE", "0.1"))
+WEBHOOK_TIMEOUT = float(os.getenv("ERROR_HOOKS_WEBHOOK_TIMEOUT", "5"))
+
+BODY_LIMIT = 1024
+UNMATCHED_ROUTE = "unmatched"
+
+
+class ErrorEvent(NamedTuple):
+    kind: str
+    status: int
+    method: str
+    route: str
+    path: str
+    at: float
+    body: bytes = b""
+    exc: BaseException | None = None
+
+    @property
+    def detail(self) -> str | None:
+        """detail из JSON-тела ответа (HTTPException, ошибки валидации) или начало тела как текст."""
+        if not self.body:
+            return str(self.exc) if self.exc is not None else None
+        try:
+            detail = json.loads(self.body)["detail"]
+        except (ValueError, TypeError, KeyError):
+            return self.body.decode(errors="replace")
+        return detail if isinstance(detail, str) else json.dumps(detail, ensure_ascii=False)
+
+    @property
+    def error(self) -> str | None:
+        if self.exc is None:
+            return None
+        return "".join(traceback.format_exception(self.exc))
+
+    def to_dict(self) -> dict:
+        return {
+            "at": datetime.fromtimestamp(self.at, timezone.utc).isoformat(),
+            "kind": self.kind,
+            "status": self.status,
+            "method": self.method,
+            "route": self.route,
+            "path": self.path,
+            "detail": self.detail,
+            "error": self.error,
+        }
+
+
+Hook = Callable[[ErrorEvent], None]
+
+
+class Sink(Protocol):
+    name: str
+
+    def write(self, batch: Sequence[ErrorEvent]) -> None: ...
+
+
+# ==========================
+# PIPELINE
+# ==========================
+
+class ErrorPipeline:
+    """Реестр хуков, sinks и очередь с фоновым потоком доставки (поднимается с первым событием)."""
+
+    def __init__(
+        self,
+        sinks: Sequence[Sink] = (),
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        overflow: str = OVERFLOW,
+        sample_rate: float = SAMPLE_RATE,
+    ):
+        if overflow not in (DROP, SAMPLE):
+            raise ValueError(f"ERROR_HOOKS_OVERFLOW: ожидается {DROP} или {SAMPLE}, получено {overflow!r}")
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self._queue: queue.Queue[ErrorEvent] = queue.Queue(queue_size)
+        self._sample_from = queue_size // 2
+        self._hooks: dict[str, list[Hook]] = {kind: [] for kind in KINDS}
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def register(self, hook: Hook, *kinds: str) -> Hook:
+        """Хук на виды событий (по умолчанию — на все); вызывается в фоновом потоке."""
+        for kind in kinds or KINDS:
+            self._hooks[kind].append(hook)
+        return hook
+
+    def unregister(self, hook: Hook) -> None:
+        for hooks in self._hooks.values():
+            if hook in hooks:
+                hooks.remove(hook)
+
+    def on_error(self, *kinds: str) -> Callable[[Hook], Hook]:
+        return lambda hook: self.register(hook, *kinds)
+
+    def emit(self, event: ErrorEvent) -> None:
+        """С пути запроса: не ждёт и не бросает."""
+        if self._thread is None:
+            self._start()
+        if (
+            self.overflow == SAMPLE
+            and self._queue.qsize() >= self._sample_from
+            and random.random() >= self.sample_rate  # nosec B311: выборка событий, не криптография
+        ):
+            ERROR_DROPPED.inc(1, "sampled")
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            ERROR_DROPPED.inc(1, "overflow")
+            return
+        ERROR_EVENTS.inc(1, event.kind)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Ждёт, пока доставлено всё принятое; False — не успели за timeout."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="error-hooks", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, batch: list[ErrorEvent]) -> None:
+        for event in batch:
+            for hook in list(self._hooks[event.kind]):
+                try:
+                    hook(event)
+                except Exception:
+                    ERROR_FAILURES.inc(1, "hook")
+                    logger.exception("error hook %r упал", hook)
+        for sink in list(self.sinks):
+            try:
+                sink.write(batch)
+            except Exception:
+                ERROR_FAILURES.inc(1, sink.name)
+                logger.exception("error sink %s упал на пачке из %d событий", sink.name, len(batch))
+
+
+# ==========================
+# SINKS
+# ==========================
+
+class FileSink:
+    """NDJSON: одна запись на пачку."""
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, batch: Sequence[ErrorEvent]) -> None:
+        lines = "".join(json.dumps(e.to_dict(), ensure_ascii=False) + "\n" for e in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class TableSink:
+    """error_log: один INSERT на пачку."""
+    name = "table"
+
+    def write(self, batch: Sequence[ErrorEvent]) -> None:
+        rows = [{**e.to_dict(), "created_at": datetime.fromtimestamp(e.at, timezone.utc)} for e in batch]
+        for row in rows:
+            del row["at"]
+        with SessionLocal() as db:
+            db.execute(insert(ErrorLogEntry), rows)
+            db.commit()
+
+
+class WebhookSink:
+    """POST JSON-массива событий пачки; ответ, отличный от 2xx, — ошибка sink'а."""
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = WEBHOOK_TIMEOUT):
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"ERROR_HOOKS_WEBHOOK_URL: нужен http(s) URL, получено {url!r}")
+        self.url = url
+        self.timeout = timeout
+
+    def write(self, batch: Sequence[ErrorEvent]) -> None:
+        body = json.dumps([e.to_dict() for e in batch], ensure_ascii=False).encode()
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:  # nosec B310: схема проверена
+            response.read()
+
+
+def sinks_from_env() -> list[Sink]:
+    sinks: list[Sink] = []
+    for name in filter(None, (s.strip().lower() for s in os.getenv("ERROR_HOOKS_SINKS", "").split(","))):
+        if name == "file":
+            sinks.append(FileSink(os.getenv("ERROR_HOOKS_FILE", "errors.ndjson")))
+        elif name == "table":
+            sinks.append(TableSink())
+        elif name == "webhook":
+            sinks.append(WebhookSink(os.getenv("ERROR_HOOKS_WEBHOOK_URL", "")))
+        else:
+            raise ValueError(f"ERROR_HOOKS_SINKS: неизвестный sink {name!r}")
+    return sinks
+
+
+# ==========================
+# HTTP
+# ==========================
+
+def _event(scope, kind: str, status: int, body: bytes = b"", exc: BaseException | None = None) -> ErrorEvent:
+    route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+    return ErrorEvent(kind, status, scope["method"], route, scope["path"], time.time(), body, exc)
+
+
+class ErrorHooksMiddleware:
+    def __init__(self, app, pipeline: ErrorPipeline | None = None):
+        self.app = app
+        self.pipeline = pipeline
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 0
+        body = bytearray()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif status >= 400 and len(body) < BODY_LIMIT:
+                body.extend(message.get("body", b"")[:BODY_LIMIT - len(body)])
+            await send(message)
+
+        target = self.pipeline or pipeline
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            target.emit(_event(scope, EXCEPTION, 500, exc=exc))
+            raise
+        if status >= 400:
+            target.emit(_event(scope, SERVER_ERROR if status >= 500 else CLIENT_ERROR, status, bytes(body)))
+
+
+# Конвейер процесса: sinks из окружения, хуки — через on_error.
+pipeline = ErrorPipeline(sinks_from_env())
+on_error = pipeline.on_error
@@ -0,0 +1,120 @@
+"""
+Условные запросы: ETag / If-None-Match для каталога и OPS.
+
+Списки и карточки: ETag собирается из версий таблиц, от которых зависит
+ответ (change_versions), и хэша URL. Запись в каталог поднимает версию в той
+же транзакции, что и данные (src.repository), а читатель берёт версии ДО
+данных: так ответ может оказаться новее своего ETag (клиент лишний раз
+перекачает тело), но не старее — и устаревший ответ не закрепится в кэше
+клиента. Отдельного коммита на версию нет, и упавший между двумя коммитами
+запрос не оставит данные без новой версии.
+Версии читаются той же сессией, что и данные, поэтому с реплики приходят
+согласованными. На совпавший If-None-Match — 304 после одного запроса
+версий, без запроса списка и сериализации.
+
+Пары OPS: ETag — хэш тела, считается один раз при заполнении ops-кэша
+и хранится рядом с ответом, так что 304 на попадании в кэш не стоит ни
+одного запроса.
+
+ETAG_MAX_AGE — max-age в Cache-Control (по умолчанию 0: хранить можно,
+но перед использованием — перепроверить).
+"""
+import hashlib
+import os
+import zlib
+from typing import Sequence
+
+from fastapi import Depends, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.db import get_async_db, get_db
+from src.models import ChangeVersion
+
+BOOKS = "books"
+BRANCHES = "branches"
+FACULTIES = "faculties"
+STOCK = "branch_stock"
+BOOK_FACULTIES = "book_faculties"
+ALL_TABLES = (BOOKS, BRANCHES, FACULTIES, STOCK, BOOK_FACULTIES)
+
+ETAG_MAX_AGE = int(os.getenv("ETAG_MAX_AGE", "0"))
+CACHE_CONTROL = f"public, max-age={ETAG_MAX_AGE}, must-revalidate"
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers=headers(exc.etag))
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def respond(request: Request, response: Response, etag: str) -> None:
+    """304, если у клиента та же версия; иначе ETag и Cache-Control в ответ."""
+    if _matches(request, etag):
+        raise NotModified(etag)
+    response.headers.update(headers(etag))
+
+
+def content_etag(body: BaseModel) -> str:
+    return '"' + hashlib.blake2b(body.model_dump_json().encode(), digest_size=8).hexdigest() + '"'
+
+
+def _versions_etag(request: Request, versions: dict[str, int], tables: Sequence[str]) -> str:
+    url = request.url.path + "?" + request.url.query
+    return '"' + ".".join(str(versions.get(t, 0)) for t in tables) + f"-{zlib.crc32(url.encode()):08x}" + '"'
+
+
+# ==========================
+# VERSIONS
+# ==========================
+
+def _versions_query(tables: Sequence[str]):
+    return select(ChangeVersion.name, ChangeVersion.version).where(ChangeVersion.name.in_(tables))
+
+
+def _bump_stmt(tables: Sequence[str]):
+    stmt = insert(ChangeVersion).values([{"name": t, "version": 1} for t in tables])
+    return stmt.on_conflict_do_update(
+        index_elements=[ChangeVersion.name], set_={"version": ChangeVersion.version + 1}
+    )
+
+
+def bump(db: Session, *tables: str) -> None:
+    """Вызывать в транзакции изменённых данных, до её коммита; сам не коммитит."""
+    if tables:
+        db.execute(_bump_stmt(tables))
+
+
+def conditional(*tables: str):
+    """Зависимость для sync-эндпоинта: ETag по версиям tables, 304 на совпадение."""
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db)) -> None:
+        versions = dict(db.execute(_versions_query(tables)).all())
+        respond(request, response, _versions_etag(request, versions, tables))
+    return dependency
+
+
+def aconditional(*tables: str):
+    async def dependency(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)) -> None:
+        versions = dict((await db.execute(_versions_query(tables))).all())
+        respond(request, response, _versions_etag(request, versions, tables))
+    return dependency
@@ -0,0 +1,177 @@
+"""
+Потоковая выгрузка каталога: books, branch_stock, book_faculties.
+
+CSV отдаётся прямо из COPY (...) TO STDOUT — строки формирует сам Postgres,
+Python только перекладывает байты. NDJSON читается серверным курсором
+(см. src.streaming). В обоих случаях ORM-объекты не создаются, а в памяти
+лежит не больше одного чанка, поэтому выгрузка в миллионы строк идёт
+за постоянную память. Сжатие gzip — потоковое, по тем же чанкам.
+
+CLI:
+    python -m src.export books > books.csv
+    python -m src.export stock --denormalized --format ndjson --gzip -o stock.ndjson.gz
+"""
+import argparse
+import sys
+import zlib
+from typing import Iterable, Iterator
+
+from sqlalchemy import Select, select
+from sqlalchemy.dialects import postgresql
+
+from src.db import SessionLocal
+from src.models import (
+    Book as BookORM,
+    Branch as BranchORM,
+    Faculty as FacultyORM,
+    BranchStock as BranchStockORM,
+    BookFaculty as BookFacultyORM,
+)
+from src.streaming import iter_ndjson
+
+EXPORTS = ("books", "stock", "book-faculties")
+FORMATS = ("csv", "ndjson")
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+# COPY отдаёт по сообщению на строку; склеиваем их в чанки такого размера.
+EXPORT_CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def export_query(name: str, denormalized: bool = False) -> Select:
+    """Запрос выгрузки; denormalized добавляет названия филиалов, книг и факультетов."""
+    if name == "books":
+        return select(BookORM.id, BookORM.title, BookORM.author, BookORM.year).order_by(BookORM.id)
+
+    if name == "stock":
+        order = (BranchStockORM.branch_id, BranchStockORM.book_id)
+        if not denormalized:
+            return select(BranchStockORM.branch_id, BranchStockORM.book_id, BranchStockORM.copies).order_by(*order)
+        return (
+            select(
+                BranchStockORM.branch_id,
+                BranchORM.name.label("branch_name"),
+                BranchStockORM.book_id,
+                BookORM.title.label("book_title"),
+                BookORM.author.label("book_author"),
+                BranchStockORM.copies,
+            )
+            .join(BranchORM, BranchORM.id == BranchStockORM.branch_id)
+            .join(BookORM, BookORM.id == BranchStockORM.book_id)
+            .order_by(*order)
+        )
+
+    if name == "book-faculties":
+        order = (BookFacultyORM.branch_id, BookFacultyORM.book_id, BookFacultyORM.faculty_id)
+        if not denormalized:
+            return select(*order).order_by(*order)
+        return (
+            select(
+                BookFacultyORM.branch_id,
+                BranchORM.name.label("branch_name"),
+                BookFacultyORM.book_id,
+                BookORM.title.label("book_title"),
+                BookFacultyORM.faculty_id,
+                FacultyORM.name.label("faculty_name"),
+            )
+            .join(BranchORM, BranchORM.id == BookFacultyORM.branch_id)
+            .join(BookORM, BookORM.id == BookFacultyORM.book_id)
+            .join(FacultyORM, FacultyORM.id == BookFacultyORM.faculty_id)
+            .order_by(*order)
+        )
+
+    raise ValueError(f"unknown export: {name}")
+
+
+def _rechunk(chunks: Iterable[bytes], size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) >= size:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+def iter_csv(stmt: Select) -> Iterator[bytes]:
+    """CSV с заголовком через COPY (...) TO STDOUT; сессия своя, как в iter_ndjson."""
+    # у COPY нет bind-параметров, а в запросах выгрузки нет пользовательских значений
+    sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    db = SessionLocal()
+    try:
+        raw = db.connection().connection.driver_connection
+        with raw.cursor() as cur:
+            with cur.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+                yield from _rechunk(bytes(data) for data in copy)
+    finally:
+        db.close()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = GZIP_LEVEL) -> Iterator[bytes]:
+    """Потоковое gzip-сжатие (wbits=31 — формат gzip, а не голый deflate)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Разрешён ли gzip по Accept-Encoding (RFC 9110): токены через запятую,
+    у каждого необязательный q. gzip;q=0 — запрет; * покрывает gzip, если тот не назван явно.
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        coding = coding.lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in weights:
+            return weights[coding] > 0
+    return False
+
+
+def iter_export(name: str, fmt: str, denormalized: bool = False, gzip: bool = False) -> Iterator[bytes]:
+    stmt = export_query(name, denormalized)
+    if fmt == "csv":
+        chunks = iter_csv(stmt)
+    elif fmt == "ndjson":
+        chunks = _rechunk(iter_ndjson(stmt))
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка каталога")
+    parser.add_argument("name", choices=EXPORTS)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--denormalized", action="store_true", help="с названиями филиалов/книг/факультетов")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="файл; по умолчанию stdout")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(args.name, args.format, args.denormalized, args.gzip):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
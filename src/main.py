@@ -1,20 +1,60 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Iterator, List, Literal
 
-from fastapi import Depends, FastAPI, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import func, select
+import anyio
+from fastapi import Depends, FastAPI, Path, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
 
-from src.db import engine, get_db
-from src.models import (
-    Base,
-    Book as BookORM,
-    Branch as BranchORM,
-    Faculty as FacultyORM,
-    BranchStock as BranchStockORM,
-    BookFaculty as BookFacultyORM,
+from src import admission, changes, error_hooks, etags, metrics, repository, search, service
+from src.bootstrap import ensure_schema, seed_catalog
+from src.bulk_import import iter_lines
+from src.cache import COPIES, FACULTIES, ops_aflight, ops_cache, ops_flight
+from src.db import (
+    MAX_OVERFLOW,
+    POOL_CLASS,
+    POOL_SIZE,
+    POOL_TIMEOUT,
+    SessionLocal,
+    dispose_async_engine,
+    engine,
+    get_async_replicas,
+    get_async_sessionmaker,
+    get_db,
+    get_db_mode,
+    get_replicas,
+)
+from src.export import MEDIA_TYPES, accepts_gzip, iter_export
+from src.memory_catalog import MemoryCatalog
+from src.pagination import MAX_PAGE_LIMIT
+from src.repository import catalog_for
+from src.schemas import (
+    Book,
+    BookAvailability,
+    BookAvailabilityBatchResponse,
+    BookBase,
+    BookCirculation,
+    BookFacultiesBatchResponse,
+    BookFacultiesResponse,
+    BookFacultyLink,
+    BookFacultyLinksRequest,
+    BookFacultyLinksResponse,
+    BookIdsRequest,
+    BookImportReport,
+    BookSearchHit,
+    Branch,
+    BranchBase,
+    BranchBookInfo,
+    CirculationStats,
+    CirculationTopItem,
+    CopiesBatchRequest,
+    CopiesBatchResponse,
+    Faculty,
+    FacultyBook,
+    Loan,
+    LoanCreate,
 )
 
 app = FastAPI(
@@ -23,464 +63,615 @@ app = FastAPI(
     version="0.2.0",
 )
 
-# ============================================================
-# UNIT TEST COMPATIBILITY (tests import "main" from PYTHONPATH=src)
-# ============================================================
-
-book_id_seq = 0
-branch_id_seq = 0
-faculty_id_seq = 0
-
+app.add_exception_handler(etags.NotModified, etags.not_modified_handler)
 
-def get_next_book_id() -> int:
-    global book_id_seq
-    book_id_seq += 1
-    return book_id_seq
+# add_middleware оборачивает снаружи: метрики видят и сброшенные запросы
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware, router=app.router)
 
+# снаружи допуска: 503 сброшенных запросов — тоже события для хуков
+if error_hooks.ERROR_HOOKS_ENABLED:
+    app.add_middleware(error_hooks.ErrorHooksMiddleware)
 
-def get_next_branch_id() -> int:
-    global branch_id_seq
-    branch_id_seq += 1
-    return branch_id_seq
-
-
-def get_next_faculty_id() -> int:
-    global faculty_id_seq
-    faculty_id_seq += 1
-    return faculty_id_seq
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engines()
+    app.add_middleware(metrics.MetricsMiddleware)
 
+# ==========================
+# DB SEED (idempotent, см. src.bootstrap)
+# ==========================
 
-# In-memory storages (unit tests expect these)
-books: list[dict] = []
-branches: list[dict] = []
-faculties: list[dict] = []
-branch_stocks: list[dict] = []   # {"branch_id": int, "book_id": int, "copies": int}
-book_faculties: list[dict] = []  # {"branch_id": int, "book_id": int, "faculty_id": int}
+MAIN_BRANCH = "Главный филиал"
+IT_BRANCH = "ИТ-филиал"
+BOOK1 = "Алгоритмы: построение и анализ"
+BOOK2 = "Введение в машинное обучение"
+FAC_IT = "Факультет информационных технологий"
+FAC_MATH = "Математический факультет"
+
+SEED_BRANCHES = [(MAIN_BRANCH, "ул. Академическая, 1"), (IT_BRANCH, "пр-т Программистов, 42")]
+SEED_BOOKS = [(BOOK1, "Кормен и др.", 2009), (BOOK2, "А. Н. Авторов", 2020)]
+SEED_FACULTIES = [FAC_IT, FAC_MATH]
+# Note: it_branch-book2 not seeded => copies endpoint must return 0
+SEED_STOCK = [(MAIN_BRANCH, BOOK1, 5), (MAIN_BRANCH, BOOK2, 2), (IT_BRANCH, BOOK1, 3)]
+SEED_BOOK_FACULTIES = [
+    (MAIN_BRANCH, BOOK1, FAC_IT),
+    (MAIN_BRANCH, BOOK1, FAC_MATH),
+    (IT_BRANCH, BOOK1, FAC_IT),
+    (MAIN_BRANCH, BOOK2, FAC_MATH),
+]
+
+
+def _seed_memory_catalog(catalog: MemoryCatalog) -> None:
+    """Те же сидовые данные в каталоге в памяти (без БД) — с чистого листа, id по порядку с 1."""
+    catalog.clear()
+    branches, books, faculties = {}, {}, {}
+    for i, (name, address) in enumerate(SEED_BRANCHES, 1):
+        catalog.put_branch(Branch(id=i, name=name, address=address))
+        branches[name] = i
+    for i, (title, author, year) in enumerate(SEED_BOOKS, 1):
+        catalog.put_book(Book(id=i, title=title, author=author, year=year))
+        books[title] = i
+    for i, name in enumerate(SEED_FACULTIES, 1):
+        catalog.put_faculty(Faculty(id=i, name=name))
+        faculties[name] = i
+    for branch, book, copies in SEED_STOCK:
+        catalog.set_copies(branches[branch], books[book], copies)
+    catalog.add_faculty_links([
+        BookFacultyLink(branch_id=branches[br], book_id=books[bk], faculty_id=faculties[f])
+        for br, bk, f in SEED_BOOK_FACULTIES
+    ])
 
 
-def _seed_memory_storage(force: bool = False) -> None:
+def seed_data(db: Session | None = None) -> None:
     """
-    Unit tests expect that seed_data() populates module-level lists:
-    branches/books/faculties/branch_stocks/book_faculties.
+    db is None — сидовые данные в каталоге в памяти (repository.memory_catalog);
+    иначе — идемпотентно в PostgreSQL (данные, которых ждут интеграционные тесты).
     """
-    if not force and (branches or books or faculties):
+    if db is None:
+        _seed_memory_catalog(repository.memory_catalog)
         return
 
-    # Make it deterministic: clear and re-fill
-    books.clear()
-    branches.clear()
-    faculties.clear()
-    branch_stocks.clear()
-    book_faculties.clear()
-
-    # NOTE: do not reset *_id_seq here — unit tests may manage it themselves.
-    # We just generate new ids using current seq counters.
-
-    # Branches
-    main_branch_id = get_next_branch_id()
-    it_branch_id = get_next_branch_id()
-
-    branches.extend(
-        [
-            {"id": main_branch_id, "name": "Главный филиал", "address": "ул. Академическая, 1"},
-            {"id": it_branch_id, "name": "ИТ-филиал", "address": "пр-т Программистов, 42"},
-        ]
+    seed_catalog(
+        db,
+        branches=[
+            *SEED_BRANCHES,
+            # Optional CI entities (harmless; prevents "CI Book One" style checks from failing)
+            ("CI Branch One", "Test street, 1"),
+            ("CI Branch Two", "Test street, 2"),
+        ],
+        books=[
+            *SEED_BOOKS,
+            ("CI Book One", "Test Author", 2001),
+            ("CI Book Two", "Test Author", 2002),
+        ],
+        faculties=SEED_FACULTIES,
+        stock=SEED_STOCK,
+        book_faculties=SEED_BOOK_FACULTIES,
     )
+    db.commit()
 
-    # Books
-    book1_id = get_next_book_id()
-    book2_id = get_next_book_id()
 
-    books.extend(
-        [
-            {"id": book1_id, "title": "Алгоритмы: построение и анализ", "author": "Кормен и др.", "year": 2009},
-            {"id": book2_id, "title": "Введение в машинное обучение", "author": "А. Н. Авторов", "year": 2020},
-        ]
-    )
+@app.on_event("startup")
+def on_startup():
+    ensure_schema(engine)
+    search.detect_trigram(engine)
 
-    # Faculties
-    fac_it_id = get_next_faculty_id()
-    fac_math_id = get_next_faculty_id()
+    db = SessionLocal()
+    try:
+        seed_data(db)
+        etags.bump(db, *etags.ALL_TABLES)
+        db.commit()
+        if repository.CATALOG_BACKEND == "memory":
+            repository.memory_catalog.load(db)
+    finally:
+        db.close()
 
-    faculties.extend(
-        [
-            {"id": fac_it_id, "name": "Факультет информационных технологий"},
-            {"id": fac_math_id, "name": "Математический факультет"},
-        ]
-    )
 
-    # Stock
-    branch_stocks.extend(
-        [
-            {"branch_id": main_branch_id, "book_id": book1_id, "copies": 5},
-            {"branch_id": main_branch_id, "book_id": book2_id, "copies": 2},
-            {"branch_id": it_branch_id, "book_id": book1_id, "copies": 3},
-        ]
-    )
+def _ndjson_response(chunks: Iterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
 
-    # Relations book->faculty
-    book_faculties.extend(
-        [
-            {"branch_id": main_branch_id, "book_id": book1_id, "faculty_id": fac_it_id},
-            {"branch_id": main_branch_id, "book_id": book1_id, "faculty_id": fac_math_id},
-            {"branch_id": it_branch_id, "book_id": book1_id, "faculty_id": fac_it_id},
-            {"branch_id": main_branch_id, "book_id": book2_id, "faculty_id": fac_math_id},
-        ]
-    )
+
+# ==========================
+# HEALTH
+# ==========================
+
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
 
 
 # ==========================
-# SCHEMAS (Pydantic)
+# BOOKS
 # ==========================
 
-class BookBase(BaseModel):
-    title: str
-    author: str
-    year: int | None = None
+@app.get("/books", response_model=List[Book], dependencies=[Depends(etags.conditional(etags.BOOKS))])
+def list_books(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: Session = Depends(get_db),
+):
+    if stream:
+        return _ndjson_response(service.stream(db, "books", after_id, limit))
+    return service.list_books(db, response, after_id, limit)
+
+
+@app.get("/books/search", response_model=List[BookSearchHit])
+def search_books(
+    response: Response,
+    q: str = Query(min_length=1, max_length=search.MAX_QUERY_LENGTH),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = Query(None, pattern=search.CURSOR_PATTERN),
+    db: Session = Depends(get_db),
+):
+    """
+    Поиск по названию и автору: полнотекстовый + нечёткий (pg_trgm), по убыванию score.
+    Следующая страница — по курсору из X-Next-Cursor.
+    """
+    return service.search_books(db, response, q, limit, cursor)
 
 
-class Book(BookBase):
-    id: int
+@app.get("/books/{book_id}", response_model=Book, dependencies=[Depends(etags.conditional(etags.BOOKS))])
+def get_book(book_id: int, db: Session = Depends(get_db)):
+    return service.get_book(db, book_id)
 
 
-class BranchBase(BaseModel):
-    name: str
-    address: str | None = None
+@app.post("/books", response_model=Book, status_code=201)
+def create_book(data: BookBase, db: Session = Depends(get_db)):
+    return service.create_book(db, data)
 
 
-class Branch(BranchBase):
-    id: int
+@app.put("/books/{book_id}", response_model=Book)
+def update_book(book_id: int, data: BookBase, db: Session = Depends(get_db)):
+    return service.update_book(db, book_id, data)
 
 
-class Faculty(BaseModel):
-    id: int
-    name: str
+@app.post("/books/import", response_model=BookImportReport)
+async def bulk_import_books(
+    request: Request,
+    format: str | None = Query(None, pattern="^(csv|ndjson)$"),
+):
+    """
+    Массовая загрузка книг: тело запроса (CSV с заголовком title,author,year
+    или NDJSON) читается потоком и грузится через COPY, см. src.bulk_import.
+    Формат — из параметра format или из Content-Type.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
 
+    body = request.stream()
 
-class BranchBookInfo(BaseModel):
-    branch_id: int
-    book_id: int
-    copies: int
+    def chunks():
+        # импорт синхронный (psycopg COPY), тело запроса — async-поток
+        while True:
+            try:
+                yield anyio.from_thread.run(body.__anext__)
+            except StopAsyncIteration:
+                return
 
+    def run() -> BookImportReport:
+        db = SessionLocal()
+        try:
+            return catalog_for(db).import_books(iter_lines(chunks()), format)
+        finally:
+            db.close()
 
-class BookFacultiesResponse(BaseModel):
-    branch_id: int
-    book_id: int
-    faculty_count: int
-    faculties: List[Faculty]
+    return await anyio.to_thread.run_sync(run)
 
 
 # ==========================
-# DB SEED (idempotent)
+# BRANCHES
 # ==========================
 
-def _get_branch_by_name(db: Session, name: str) -> Optional[BranchORM]:
-    return db.scalar(select(BranchORM).where(BranchORM.name == name))
-
-
-def _get_book_by_title(db: Session, title: str) -> Optional[BookORM]:
-    return db.scalar(select(BookORM).where(BookORM.title == title))
-
-
-def _get_faculty_by_name(db: Session, name: str) -> Optional[FacultyORM]:
-    return db.scalar(select(FacultyORM).where(FacultyORM.name == name))
-
-
-def _ensure_branch(db: Session, *, name: str, address: str | None) -> BranchORM:
-    branch = _get_branch_by_name(db, name)
-    if branch is None:
-        branch = BranchORM(name=name, address=address)
-        db.add(branch)
-        db.flush()
-    else:
-        # keep it stable for tests
-        if address is not None and branch.address != address:
-            branch.address = address
-            db.flush()
-    return branch
-
-
-def _ensure_book(db: Session, *, title: str, author: str, year: int | None) -> BookORM:
-    book = _get_book_by_title(db, title)
-    if book is None:
-        book = BookORM(title=title, author=author, year=year)
-        db.add(book)
-        db.flush()
-    else:
-        changed = False
-        if book.author != author:
-            book.author = author
-            changed = True
-        if book.year != year:
-            book.year = year
-            changed = True
-        if changed:
-            db.flush()
-    return book
-
-
-def _ensure_faculty(db: Session, *, name: str) -> FacultyORM:
-    fac = _get_faculty_by_name(db, name)
-    if fac is None:
-        fac = FacultyORM(name=name)
-        db.add(fac)
-        db.flush()
-    return fac
-
-
-def _ensure_stock(db: Session, *, branch_id: int, book_id: int, copies: int) -> None:
-    row = db.scalar(
-        select(BranchStockORM).where(
-            BranchStockORM.branch_id == branch_id,
-            BranchStockORM.book_id == book_id,
-        )
-    )
-    if row is None:
-        db.add(BranchStockORM(branch_id=branch_id, book_id=book_id, copies=copies))
-    else:
-        if row.copies != copies:
-            row.copies = copies
-
-
-def _ensure_book_faculty(db: Session, *, branch_id: int, book_id: int, faculty_id: int) -> None:
-    row = db.scalar(
-        select(BookFacultyORM).where(
-            BookFacultyORM.branch_id == branch_id,
-            BookFacultyORM.book_id == book_id,
-            BookFacultyORM.faculty_id == faculty_id,
-        )
-    )
-    if row is None:
-        db.add(BookFacultyORM(branch_id=branch_id, book_id=book_id, faculty_id=faculty_id))
+@app.get("/branches", response_model=List[Branch], dependencies=[Depends(etags.conditional(etags.BRANCHES))])
+def list_branches(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: Session = Depends(get_db),
+):
+    if stream:
+        return _ndjson_response(service.stream(db, "branches", after_id, limit))
+    return service.list_branches(db, response, after_id, limit)
 
 
-def seed_data(db: Session | None = None) -> None:
+@app.get("/branches/{branch_id}", response_model=Branch, dependencies=[Depends(etags.conditional(etags.BRANCHES))])
+def get_branch(branch_id: int, db: Session = Depends(get_db)):
+    return service.get_branch(db, branch_id)
+
+
+@app.post("/branches", response_model=Branch, status_code=201)
+def create_branch(data: BranchBase, db: Session = Depends(get_db)):
+    return service.create_branch(db, data)
+
+
+@app.put("/branches/{branch_id}", response_model=Branch)
+def update_branch(branch_id: int, data: BranchBase, db: Session = Depends(get_db)):
+    return service.update_branch(db, branch_id, data)
+
+
+# ==========================
+# FACULTIES
+# ==========================
+
+@app.get("/faculties", response_model=List[Faculty], dependencies=[Depends(etags.conditional(etags.FACULTIES))])
+def list_faculties(
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    stream: bool = False,
+    db: Session = Depends(get_db),
+):
+    if stream:
+        return _ndjson_response(service.stream(db, "faculties", after_id, limit))
+    return service.list_faculties(db, response, after_id, limit)
+
+
+@app.get("/faculties/{faculty_id}/books", response_model=List[FacultyBook])
+def list_faculty_books(
+    faculty_id: int,
+    response: Response,
+    branch_id: int | None = Query(None, ge=0),
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: Session = Depends(get_db),
+):
+    return service.list_faculty_books(db, response, faculty_id, branch_id, after_id, limit)
+
+
+# ==========================
+# OPS (ТЗ)
+# ==========================
+
+# Филиал (404), состав книг филиала (фонд + привязки) и названия факультетов.
+BRANCH_BOOK_FACULTIES_TABLES = (etags.BRANCHES, etags.STOCK, etags.BOOK_FACULTIES, etags.FACULTIES)
+
+
+def _ops_cached(db: Session, kind: str, branch_id: int, book_id: int, load) -> tuple:
     """
-    Must satisfy both:
-      - unit tests (db is None): populate in-memory storages
-      - integration tests (db provided): seed postgres data expected by tests
+    (ответ, ETag) из load (service.copies / service.book_faculties) через ops-кэш:
+    304 на попадании не стоит ни запроса, ни сериализации.
+    Одновременные промахи по одной паре — один запрос (ops_flight).
     """
-    # Always ensure memory storages are populated for unit tests
-    _seed_memory_storage(force=True)
+    key = (kind, branch_id, book_id)
+    cached = ops_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = ops_cache.generation
 
-    if db is None:
-        return
+    def fill():
+        result = load(db, branch_id, book_id)
+        ops_cache.set(key, result, generation)
+        return result
 
-    # Core seeded entities required by integration tests
-    main_branch = _ensure_branch(db, name="Главный филиал", address="ул. Академическая, 1")
-    it_branch = _ensure_branch(db, name="ИТ-филиал", address="пр-т Программистов, 42")
+    return ops_flight.do((*key, generation), fill)
 
-    book1 = _ensure_book(db, title="Алгоритмы: построение и анализ", author="Кормен и др.", year=2009)
-    book2 = _ensure_book(db, title="Введение в машинное обучение", author="А. Н. Авторов", year=2020)
 
-    fac_it = _ensure_faculty(db, name="Факультет информационных технологий")
-    fac_math = _ensure_faculty(db, name="Математический факультет")
+@app.get("/branches/{branch_id}/books/{book_id}/copies", response_model=BranchBookInfo)
+def get_copies_in_branch(
+    branch_id: int, book_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    info, etag = _ops_cached(db, COPIES, branch_id, book_id, service.copies)
+    etags.respond(request, response, etag)
+    return info
 
-    # Stock
-    _ensure_stock(db, branch_id=main_branch.id, book_id=book1.id, copies=5)
-    _ensure_stock(db, branch_id=main_branch.id, book_id=book2.id, copies=2)
-    _ensure_stock(db, branch_id=it_branch.id, book_id=book1.id, copies=3)
-    # Note: it_branch-book2 not seeded => copies endpoint must return 0
 
-    # Book-Faculty relations
-    _ensure_book_faculty(db, branch_id=main_branch.id, book_id=book1.id, faculty_id=fac_it.id)
-    _ensure_book_faculty(db, branch_id=main_branch.id, book_id=book1.id, faculty_id=fac_math.id)
-    _ensure_book_faculty(db, branch_id=it_branch.id, book_id=book1.id, faculty_id=fac_it.id)
-    _ensure_book_faculty(db, branch_id=main_branch.id, book_id=book2.id, faculty_id=fac_math.id)
+@app.post("/copies/batch", response_model=CopiesBatchResponse)
+def get_copies_batch(data: CopiesBatchRequest, db: Session = Depends(get_db)):
+    """
+    Пакетный вариант get_copies_in_branch: все пары разрешаются одним запросом.
+    Неизвестный филиал или книга не валят весь запрос, а возвращаются
+    ошибкой в своём элементе.
+    """
+    return service.copies_batch(db, data)
 
-    # Optional CI entities (harmless; prevents "CI Book One" style checks from failing)
-    _ensure_branch(db, name="CI Branch One", address="Test street, 1")
-    _ensure_branch(db, name="CI Branch Two", address="Test street, 2")
-    _ensure_book(db, title="CI Book One", author="Test Author", year=2001)
-    _ensure_book(db, title="CI Book Two", author="Test Author", year=2002)
 
-    db.commit()
+@app.get("/branches/{branch_id}/books/{book_id}/faculties", response_model=BookFacultiesResponse)
+def get_book_faculties(
+    branch_id: int, book_id: int, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    result, etag = _ops_cached(db, FACULTIES, branch_id, book_id, service.book_faculties)
+    etags.respond(request, response, etag)
+    return result
+
+
+@app.get(
+    "/branches/{branch_id}/books/faculties",
+    response_model=List[BookFacultiesResponse],
+    dependencies=[Depends(etags.conditional(*BRANCH_BOOK_FACULTIES_TABLES))],
+)
+def list_branch_book_faculties(
+    branch_id: int,
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """
+    Требование #2 сразу для всех книг филиала (есть в фонде или привязаны
+    к факультету). Пагинация по book_id — как у списочных эндпоинтов.
+    """
+    return service.list_branch_book_faculties(db, response, branch_id, after_id, limit)
 
 
-@app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
+@app.post("/branches/{branch_id}/books/faculties/batch", response_model=BookFacultiesBatchResponse)
+def get_book_faculties_batch(branch_id: int, data: BookIdsRequest, db: Session = Depends(get_db)):
+    return service.book_faculties_batch(db, branch_id, data)
 
-    from src.db import SessionLocal
 
-    db = SessionLocal()
-    try:
-        seed_data(db)
-    finally:
-        db.close()
+@app.post("/branches/{branch_id}/books/{book_id}/faculties/{faculty_id}", response_model=BookFacultiesResponse)
+def add_book_faculty(branch_id: int, book_id: int, faculty_id: int, db: Session = Depends(get_db)):
+    """Одиночный вариант add_book_faculties: проверка и вставка — один запрос, повтор не ошибка."""
+    service.add_book_faculty(db, branch_id, book_id, faculty_id)
+    return _ops_cached(db, FACULTIES, branch_id, book_id, service.book_faculties)[0]
+
+
+@app.post("/book-faculties/batch", response_model=BookFacultyLinksResponse)
+def add_book_faculties(data: BookFacultyLinksRequest, db: Session = Depends(get_db)):
+    """
+    Массовая привязка книг к факультетам (филиал, книга, факультет) одним
+    INSERT ... ON CONFLICT DO NOTHING. Статус по каждому элементу: added,
+    exists (связь уже была) или error (нет филиала/книги/факультета —
+    остальные элементы это не останавливает).
+    """
+    return service.add_book_faculties(db, data)
+
+
+@app.post("/book-faculties/batch/delete", response_model=BookFacultyLinksResponse)
+def remove_book_faculties(data: BookFacultyLinksRequest, db: Session = Depends(get_db)):
+    """Массовое удаление привязок одним DELETE; статусы removed / absent / error."""
+    return service.remove_book_faculties(db, data)
 
 
 # ==========================
-# HEALTH
+# LOANS
 # ==========================
 
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
+@app.post("/branches/{branch_id}/books/{book_id}/checkout", response_model=Loan, status_code=201)
+def checkout_book(branch_id: int, book_id: int, data: LoanCreate, db: Session = Depends(get_db)):
+    return service.checkout_book(db, branch_id, book_id, data)
+
+
+@app.post("/loans/{loan_id}/checkin", response_model=Loan)
+def checkin_book(loan_id: int, db: Session = Depends(get_db)):
+    return service.checkin_book(db, loan_id)
+
+
+@app.get("/loans/{loan_id}", response_model=Loan)
+def get_loan(loan_id: int, db: Session = Depends(get_db)):
+    return service.get_loan(db, loan_id)
 
 
 # ==========================
-# BOOKS
+# CIRCULATION
 # ==========================
 
-@app.get("/books", response_model=List[Book])
-def list_books(db: Session = Depends(get_db)):
-    rows = db.scalars(select(BookORM).order_by(BookORM.id)).all()
-    return [Book(id=r.id, title=r.title, author=r.author, year=r.year) for r in rows]
+@app.get("/books/{book_id}/circulation", response_model=BookCirculation)
+def get_book_circulation(book_id: int, db: Session = Depends(get_db)):
+    return service.book_circulation(db, book_id)
 
 
-@app.get("/books/{book_id}", response_model=Book)
-def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.get(BookORM, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Книга не найдена")
-    return Book(id=book.id, title=book.title, author=book.author, year=book.year)
+@app.get("/branches/{branch_id}/circulation", response_model=List[CirculationStats])
+def list_branch_circulation(
+    branch_id: int,
+    response: Response,
+    after_id: int | None = Query(None, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    db: Session = Depends(get_db),
+):
+    return service.list_branch_circulation(db, response, branch_id, after_id, limit)
 
 
-@app.post("/books", response_model=Book, status_code=201)
-def create_book(data: BookBase, db: Session = Depends(get_db)):
-    book = BookORM(**data.model_dump())
-    db.add(book)
-    db.commit()
-    db.refresh(book)
-    return Book(id=book.id, title=book.title, author=book.author, year=book.year)
+@app.get("/circulation/top", response_model=List[CirculationTopItem])
+def get_circulation_top(
+    limit: int = Query(10, ge=1, le=100),
+    by: str = Query("loans", pattern="^(loans|students)$"),
+    branch_id: int | None = None,
+    db: Session = Depends(get_db),
+):
+    return service.circulation_top(db, limit, by, branch_id)
 
 
-@app.put("/books/{book_id}", response_model=Book)
-def update_book(book_id: int, data: BookBase, db: Session = Depends(get_db)):
-    book = db.get(BookORM, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Книга не найдена")
-
-    payload = data.model_dump()
-    book.title = payload["title"]
-    book.author = payload["author"]
-    book.year = payload["year"]
-    db.commit()
-    db.refresh(book)
+# ==========================
+# AVAILABILITY
+# ==========================
 
-    return Book(id=book.id, title=book.title, author=book.author, year=book.year)
+@app.get("/books/{book_id}/availability", response_model=BookAvailability)
+def get_book_availability(book_id: int, branches: bool = True, db: Session = Depends(get_db)):
+    """Экземпляры книги по всей библиотеке (и по филиалам, если branches=true)."""
+    return service.book_availability(db, book_id, branches)
+
+
+@app.post("/books/availability/batch", response_model=BookAvailabilityBatchResponse)
+def get_books_availability(data: BookIdsRequest, branches: bool = True, db: Session = Depends(get_db)):
+    return service.books_availability(db, data, branches)
 
 
 # ==========================
-# BRANCHES
+# EXPORT
 # ==========================
 
-@app.get("/branches", response_model=List[Branch])
-def list_branches(db: Session = Depends(get_db)):
-    rows = db.scalars(select(BranchORM).order_by(BranchORM.id)).all()
-    return [Branch(id=r.id, name=r.name, address=r.address) for r in rows]
+@app.get("/export/{name}")
+def export_catalog(
+    request: Request,
+    name: str = Path(pattern="^(books|stock|book-faculties)$"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    denormalized: bool = False,
+):
+    """
+    Полная выгрузка таблицы потоком (chunked), см. src.export.
+    denormalized — с названиями филиалов/книг/факультетов (для stock и book-faculties).
+    Если клиент принимает gzip (Accept-Encoding), ответ сжимается на лету.
+    """
+    gzip = accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        iter_export(name, format, denormalized=denormalized, gzip=gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
 
 
-@app.get("/branches/{branch_id}", response_model=Branch)
-def get_branch(branch_id: int, db: Session = Depends(get_db)):
-    branch = db.get(BranchORM, branch_id)
-    if not branch:
-        raise HTTPException(status_code=404, detail="Филиал не найден")
-    return Branch(id=branch.id, name=branch.name, address=branch.address)
+# ==========================
+# CHANGES (лента изменений, см. src.changes)
+# ==========================
 
+ChangeEntity = Literal["book", "branch", "book_faculty", "stock"]
 
-@app.post("/branches", response_model=Branch, status_code=201)
-def create_branch(data: BranchBase, db: Session = Depends(get_db)):
-    branch = BranchORM(**data.model_dump())
-    db.add(branch)
-    db.commit()
-    db.refresh(branch)
-    return Branch(id=branch.id, name=branch.name, address=branch.address)
+
+@app.get("/changes")
+async def change_stream(
+    request: Request,
+    after: int | None = Query(None, ge=0),
+    entity: List[ChangeEntity] = Query([]),
+):
+    """
+    Server-Sent Events с событиями после seq after (или заголовка
+    Last-Event-ID, который браузер шлёт сам при переподключении);
+    entity — только события этих сущностей. Без after — с текущего момента.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if after is None and last_event_id.isdigit():
+        after = int(last_event_id)
+    return StreamingResponse(
+        changes.sse(changes.feed.events(after, frozenset(entity))),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@app.put("/branches/{branch_id}", response_model=Branch)
-def update_branch(branch_id: int, data: BranchBase, db: Session = Depends(get_db)):
-    branch = db.get(BranchORM, branch_id)
-    if not branch:
-        raise HTTPException(status_code=404, detail="Филиал не найден")
+@app.websocket("/changes/ws")
+async def change_socket(
+    websocket: WebSocket,
+    after: int | None = Query(None, ge=0),
+    entity: List[ChangeEntity] = Query([]),
+):
+    """Та же лента по WebSocket: по текстовому JSON-сообщению на событие."""
+    await websocket.accept()
+    await changes.serve_websocket(websocket, changes.feed.events(after, frozenset(entity)))
 
-    payload = data.model_dump()
-    branch.name = payload["name"]
-    branch.address = payload["address"]
-    db.commit()
-    db.refresh(branch)
-    return Branch(id=branch.id, name=branch.name, address=branch.address)
+
+@app.on_event("shutdown")
+async def stop_change_feed():
+    await changes.feed.stop()
+
+
+@app.on_event("shutdown")
+def flush_error_hooks():
+    # принятые события — sinks'ам до выхода; зависший sink не держит остановку дольше таймаута
+    error_hooks.pipeline.flush()
 
 
 # ==========================
-# FACULTIES
+# CACHE
 # ==========================
 
-@app.get("/faculties", response_model=List[Faculty])
-def list_faculties(db: Session = Depends(get_db)):
-    rows = db.scalars(select(FacultyORM).order_by(FacultyORM.id)).all()
-    return [Faculty(id=r.id, name=r.name) for r in rows]
+@app.get("/cache/stats")
+def cache_stats():
+    """Статистика ops-кэша; singleflight — ведущие запросы и подхватившие их результат."""
+    flights = [ops_flight.stats(), ops_aflight.stats()]
+    return {**ops_cache.stats(), "singleflight": {k: sum(f[k] for f in flights) for k in flights[0]}}
 
 
 # ==========================
-# OPS (ТЗ)
+# METRICS
 # ==========================
 
-@app.get("/branches/{branch_id}/books/{book_id}/copies", response_model=BranchBookInfo)
-def get_copies_in_branch(branch_id: int, book_id: int, db: Session = Depends(get_db)):
-    if not db.get(BranchORM, branch_id):
-        raise HTTPException(status_code=404, detail="Филиал не найден")
-    if not db.get(BookORM, book_id):
-        raise HTTPException(status_code=404, detail="Книга не найдена")
-
-    copies = db.scalar(
-        select(BranchStockORM.copies).where(
-            BranchStockORM.branch_id == branch_id,
-            BranchStockORM.book_id == book_id,
-        )
+def _runtime_metrics():
+    pools = {"sync": engine.pool}
+    if get_db_mode() == "async":
+        pools["async"] = get_async_sessionmaker().kw["bind"].sync_engine.pool
+    yield from metrics.gauge(
+        "db_pool_connections", "Соединения пула по состоянию",
+        [sample for name, pool in pools.items() for sample in metrics.pool_samples(name, pool)],
     )
-    return BranchBookInfo(branch_id=branch_id, book_id=book_id, copies=int(copies or 0))
+    if POOL_CLASS != "null":
+        yield from metrics.gauge(
+            "db_pool_limit", "Настройки пула (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT)",
+            [({"limit": "size"}, POOL_SIZE), ({"limit": "max_overflow"}, MAX_OVERFLOW),
+             ({"limit": "timeout_seconds"}, POOL_TIMEOUT)],
+        )
 
+    replica_set = get_async_replicas() if get_db_mode() == "async" else get_replicas()
+    if replica_set is not None:
+        yield from metrics.gauge(
+            "db_replica_up", "Реплика в ротации чтения",
+            [({"replica": str(i)}, int(r.healthy)) for i, r in enumerate(replica_set.replicas)],
+        )
+        yield from metrics.gauge(
+            "db_replica_lag_seconds", "Отставание реплики на последней проверке",
+            [({"replica": str(i)}, r.lag) for i, r in enumerate(replica_set.replicas) if r.lag is not None],
+        )
 
-@app.get("/branches/{branch_id}/books/{book_id}/faculties", response_model=BookFacultiesResponse)
-def get_book_faculties(branch_id: int, book_id: int, db: Session = Depends(get_db)):
-    if not db.get(BranchORM, branch_id):
-        raise HTTPException(status_code=404, detail="Филиал не найден")
-    if not db.get(BookORM, book_id):
-        raise HTTPException(status_code=404, detail="Книга не найдена")
-
-    rows = db.execute(
-        select(FacultyORM.id, FacultyORM.name)
-        .join(BookFacultyORM, BookFacultyORM.faculty_id == FacultyORM.id)
-        .where(
-            BookFacultyORM.branch_id == branch_id,
-            BookFacultyORM.book_id == book_id,
+    if admission.ADMISSION_ENABLED:
+        limiters = admission.limiters.items()
+        yield from metrics.gauge(
+            "http_admission_in_flight", "Выполняющиеся запросы по классу",
+            [({"class": name}, limiter.active) for name, limiter in limiters],
+        )
+        yield from metrics.gauge(
+            "http_admission_queued", "Запросы в очереди допуска по классу",
+            [({"class": name}, limiter.waiting) for name, limiter in limiters],
+        )
+        yield from metrics.gauge(
+            "http_admission_limit", "Лимиты допуска (ADMISSION_<CLASS>_LIMIT / _QUEUE)",
+            [({"class": name, "limit": kind}, getattr(limiter, kind))
+             for name, limiter in limiters for kind in ("limit", "queue")],
         )
-        .order_by(FacultyORM.id)
-    ).all()
-
-    facs = [Faculty(id=r[0], name=r[1]) for r in rows]
-    return BookFacultiesResponse(
-        branch_id=branch_id,
-        book_id=book_id,
-        faculty_count=len(facs),
-        faculties=facs,
-    )
 
+    yield from metrics.gauge("change_feed_subscribers", "Подписчики ленты изменений", [({}, changes.feed.subscribers)])
 
-@app.post("/branches/{branch_id}/books/{book_id}/faculties/{faculty_id}", response_model=BookFacultiesResponse)
-def add_book_faculty(branch_id: int, book_id: int, faculty_id: int, db: Session = Depends(get_db)):
-    if not db.get(BranchORM, branch_id):
-        raise HTTPException(status_code=404, detail="Филиал не найден")
-    if not db.get(BookORM, book_id):
-        raise HTTPException(status_code=404, detail="Книга не найдена")
-    if not db.get(FacultyORM, faculty_id):
-        raise HTTPException(status_code=404, detail="Факультет не найден")
-
-    exists = db.scalar(
-        select(BookFacultyORM).where(
-            BookFacultyORM.branch_id == branch_id,
-            BookFacultyORM.book_id == book_id,
-            BookFacultyORM.faculty_id == faculty_id,
-        )
+    yield from metrics.gauge(
+        "error_hook_queue_depth", "События в очереди хуков ошибок", [({}, error_hooks.pipeline.depth)]
     )
-    if not exists:
-        db.add(BookFacultyORM(branch_id=branch_id, book_id=book_id, faculty_id=faculty_id))
-        db.commit()
 
-    return get_book_faculties(branch_id, book_id, db)
+    stats = ops_cache.stats()
+    yield from metrics.gauge("ops_cache_entries", "Записей в ops-кэше", [({}, stats["size"])])
+    for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        yield f"# HELP ops_cache_{name}_total ops-кэш: {name}"
+        yield f"# TYPE ops_cache_{name}_total counter"
+        yield f"ops_cache_{name}_total {stats[name]}"
+
+    yield "# HELP ops_singleflight_requests_total Промахи ops-кэша: leader — ходил в БД, coalesced — взял его результат"
+    yield "# TYPE ops_singleflight_requests_total counter"
+    for mode, flight in (("sync", ops_flight), ("async", ops_aflight)):
+        yield f'ops_singleflight_requests_total{{mode="{mode}",role="leader"}} {flight.leaders}'
+        yield f'ops_singleflight_requests_total{{mode="{mode}",role="coalesced"}} {flight.coalesced}'
+
+
+metrics.registry.add_collector(_runtime_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus text exposition format."""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ==========================
+# ASYNC MODE (DB_MODE=async)
+# ==========================
+
+def _use_async_routes(application: FastAPI) -> None:
+    """
+    Подменяет синхронные CRUD/OPS-эндпоинты их async-версиями из src.async_api.
+    Остальные маршруты (health и т. п.) остаются как есть.
+    """
+    from src.async_api import router
+
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    application.router.routes = [
+        route
+        for route in application.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, m) in replaced for m in route.methods))
+    ] + list(router.routes)
+    application.on_event("shutdown")(dispose_async_engine)
 
 
-# Make unit tests bulletproof even if they only import main and check storages immediately.
-_seed_memory_storage(force=True)
+if get_db_mode() == "async":
+    _use_async_routes(app)
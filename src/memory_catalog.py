@@ -0,0 +1,352 @@
+"""
+Каталог в памяти процесса: книги, филиалы, факультеты, остатки и привязки
+к факультетам — те же чтения, что у SqlCatalog (src.repository).
+
+Записи — NamedTuple (__slots__ = (), без __dict__), они же строки страниц:
+json_rows и NDJSON берут их как строки select(...). Индексы:
+
+* записи по id и отсортированный список id — keyset-страницы через bisect;
+* остаток и факультеты по паре (branch_id, book_id), сумма остатков по книге;
+* книги филиала (есть в фонде или привязаны) — отсортированный список;
+* обратный индекс по faculty_id: книги факультета, а для пары
+  (факультет, книга) — филиалы, и книги факультета в филиале.
+
+Изменения — только под блокировкой записи. Читатели не блокируются:
+они берут срез (копию) списка — под GIL это атомарно, и одновременная
+запись не ломает обход.
+
+Сам каталог id не выдаёт и в БД не пишет: записи с уже известными id
+приносит WriteThroughCatalog (src.repository) после коммита в PostgreSQL,
+load снимает снимок из БД при старте. Копия своя у каждого процесса —
+записи, сделанные другими воркерами, она не видит.
+"""
+import json
+import threading
+from bisect import bisect_right, insort
+from typing import Iterable, Iterator, NamedTuple, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.models import (
+    Book as BookORM,
+    Branch as BranchORM,
+    Faculty as FacultyORM,
+    BranchStock as BranchStockORM,
+    BookFaculty as BookFacultyORM,
+)
+from src.queries import LINK_ABSENT, LINK_ADDED, LINK_ERROR, LINK_EXISTS, LINK_REMOVED
+from src.schemas import (
+    Book,
+    BookFacultiesResponse,
+    BookFacultyLink,
+    BookFacultyLinkResult,
+    Branch,
+    BranchBookPair,
+    CopiesBatchItem,
+    Faculty,
+)
+from src.streaming import STREAM_BATCH_SIZE
+
+
+class BookRecord(NamedTuple):
+    id: int
+    title: str
+    author: str
+    year: int | None
+
+
+class BranchRecord(NamedTuple):
+    id: int
+    name: str
+    address: str | None
+
+
+class FacultyRecord(NamedTuple):
+    id: int
+    name: str
+
+
+class FacultyBookRow(NamedTuple):
+    id: int
+    title: str
+    author: str
+    year: int | None
+    copies: int
+    branch_ids: list[int]
+
+
+def _after(ids: list[int], after_id: int | None, limit: int | None) -> list[int]:
+    """limit + 1 id после after_id из отсортированного списка (limit None — все)."""
+    start = 0 if after_id is None else bisect_right(ids, after_id)
+    return ids[start:] if limit is None else ids[start:start + limit + 1]
+
+
+def _add(index: dict, key, value: int) -> bool:
+    ids = index.setdefault(key, [])
+    pos = bisect_right(ids, value)
+    if pos and ids[pos - 1] == value:
+        return False
+    ids.insert(pos, value)
+    return True
+
+
+def _discard(index: dict, key, value: int) -> bool:
+    ids = index.get(key)
+    if not ids:
+        return False
+    pos = bisect_right(ids, value)
+    if not pos or ids[pos - 1] != value:
+        return False
+    del ids[pos - 1]
+    if not ids:
+        del index[key]
+    return True
+
+
+class _Table:
+    __slots__ = ("rows", "ids")
+
+    def __init__(self):
+        self.rows: dict[int, NamedTuple] = {}
+        self.ids: list[int] = []
+
+    def put(self, record) -> None:
+        # запись раньше id: читатель, увидевший id в списке, найдёт и запись
+        new = record.id not in self.rows
+        self.rows[record.id] = record
+        if new:
+            insort(self.ids, record.id)
+
+    def page(self, after_id: int | None, limit: int | None) -> list:
+        rows = self.rows
+        return [rows[i] for i in _after(self.ids, after_id, limit)]
+
+
+def _load_books(db: Session) -> _Table:
+    books = _Table()
+    for r in db.execute(select(BookORM.id, BookORM.title, BookORM.author, BookORM.year)):
+        books.put(BookRecord(*r))
+    return books
+
+
+class MemoryCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._books = _Table()
+        self._branches = _Table()
+        self._faculties = _Table()
+        self._stock: dict[tuple[int, int], int] = {}
+        self._book_copies: dict[int, int] = {}
+        self._pair_faculties: dict[tuple[int, int], list[int]] = {}
+        self._branch_books: dict[int, list[int]] = {}
+        self._faculty_books: dict[int, list[int]] = {}
+        self._faculty_book_branches: dict[tuple[int, int], list[int]] = {}
+        self._faculty_branch_books: dict[tuple[int, int], list[int]] = {}
+
+    def load(self, db: Session) -> None:
+        """Снимок каталога из PostgreSQL вместо текущего содержимого."""
+        with self._lock:
+            self.clear()
+            self._books = _load_books(db)
+            for r in db.execute(select(BranchORM.id, BranchORM.name, BranchORM.address)):
+                self._branches.put(BranchRecord(*r))
+            for r in db.execute(select(FacultyORM.id, FacultyORM.name)):
+                self._faculties.put(FacultyRecord(*r))
+            for branch_id, book_id, copies in db.execute(
+                select(BranchStockORM.branch_id, BranchStockORM.book_id, BranchStockORM.copies)
+            ):
+                self._set_copies(branch_id, book_id, copies)
+            for branch_id, book_id, faculty_id in db.execute(
+                select(BookFacultyORM.branch_id, BookFacultyORM.book_id, BookFacultyORM.faculty_id)
+            ):
+                self._link(branch_id, book_id, faculty_id)
+
+    def load_books(self, db: Session) -> None:
+        """
+        Книги заново из PostgreSQL (после массового импорта). Запрос идёт под
+        блокировкой записи, так что put, ждущий её, не теряется; читатели
+        до подмены видят прежнюю таблицу целиком.
+        """
+        with self._lock:
+            self._books = _load_books(db)
+
+    # ==========================
+    # BOOKS / BRANCHES / FACULTIES
+    # ==========================
+
+    def books_page(self, after_id: int | None, limit: int | None) -> list[BookRecord]:
+        return self._books.page(after_id, limit)
+
+    def get_book(self, book_id: int) -> Book | None:
+        r = self._books.rows.get(book_id)
+        return None if r is None else Book(**r._asdict())
+
+    def put_book(self, book: Book) -> None:
+        with self._lock:
+            self._books.put(BookRecord(book.id, book.title, book.author, book.year))
+
+    def branches_page(self, after_id: int | None, limit: int | None) -> list[BranchRecord]:
+        return self._branches.page(after_id, limit)
+
+    def get_branch(self, branch_id: int) -> Branch | None:
+        r = self._branches.rows.get(branch_id)
+        return None if r is None else Branch(**r._asdict())
+
+    def put_branch(self, branch: Branch) -> None:
+        with self._lock:
+            self._branches.put(BranchRecord(branch.id, branch.name, branch.address))
+
+    def faculties_page(self, after_id: int | None, limit: int | None) -> list[FacultyRecord]:
+        return self._faculties.page(after_id, limit)
+
+    def get_faculty(self, faculty_id: int) -> Faculty | None:
+        r = self._faculties.rows.get(faculty_id)
+        return None if r is None else Faculty(**r._asdict())
+
+    def put_faculty(self, faculty: Faculty) -> None:
+        with self._lock:
+            self._faculties.put(FacultyRecord(faculty.id, faculty.name))
+
+    def stream(self, table: str, after_id: int | None, limit: int | None) -> Iterator[bytes]:
+        source = {"books": self._books, "branches": self._branches, "faculties": self._faculties}[table]
+        sent = 0
+        while limit is None or sent < limit:
+            size = STREAM_BATCH_SIZE if limit is None else min(STREAM_BATCH_SIZE, limit - sent)
+            rows = source.page(after_id, size)[:size]
+            if not rows:
+                return
+            yield "".join(json.dumps(r._asdict(), ensure_ascii=False) + "\n" for r in rows).encode()
+            sent += len(rows)
+            after_id = rows[-1].id
+
+    # ==========================
+    # STOCK
+    # ==========================
+
+    def _set_copies(self, branch_id: int, book_id: int, copies: int) -> None:
+        pair = (branch_id, book_id)
+        self._book_copies[book_id] = self._book_copies.get(book_id, 0) - self._stock.get(pair, 0) + copies
+        self._stock[pair] = copies
+        _add(self._branch_books, branch_id, book_id)
+
+    def set_copies(self, branch_id: int, book_id: int, copies: int) -> None:
+        with self._lock:
+            self._set_copies(branch_id, book_id, copies)
+
+    def add_copies(self, branch_id: int, book_id: int, delta: int) -> None:
+        """Выдача (-1) или возврат (+1): приращения от разных запросов складываются в любом порядке."""
+        with self._lock:
+            self._set_copies(branch_id, book_id, self._stock.get((branch_id, book_id), 0) + delta)
+
+    def copies(self, branch_id: int, book_id: int) -> int:
+        return self._stock.get((branch_id, book_id), 0)
+
+    def copies_batch(self, pairs: Sequence[BranchBookPair]) -> list[CopiesBatchItem]:
+        items = []
+        for p in pairs:
+            if p.branch_id not in self._branches.rows:
+                items.append(CopiesBatchItem(branch_id=p.branch_id, book_id=p.book_id, error="Филиал не найден"))
+            elif p.book_id not in self._books.rows:
+                items.append(CopiesBatchItem(branch_id=p.branch_id, book_id=p.book_id, error="Книга не найдена"))
+            else:
+                items.append(CopiesBatchItem(
+                    branch_id=p.branch_id, book_id=p.book_id, copies=self.copies(p.branch_id, p.book_id)
+                ))
+        return items
+
+    # ==========================
+    # FACULTY LINKS
+    # ==========================
+
+    def book_faculties(self, branch_id: int, book_id: int) -> BookFacultiesResponse:
+        names = self._faculties.rows
+        facs = [Faculty(id=f, name=names[f].name) for f in self._pair_faculties.get((branch_id, book_id), [])[:]]
+        return BookFacultiesResponse(branch_id=branch_id, book_id=book_id, faculty_count=len(facs), faculties=facs)
+
+    def branch_book_faculties(
+        self, branch_id: int, after_id: int | None, limit: int | None
+    ) -> list[BookFacultiesResponse]:
+        return [
+            self.book_faculties(branch_id, book_id)
+            for book_id in _after(self._branch_books.get(branch_id, []), after_id, limit)
+        ]
+
+    def book_faculties_batch(self, branch_id: int, book_ids: Iterable[int]) -> list[BookFacultiesResponse]:
+        existing = sorted(k for k in set(book_ids) if k in self._books.rows)
+        return [self.book_faculties(branch_id, book_id) for book_id in existing]
+
+    def _link(self, branch_id: int, book_id: int, faculty_id: int) -> bool:
+        if not _add(self._pair_faculties, (branch_id, book_id), faculty_id):
+            return False
+        _add(self._branch_books, branch_id, book_id)
+        if _add(self._faculty_book_branches, (faculty_id, book_id), branch_id):
+            _add(self._faculty_books, faculty_id, book_id)
+        _add(self._faculty_branch_books, (faculty_id, branch_id), book_id)
+        return True
+
+    def _unlink(self, branch_id: int, book_id: int, faculty_id: int) -> bool:
+        pair = (branch_id, book_id)
+        if not _discard(self._pair_faculties, pair, faculty_id):
+            return False
+        if pair not in self._pair_faculties and pair not in self._stock:
+            _discard(self._branch_books, branch_id, book_id)
+        _discard(self._faculty_branch_books, (faculty_id, branch_id), book_id)
+        _discard(self._faculty_book_branches, (faculty_id, book_id), branch_id)
+        if (faculty_id, book_id) not in self._faculty_book_branches:
+            _discard(self._faculty_books, faculty_id, book_id)
+        return True
+
+    def _apply_links(
+        self, links: Sequence[BookFacultyLink], change, done: str, noop: str
+    ) -> list[BookFacultyLinkResult]:
+        items = []
+        with self._lock:
+            for x in links:
+                link = x.model_dump()
+                if x.branch_id not in self._branches.rows:
+                    items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Филиал не найден"))
+                elif x.book_id not in self._books.rows:
+                    items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Книга не найдена"))
+                elif x.faculty_id not in self._faculties.rows:
+                    items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Факультет не найден"))
+                else:
+                    changed = change(x.branch_id, x.book_id, x.faculty_id)
+                    items.append(BookFacultyLinkResult(**link, status=done if changed else noop))
+        return items
+
+    def add_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        return self._apply_links(links, self._link, LINK_ADDED, LINK_EXISTS)
+
+    def remove_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        return self._apply_links(links, self._unlink, LINK_REMOVED, LINK_ABSENT)
+
+    def sync_links(self, items: Sequence[BookFacultyLinkResult]) -> None:
+        """Итог привязки/удаления в PostgreSQL: связь есть (added, exists) или её нет (removed, absent)."""
+        with self._lock:
+            for x in items:
+                if x.status in (LINK_ADDED, LINK_EXISTS):
+                    self._link(x.branch_id, x.book_id, x.faculty_id)
+                elif x.status in (LINK_REMOVED, LINK_ABSENT):
+                    self._unlink(x.branch_id, x.book_id, x.faculty_id)
+
+    def faculty_books(
+        self, faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None
+    ) -> list[FacultyBookRow]:
+        if branch_id is None:
+            book_ids = _after(self._faculty_books.get(faculty_id, []), after_id, limit)
+        else:
+            book_ids = _after(self._faculty_branch_books.get((faculty_id, branch_id), []), after_id, limit)
+        rows = []
+        for book_id in book_ids:
+            book = self._books.rows[book_id]
+            if branch_id is None:
+                copies = self._book_copies.get(book_id, 0)
+                branch_ids = self._faculty_book_branches.get((faculty_id, book_id), [])[:]
+            else:
+                copies, branch_ids = self.copies(branch_id, book_id), [branch_id]
+            rows.append(FacultyBookRow(*book, copies, branch_ids))
+        return rows
@@ -0,0 +1,312 @@
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+- MetricsMiddleware (чистый ASGI) — латентность по маршруту (шаблону пути,
+  а не конкретному URL), число SQL-запросов и время в БД на запрос;
+- события Engine — время каждого SQL-запроса, привязка к текущему запросу
+  через contextvar (он копируется в threadpool и в greenlet async-движка);
+- TimedQueuePool / TimedAsyncQueuePool — ожидание соединения из пула.
+
+На запрос приходится пара perf_counter и несколько операций со словарями
+под общим lock, поэтому метрики можно держать включёнными в продакшене.
+Выключаются METRICS_ENABLED=0.
+"""
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по бакетам..., +Inf, sum]
+        self._values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def count(self, *labels: str) -> int:
+        row = self._values.get(labels)
+        return int(sum(row[:-1])) if row else 0
+
+    def sum(self, *labels: str) -> float:
+        row = self._values.get(labels)
+        return row[-1] if row else 0.0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(row)) for labels, row in self._values.items()]
+        for labels, row in items:
+            cumulative = 0.0
+            for bound, n in zip(self.buckets + ("+Inf",), row):
+                cumulative += n
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {row[-1]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """Функция, которая в момент выдачи /metrics отдаёт готовые строки (gauge и т. п.)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help: str, samples: Iterable[tuple[dict, float]]) -> Iterable[str]:
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} gauge"
+    for labels, value in samples:
+        yield f"{name}{_labels(list(labels), list(labels.values()))} {value}"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(
+    Counter("http_requests_total", "HTTP-запросы по маршруту и статусу", ("method", "route", "status"))
+)
+HTTP_LATENCY = registry.register(
+    Histogram("http_request_duration_seconds", "Время обработки запроса", ("method", "route"))
+)
+DB_STATEMENTS = registry.register(
+    Histogram("http_request_db_statements", "SQL-запросов на HTTP-запрос", ("method", "route"), COUNT_BUCKETS)
+)
+DB_TIME = registry.register(
+    Histogram("http_request_db_seconds", "Время в БД на HTTP-запрос", ("method", "route"))
+)
+DB_STATEMENT_LATENCY = registry.register(
+    Histogram("db_statement_duration_seconds", "Время одного SQL-запроса")
+)
+POOL_WAIT = registry.register(
+    Histogram("db_pool_checkout_wait_seconds", "Ожидание соединения из пула", ("pool",))
+)
+SESSION_WAIT = registry.register(
+    Histogram("db_session_wait_seconds", "Ожидание слота сессии в get_db (до обращения к пулу)")
+)
+ADMISSION = registry.register(
+    Counter(
+        "http_admission_total",
+        "Допуск запросов: admitted — сразу, queued — после очереди, rejected — очередь полна, timeout",
+        ("class", "outcome"),
+    )
+)
+ADMISSION_WAIT = registry.register(
+    Histogram("http_admission_wait_seconds", "Ожидание в очереди допуска", ("class",))
+)
+POOL_CONNECTS = registry.register(
+    Counter("db_pool_connects_total", "Новые соединения с БД (у NullPool — на каждый checkout)")
+)
+POOL_INVALIDATIONS = registry.register(
+    Counter("db_pool_invalidations_total", "Соединения, выброшенные из пула как битые")
+)
+ERROR_EVENTS = registry.register(
+    Counter("error_hook_events_total", "Ошибки запросов, принятые в очередь хуков", ("kind",))
+)
+ERROR_DROPPED = registry.register(
+    Counter("error_hook_dropped_total", "Ошибки, не попавшие в очередь хуков: overflow — полна, sampled", ("reason",))
+)
+ERROR_FAILURES = registry.register(
+    Counter("error_hook_failures_total", "Упавшие хуки и sink'и", ("target",))
+)
+
+
+# ==========================
+# DB
+# ==========================
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("metrics_request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # старт — на контексте выполнения: упавший запрос уходит вместе с ним, ничего не копится
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_start", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_STATEMENT_LATENCY.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _on_connect(dbapi_connection, connection_record):
+    POOL_CONNECTS.inc()
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    POOL_INVALIDATIONS.inc()
+
+
+def instrument_engines() -> None:
+    """События на классы Engine и Pool — ловят и sync-, и async-движок, и реплики."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Pool, "connect", _on_connect)
+        event.listen(Pool, "invalidate", _on_invalidate)
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started, "sync")
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started, "async")
+
+
+def pool_samples(name: str, pool) -> Iterable[tuple[dict, float]]:
+    if not isinstance(pool, QueuePool):
+        return []
+    return [
+        ({"pool": name, "state": "checked_out"}, pool.checkedout()),
+        ({"pool": name, "state": "idle"}, pool.checkedin()),
+        ({"pool": name, "state": "overflow"}, max(pool.overflow(), 0)),
+    ]
+
+
+# ==========================
+# HTTP
+# ==========================
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            HTTP_REQUESTS.inc(1, method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            DB_STATEMENTS.observe(stats.statements, method, route)
+            DB_TIME.observe(stats.db_seconds, method, route)
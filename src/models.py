@@ -1,6 +1,9 @@
+from datetime import datetime
+
 from sqlalchemy import (
-    String, Integer, ForeignKey, UniqueConstraint
+    BigInteger, String, Integer, DateTime, ForeignKey, Index, Text, UniqueConstraint, func, text
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -40,6 +43,7 @@ class BranchStock(Base):
 
     __table_args__ = (
         UniqueConstraint("branch_id", "book_id", name="uq_branch_book_stock"),
+        Index("ix_branch_stock_book", "book_id"),
     )
 
 
@@ -48,3 +52,95 @@ class BookFaculty(Base):
     branch_id: Mapped[int] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"), primary_key=True)
     book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
     faculty_id: Mapped[int] = mapped_column(ForeignKey("faculties.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        # обратный индекс для книг факультета: страницы идут по book_id, branch_id — в индексе
+        Index("ix_book_faculties_faculty", "faculty_id", "book_id", "branch_id"),
+    )
+
+
+class Loan(Base):
+    __tablename__ = "loans"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    branch_id: Mapped[int] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"))
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"))
+    student_id: Mapped[str] = mapped_column(String(64))
+    issued_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    returned_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_loans_branch_book", "branch_id", "book_id"),
+        Index("ix_loans_open_student", "student_id", postgresql_where=text("returned_at IS NULL")),
+    )
+
+
+class BookReader(Base):
+    """Кто из студентов хоть раз брал книгу в филиале — для счётчика students."""
+    __tablename__ = "book_readers"
+    branch_id: Mapped[int] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"), primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    student_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+
+class CirculationStats(Base):
+    """Счётчики выдач по (филиал, книга), обновляются в одной транзакции с выдачей/возвратом."""
+    __tablename__ = "circulation_stats"
+    branch_id: Mapped[int] = mapped_column(ForeignKey("branches.id", ondelete="CASCADE"), primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    loans_total: Mapped[int] = mapped_column(Integer, default=0)
+    active_loans: Mapped[int] = mapped_column(Integer, default=0)
+    students: Mapped[int] = mapped_column(Integer, default=0)
+    last_loan_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_circulation_book", "book_id"),
+        Index("ix_circulation_branch_loans", "branch_id", "loans_total"),
+    )
+
+
+class BookAvailability(Base):
+    """
+    Сводка branch_stock по книге, разложенная на части по branch_id (shard);
+    итог книги — сумма её частей. Ведётся триггером на branch_stock (см. src.bootstrap).
+    """
+    __tablename__ = "book_availability_shards"
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    total_copies: Mapped[int] = mapped_column(Integer, default=0)
+    branch_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ChangeVersion(Base):
+    """Версия таблицы для ETag; растёт после каждого коммита, меняющего таблицу (см. src.etags)."""
+    __tablename__ = "change_versions"
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class ChangeEvent(Base):
+    """Журнал ленты изменений: id — последовательность для возобновления (см. src.changes)."""
+    __tablename__ = "change_events"
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(32))
+    op: Mapped[str] = mapped_column(String(32))
+    data: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index("ix_change_events_created_at", "created_at"),)
+
+
+class ErrorLogEntry(Base):
+    """Ошибка или исключение запроса, записанные sink'ом table (см. src.error_hooks)."""
+    __tablename__ = "error_log"
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    kind: Mapped[str] = mapped_column(String(16))
+    status: Mapped[int] = mapped_column(Integer)
+    method: Mapped[str] = mapped_column(String(16))
+    route: Mapped[str] = mapped_column(String(255))
+    path: Mapped[str] = mapped_column(Text)
+    detail: Mapped[str | None] = mapped_column(Text, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (Index("ix_error_log_created_at", "created_at"),)
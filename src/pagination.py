@@ -0,0 +1,54 @@
+from typing import Callable, Sequence, TypeVar
+
+from fastapi import Response
+from sqlalchemy import Select
+
+DEFAULT_PAGE_LIMIT = 500
+MAX_PAGE_LIMIT = 5000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+def keyset(stmt: Select, id_column, after_id: int | None) -> Select:
+    """
+    Пагинация по ключу: WHERE id > after_id ORDER BY id.
+    В отличие от OFFSET, стоимость не растёт с номером страницы.
+    """
+    stmt = stmt.order_by(id_column)
+    if after_id is not None:
+        stmt = stmt.where(id_column > after_id)
+    return stmt
+
+
+def page_limit(limit: int | None, after_id: int | None) -> int | None:
+    """
+    Пагинация — по запросу клиента: без limit и after_id список отдаётся
+    целиком (None), с одним after_id — страницами по DEFAULT_PAGE_LIMIT.
+    """
+    if limit is None and after_id is None:
+        return None
+    return limit or DEFAULT_PAGE_LIMIT
+
+
+def fetch_limit(limit: int | None) -> int | None:
+    """Сколько строк читать для trim_page: limit + 1, None — все."""
+    return None if limit is None else limit + 1
+
+
+def trim_page(
+    rows: Sequence[T],
+    limit: int | None,
+    response: Response,
+    cursor: Callable[[T], int] = lambda r: r.id,
+) -> Sequence[T]:
+    """
+    Запрос страницы читает limit + 1 строк. Если лишняя строка пришла, значит
+    дальше есть данные: ключ последней строки страницы кладётся в заголовок
+    X-Next-Cursor — его передают как after_id в следующий запрос.
+    """
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = str(cursor(rows[-1]))
+    return rows
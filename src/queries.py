@@ -0,0 +1,594 @@
+"""
+SQL-запросы, общие для слоя хранения (src/repository.py), сервисных функций
+(src/service.py) и потоковой выдачи async-эндпоинтов: здесь только построение выражений и разбор строк результата,
+выполнение остаётся за конкретной сессией.
+"""
+from typing import Iterable, Sequence
+
+from sqlalchemy import (
+    Integer, Row, Select, Subquery, and_, column, delete, func, insert, literal, select, union, update, values,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+
+from src.models import (
+    Book as BookORM,
+    Branch as BranchORM,
+    Faculty as FacultyORM,
+    BranchStock as BranchStockORM,
+    BookAvailability as BookAvailabilityORM,
+    BookFaculty as BookFacultyORM,
+    BookReader as BookReaderORM,
+    CirculationStats as CirculationStatsORM,
+    Loan as LoanORM,
+)
+from src.pagination import fetch_limit, keyset
+from src.schemas import (
+    BookAvailability,
+    BookCirculation,
+    BookFacultiesResponse,
+    BookFacultyLink,
+    BookFacultyLinkResult,
+    BranchBookPair,
+    BranchCopies,
+    CirculationStats,
+    CopiesBatchItem,
+    Faculty,
+    Loan,
+)
+
+
+def books_page(after_id: int | None) -> Select:
+    return keyset(select(BookORM.id, BookORM.title, BookORM.author, BookORM.year), BookORM.id, after_id)
+
+
+def branches_page(after_id: int | None) -> Select:
+    return keyset(select(BranchORM.id, BranchORM.name, BranchORM.address), BranchORM.id, after_id)
+
+
+def faculties_page(after_id: int | None) -> Select:
+    return keyset(select(FacultyORM.id, FacultyORM.name), FacultyORM.id, after_id)
+
+
+PAGES = {"books": books_page, "branches": branches_page, "faculties": faculties_page}
+
+
+def copies(branch_id: int, book_id: int) -> Select:
+    return select(BranchStockORM.copies).where(
+        BranchStockORM.branch_id == branch_id,
+        BranchStockORM.book_id == book_id,
+    )
+
+
+def book_faculties(branch_id: int, book_id: int) -> Select:
+    return (
+        select(FacultyORM.id, FacultyORM.name)
+        .join(BookFacultyORM, BookFacultyORM.faculty_id == FacultyORM.id)
+        .where(
+            BookFacultyORM.branch_id == branch_id,
+            BookFacultyORM.book_id == book_id,
+        )
+        .order_by(FacultyORM.id)
+    )
+
+
+def book_faculties_response(branch_id: int, book_id: int, rows: Iterable[Row]) -> BookFacultiesResponse:
+    facs = [Faculty(id=r[0], name=r[1]) for r in rows]
+    return BookFacultiesResponse(
+        branch_id=branch_id,
+        book_id=book_id,
+        faculty_count=len(facs),
+        faculties=facs,
+    )
+
+
+# ==========================
+# BATCH
+# ==========================
+
+def copies_batch(pairs: Sequence[BranchBookPair]) -> Select:
+    """
+    Все пары одним запросом: VALUES + LEFT JOIN на branches/books/branch_stock.
+    Порядок и дубликаты сохраняются благодаря колонке idx.
+    """
+    req = values(
+        column("idx", Integer),
+        column("branch_id", Integer),
+        column("book_id", Integer),
+        name="req",
+    ).data([(i, p.branch_id, p.book_id) for i, p in enumerate(pairs)])
+
+    return (
+        select(
+            req.c.branch_id,
+            req.c.book_id,
+            BranchORM.id.is_not(None).label("branch_exists"),
+            BookORM.id.is_not(None).label("book_exists"),
+            func.coalesce(BranchStockORM.copies, 0).label("copies"),
+        )
+        .select_from(req)
+        .outerjoin(BranchORM, BranchORM.id == req.c.branch_id)
+        .outerjoin(BookORM, BookORM.id == req.c.book_id)
+        .outerjoin(
+            BranchStockORM,
+            and_(
+                BranchStockORM.branch_id == req.c.branch_id,
+                BranchStockORM.book_id == req.c.book_id,
+            ),
+        )
+        .order_by(req.c.idx)
+    )
+
+
+def copies_batch_items(rows: Iterable[Row]) -> list[CopiesBatchItem]:
+    items = []
+    for r in rows:
+        if not r.branch_exists:
+            items.append(CopiesBatchItem(branch_id=r.branch_id, book_id=r.book_id, error="Филиал не найден"))
+        elif not r.book_exists:
+            items.append(CopiesBatchItem(branch_id=r.branch_id, book_id=r.book_id, error="Книга не найдена"))
+        else:
+            items.append(CopiesBatchItem(branch_id=r.branch_id, book_id=r.book_id, copies=int(r.copies)))
+    return items
+
+
+def branch_books_page(branch_id: int, after_id: int | None, limit: int | None) -> Subquery:
+    """
+    Книги филиала (есть в фонде или привязаны к факультету), страница по book_id.
+    Берётся limit + 1 строк, чтобы понять, есть ли следующая страница (limit None — все).
+    """
+    held = union(
+        select(BranchStockORM.book_id).where(BranchStockORM.branch_id == branch_id),
+        select(BookFacultyORM.book_id).where(BookFacultyORM.branch_id == branch_id),
+    ).subquery()
+    return keyset(select(held.c.book_id), held.c.book_id, after_id).limit(fetch_limit(limit)).subquery()
+
+
+def existing_books(book_ids: Iterable[int]) -> Subquery:
+    return select(BookORM.id.label("book_id")).where(BookORM.id.in_(book_ids)).subquery()
+
+
+def faculties_for_books(branch_id: int, book_ids: Subquery) -> Select:
+    """
+    Факультеты филиала для набора книг одним сгруппированным запросом:
+    book_ids LEFT JOIN book_faculties LEFT JOIN faculties GROUP BY book_id.
+    """
+    has_faculty = FacultyORM.id.is_not(None)
+    return (
+        select(
+            book_ids.c.book_id,
+            func.array_agg(aggregate_order_by(FacultyORM.id, FacultyORM.id)).filter(has_faculty),
+            func.array_agg(aggregate_order_by(FacultyORM.name, FacultyORM.id)).filter(has_faculty),
+        )
+        .select_from(book_ids)
+        .outerjoin(
+            BookFacultyORM,
+            and_(
+                BookFacultyORM.branch_id == branch_id,
+                BookFacultyORM.book_id == book_ids.c.book_id,
+            ),
+        )
+        .outerjoin(FacultyORM, FacultyORM.id == BookFacultyORM.faculty_id)
+        .group_by(book_ids.c.book_id)
+        .order_by(book_ids.c.book_id)
+    )
+
+
+def faculties_for_books_items(branch_id: int, rows: Iterable[Row]) -> list[BookFacultiesResponse]:
+    return [
+        book_faculties_response(branch_id, book_id, zip(fac_ids or [], fac_names or []))
+        for book_id, fac_ids, fac_names in rows
+    ]
+
+
+# ==========================
+# FACULTY LINKS
+# ==========================
+
+LINK_ADDED, LINK_EXISTS, LINK_REMOVED, LINK_ABSENT, LINK_ERROR = "added", "exists", "removed", "absent", "error"
+
+
+def _links_request(links: Sequence[BookFacultyLink]):
+    """
+    CTE req с тройками запроса: idx хранит порядок, first — первое вхождение
+    тройки (изменение засчитывается только ему, повторы получают exists/absent).
+    """
+    req = values(
+        column("idx", Integer),
+        column("branch_id", Integer),
+        column("book_id", Integer),
+        column("faculty_id", Integer),
+        name="req_values",
+    ).data([(i, x.branch_id, x.book_id, x.faculty_id) for i, x in enumerate(links)])
+    triple = (req.c.branch_id, req.c.book_id, req.c.faculty_id)
+    return select(
+        req.c.idx, *triple, (func.min(req.c.idx).over(partition_by=triple) == req.c.idx).label("first")
+    ).cte("req")
+
+
+def _links_result(req, changed) -> Select:
+    """По строке на элемент запроса: какие сущности существуют и изменилась ли связь."""
+    return (
+        select(
+            req.c.branch_id,
+            req.c.book_id,
+            req.c.faculty_id,
+            BranchORM.id.is_not(None).label("branch_exists"),
+            BookORM.id.is_not(None).label("book_exists"),
+            FacultyORM.id.is_not(None).label("faculty_exists"),
+            and_(req.c.first, changed.c.branch_id.is_not(None)).label("changed"),
+        )
+        .select_from(req)
+        .outerjoin(BranchORM, BranchORM.id == req.c.branch_id)
+        .outerjoin(BookORM, BookORM.id == req.c.book_id)
+        .outerjoin(FacultyORM, FacultyORM.id == req.c.faculty_id)
+        .outerjoin(
+            changed,
+            and_(
+                changed.c.branch_id == req.c.branch_id,
+                changed.c.book_id == req.c.book_id,
+                changed.c.faculty_id == req.c.faculty_id,
+            ),
+        )
+        .order_by(req.c.idx)
+    )
+
+
+def add_faculty_links(links: Sequence[BookFacultyLink]) -> Select:
+    """
+    Привязки одним запросом: INSERT ... SELECT из req с JOIN на филиалы,
+    книги и факультеты (несуществующие отсеиваются до вставки, FK остаются
+    страховкой) и ON CONFLICT DO NOTHING — уже существующая связь, в том числе
+    вставленная параллельным запросом, не ошибка. RETURNING отдаёт только
+    реально добавленные.
+    """
+    req = _links_request(links)
+    valid = (
+        select(req.c.branch_id, req.c.book_id, req.c.faculty_id)
+        .join(BranchORM, BranchORM.id == req.c.branch_id)
+        .join(BookORM, BookORM.id == req.c.book_id)
+        .join(FacultyORM, FacultyORM.id == req.c.faculty_id)
+        .distinct()
+    )
+    added = (
+        pg_insert(BookFacultyORM)
+        .from_select(["branch_id", "book_id", "faculty_id"], valid)
+        .on_conflict_do_nothing()
+        .returning(BookFacultyORM.branch_id, BookFacultyORM.book_id, BookFacultyORM.faculty_id)
+        .cte("added")
+    )
+    return _links_result(req, added)
+
+
+def remove_faculty_links(links: Sequence[BookFacultyLink]) -> Select:
+    """Удаление одним запросом: DELETE ... USING req RETURNING."""
+    req = _links_request(links)
+    removed = (
+        delete(BookFacultyORM)
+        .where(
+            BookFacultyORM.branch_id == req.c.branch_id,
+            BookFacultyORM.book_id == req.c.book_id,
+            BookFacultyORM.faculty_id == req.c.faculty_id,
+        )
+        .returning(BookFacultyORM.branch_id, BookFacultyORM.book_id, BookFacultyORM.faculty_id)
+        .cte("removed")
+    )
+    return _links_result(req, removed)
+
+
+def faculty_links_items(rows: Iterable[Row], done: str, noop: str) -> list[BookFacultyLinkResult]:
+    items = []
+    for r in rows:
+        link = {"branch_id": r.branch_id, "book_id": r.book_id, "faculty_id": r.faculty_id}
+        if not r.branch_exists:
+            items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Филиал не найден"))
+        elif not r.book_exists:
+            items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Книга не найдена"))
+        elif not r.faculty_exists:
+            items.append(BookFacultyLinkResult(**link, status=LINK_ERROR, error="Факультет не найден"))
+        else:
+            items.append(BookFacultyLinkResult(**link, status=done if r.changed else noop))
+    return items
+
+
+def changed_pairs(items: Iterable[BookFacultyLinkResult], done: str) -> set[tuple[int, int]]:
+    """(филиал, книга), у которых поменялись факультеты, — для сброса ops-кэша."""
+    return {(x.branch_id, x.book_id) for x in items if x.status == done}
+
+
+# ==========================
+# FACULTY BOOKS
+# ==========================
+
+def faculty_books_page(
+    faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None
+) -> Select:
+    """
+    Книги факультета, страница по book_id (limit + 1 строк). Привязки читаются
+    по индексу ix_book_faculties_faculty уже в порядке book_id, так что LIMIT
+    срабатывает до соединения с books. copies — остаток филиала, если он задан,
+    иначе итог по библиотеке: сумма частей сводки книги (book_availability_shards).
+    """
+    links = select(
+        BookFacultyORM.book_id,
+        func.array_agg(aggregate_order_by(BookFacultyORM.branch_id, BookFacultyORM.branch_id)).label("branch_ids"),
+    ).where(BookFacultyORM.faculty_id == faculty_id)
+    if branch_id is not None:
+        links = links.where(BookFacultyORM.branch_id == branch_id)
+    links = keyset(links.group_by(BookFacultyORM.book_id), BookFacultyORM.book_id, after_id)
+    links = links.limit(fetch_limit(limit)).subquery()
+
+    if branch_id is None:
+        copies = select(func.sum(BookAvailabilityORM.total_copies)).where(
+            BookAvailabilityORM.book_id == links.c.book_id
+        )
+    else:
+        copies = select(BranchStockORM.copies).where(
+            BranchStockORM.branch_id == branch_id, BranchStockORM.book_id == links.c.book_id
+        )
+    return (
+        select(
+            BookORM.id,
+            BookORM.title,
+            BookORM.author,
+            BookORM.year,
+            func.coalesce(copies.scalar_subquery(), 0).label("copies"),
+            links.c.branch_ids,
+        )
+        .select_from(links)
+        .join(BookORM, BookORM.id == links.c.book_id)
+        .order_by(links.c.book_id)
+    )
+
+
+# ==========================
+# LOANS
+# ==========================
+
+_LOAN_COLUMNS = (
+    LoanORM.id,
+    LoanORM.branch_id,
+    LoanORM.book_id,
+    LoanORM.student_id,
+    LoanORM.issued_at,
+    LoanORM.returned_at,
+)
+
+
+def checkout(branch_id: int, book_id: int, student_id: str) -> Select:
+    """
+    Выдача одним запросом: условный UPDATE ... WHERE copies > 0 RETURNING
+    и INSERT в loans из его результата. Проверка и списание атомарны, поэтому
+    одновременные выдачи не уводят остаток в минус; строка не найдена —
+    свободных экземпляров нет (или нет такой пары). Тем же запросом
+    обновляется circulation_stats (см. circulation_bump).
+    """
+    taken = (
+        update(BranchStockORM)
+        .where(
+            BranchStockORM.branch_id == branch_id,
+            BranchStockORM.book_id == book_id,
+            BranchStockORM.copies > 0,
+        )
+        .values(copies=BranchStockORM.copies - 1)
+        .returning(BranchStockORM.branch_id, BranchStockORM.book_id)
+        .cte("taken")
+    )
+    issued = (
+        insert(LoanORM)
+        .from_select(
+            ["branch_id", "book_id", "student_id"],
+            select(taken.c.branch_id, taken.c.book_id, literal(student_id)),
+        )
+        .returning(*_LOAN_COLUMNS)
+        .cte("issued")
+    )
+    return select(issued).add_cte(*circulation_bump(issued))
+
+
+def circulation_bump(issued) -> tuple:
+    """
+    CTE, которые учитывают выдачу из issued в статистике: студент добавляется
+    в book_readers (ON CONFLICT DO NOTHING — вставилась строка, значит, он
+    берёт книгу в этом филиале впервые), счётчики — upsert в circulation_stats.
+    Строка статистики блокируется той же транзакцией, что и строка branch_stock.
+    """
+    new_reader = (
+        pg_insert(BookReaderORM)
+        .from_select(
+            ["branch_id", "book_id", "student_id"],
+            select(issued.c.branch_id, issued.c.book_id, issued.c.student_id),
+        )
+        .on_conflict_do_nothing()
+        .returning(BookReaderORM.branch_id)
+        .cte("new_reader")
+    )
+    stats = pg_insert(CirculationStatsORM).from_select(
+        ["branch_id", "book_id", "loans_total", "active_loans", "students", "last_loan_at"],
+        select(
+            issued.c.branch_id,
+            issued.c.book_id,
+            literal(1),
+            literal(1),
+            select(func.count()).select_from(new_reader).scalar_subquery(),
+            issued.c.issued_at,
+        ),
+    )
+    stats = stats.on_conflict_do_update(
+        index_elements=[CirculationStatsORM.branch_id, CirculationStatsORM.book_id],
+        set_={
+            "loans_total": CirculationStatsORM.loans_total + 1,
+            "active_loans": CirculationStatsORM.active_loans + 1,
+            "students": CirculationStatsORM.students + stats.excluded.students,
+            "last_loan_at": func.greatest(CirculationStatsORM.last_loan_at, stats.excluded.last_loan_at),
+        },
+    ).cte("stats")
+    return new_reader, stats
+
+
+def checkin(loan_id: int) -> Select:
+    """Возврат одним запросом: закрывает выдачу, возвращает экземпляр в фонд, уменьшает active_loans."""
+    closed = (
+        update(LoanORM)
+        .where(LoanORM.id == loan_id, LoanORM.returned_at.is_(None))
+        .values(returned_at=func.now())
+        .returning(*_LOAN_COLUMNS)
+        .cte("closed")
+    )
+    restocked = (
+        update(BranchStockORM)
+        .where(
+            BranchStockORM.branch_id == closed.c.branch_id,
+            BranchStockORM.book_id == closed.c.book_id,
+        )
+        .values(copies=BranchStockORM.copies + 1)
+        .cte("restocked")
+    )
+    stats = (
+        update(CirculationStatsORM)
+        .where(
+            CirculationStatsORM.branch_id == closed.c.branch_id,
+            CirculationStatsORM.book_id == closed.c.book_id,
+            CirculationStatsORM.active_loans > 0,
+        )
+        .values(active_loans=CirculationStatsORM.active_loans - 1)
+        .cte("stats")
+    )
+    return select(closed).add_cte(restocked, stats)
+
+
+def loan(loan_id: int) -> Select:
+    return select(*_LOAN_COLUMNS).where(LoanORM.id == loan_id)
+
+
+def loan_from_row(row: Row) -> Loan:
+    return Loan(**row._mapping)
+
+
+# ==========================
+# CIRCULATION
+# ==========================
+
+_STATS_COLUMNS = (
+    CirculationStatsORM.branch_id,
+    CirculationStatsORM.book_id,
+    CirculationStatsORM.loans_total,
+    CirculationStatsORM.active_loans,
+    CirculationStatsORM.students,
+    CirculationStatsORM.last_loan_at,
+)
+
+TOP_BY = {"loans": "loans_total", "students": "students"}
+
+
+def book_circulation(book_id: int) -> Select:
+    return (
+        select(*_STATS_COLUMNS)
+        .where(CirculationStatsORM.book_id == book_id)
+        .order_by(CirculationStatsORM.branch_id)
+    )
+
+
+def book_circulation_response(book_id: int, rows: Iterable[Row]) -> BookCirculation:
+    """
+    Итог по книге — сумма по филиалам; students в итоге считает студента
+    столько раз, в скольких филиалах он брал книгу.
+    """
+    branches = [CirculationStats(**r._mapping) for r in rows]
+    return BookCirculation(
+        book_id=book_id,
+        loans_total=sum(x.loans_total for x in branches),
+        active_loans=sum(x.active_loans for x in branches),
+        students=sum(x.students for x in branches),
+        branches=branches,
+    )
+
+
+def branch_circulation_page(branch_id: int, after_id: int | None) -> Select:
+    return keyset(
+        select(*_STATS_COLUMNS).where(CirculationStatsORM.branch_id == branch_id),
+        CirculationStatsORM.book_id,
+        after_id,
+    )
+
+
+def circulation_top(limit: int, by: str, branch_id: int | None = None) -> Select:
+    """Топ книг по выдачам или по студентам: в филиале — по индексу, по всей библиотеке — сумма по филиалам."""
+    if branch_id is not None:
+        stats = (
+            select(
+                CirculationStatsORM.book_id,
+                CirculationStatsORM.loans_total,
+                CirculationStatsORM.students,
+            )
+            .where(CirculationStatsORM.branch_id == branch_id)
+            .subquery()
+        )
+    else:
+        stats = (
+            select(
+                CirculationStatsORM.book_id,
+                func.sum(CirculationStatsORM.loans_total).label("loans_total"),
+                func.sum(CirculationStatsORM.students).label("students"),
+            )
+            .group_by(CirculationStatsORM.book_id)
+            .subquery()
+        )
+    key = stats.c[TOP_BY[by]]
+    return (
+        select(BookORM.id.label("book_id"), BookORM.title, BookORM.author, stats.c.loans_total, stats.c.students)
+        .join(BookORM, BookORM.id == stats.c.book_id)
+        .order_by(key.desc(), stats.c.book_id)
+        .limit(limit)
+    )
+
+
+# ==========================
+# AVAILABILITY
+# ==========================
+
+def availability(book_ids: Iterable[int]) -> Select:
+    """
+    Итоги по библиотеке — суммы частей сводки (book_availability_shards) по книге;
+    книги без фонда — с нулями.
+    """
+    book_ids = list(book_ids)
+    totals = (
+        select(
+            BookAvailabilityORM.book_id,
+            func.sum(BookAvailabilityORM.total_copies).label("total_copies"),
+            func.sum(BookAvailabilityORM.branch_count).label("branch_count"),
+        )
+        .where(BookAvailabilityORM.book_id.in_(book_ids))
+        .group_by(BookAvailabilityORM.book_id)
+        .subquery()
+    )
+    return (
+        select(
+            BookORM.id.label("book_id"),
+            func.coalesce(totals.c.total_copies, 0).label("total_copies"),
+            func.coalesce(totals.c.branch_count, 0).label("branch_count"),
+        )
+        .outerjoin(totals, totals.c.book_id == BookORM.id)
+        .where(BookORM.id.in_(book_ids))
+        .order_by(BookORM.id)
+    )
+
+
+def availability_branches(book_ids: Iterable[int]) -> Select:
+    """Филиалы, где книга есть в наличии (по индексу branch_stock(book_id))."""
+    return (
+        select(BranchStockORM.book_id, BranchStockORM.branch_id, BranchStockORM.copies)
+        .where(BranchStockORM.book_id.in_(book_ids), BranchStockORM.copies > 0)
+        .order_by(BranchStockORM.book_id, BranchStockORM.branch_id)
+    )
+
+
+def availability_items(totals: Iterable[Row], branch_rows: Iterable[Row] | None = None) -> list[BookAvailability]:
+    items = [BookAvailability(**r._mapping) for r in totals]
+    if branch_rows is not None:
+        by_book: dict[int, list[BranchCopies]] = {x.book_id: [] for x in items}
+        for r in branch_rows:
+            by_book[r.book_id].append(BranchCopies(branch_id=r.branch_id, copies=r.copies))
+        for x in items:
+            x.branches = by_book[x.book_id]
+    return items
@@ -0,0 +1,151 @@
+"""
+Реплики для чтения.
+
+DATABASE_REPLICA_URLS — URL реплик через запятую; без неё всё идёт в primary.
+GET/HEAD-запросы получают сессию на реплике (round-robin по здоровым),
+остальные — на primary (см. src.db.get_db).
+
+Здоровье: раз в REPLICA_CHECK_INTERVAL секунд реплика проверяется одним
+запросом; если она недоступна или отстаёт больше REPLICA_MAX_LAG секунд,
+чтение уходит на primary до следующей успешной проверки. Обрыв соединения
+с репликой во время запроса выводит её из ротации сразу, не дожидаясь
+проверки (сам этот запрос завершится ошибкой).
+
+Read-your-writes: после пишущего запроса клиенту ставится cookie, и
+READ_YOUR_WRITES_SECONDS секунд его GET-запросы читают с primary, чтобы
+не увидеть данные старше собственной записи. 0 — выключено.
+"""
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import Engine, event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "10"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+PIN_COOKIE = "bookhouse_primary_until"
+READ_METHODS = ("GET", "HEAD")
+
+# Отставание реплики в секундах; 0 для primary и для реплики, которая
+# проиграла всё полученное (иначе на простаивающем primary «отставание» росло бы).
+_LAG = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+def replica_urls() -> list[str]:
+    return [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+@dataclass
+class Replica:
+    engine: Engine | AsyncEngine
+    healthy: bool = True
+    lag: float | None = None
+    checked_at: float | None = None
+
+    @property
+    def sync_engine(self) -> Engine:
+        return self.engine.sync_engine if isinstance(self.engine, AsyncEngine) else self.engine
+
+
+@dataclass
+class ReplicaSet:
+    engines: list[Engine | AsyncEngine]
+    check_interval: float = REPLICA_CHECK_INTERVAL
+    max_lag: float = REPLICA_MAX_LAG
+    replicas: list[Replica] = field(init=False)
+
+    def __post_init__(self):
+        self.replicas = [Replica(engine) for engine in self.engines]
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        for replica in self.replicas:
+            event.listen(replica.sync_engine, "handle_error", self._on_error(replica))
+
+    def _on_error(self, replica: Replica):
+        def handle_error(ctx):
+            # connection is None — не удалось даже подключиться
+            if ctx.is_disconnect or ctx.connection is None:
+                replica.healthy = False
+        return handle_error
+
+    def pick(self) -> Engine | AsyncEngine | None:
+        """Следующая здоровая реплика или None (тогда читать с primary)."""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._rr) % len(healthy)].engine
+
+    def check_due(self) -> bool:
+        return time.monotonic() >= self._next_check
+
+    def _claim_check(self) -> bool:
+        # проверяет один запрос, остальные тем временем читают по старому статусу
+        with self._lock:
+            if not self.check_due():
+                return False
+            self._next_check = time.monotonic() + self.check_interval
+            return True
+
+    def _record(self, replica: Replica, lag: float | None) -> None:
+        replica.lag = lag
+        replica.healthy = lag is not None and lag <= self.max_lag
+        replica.checked_at = time.monotonic()
+
+    def check(self) -> None:
+        if not self._claim_check():
+            return
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    lag = float(conn.scalar(_LAG))
+            except Exception:
+                lag = None
+            self._record(replica, lag)
+
+    async def acheck(self) -> None:
+        if not self._claim_check():
+            return
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    lag = float(await conn.scalar(_LAG))
+            except Exception:
+                lag = None
+            self._record(replica, lag)
+
+    def dispose(self) -> None:
+        for replica in self.replicas:
+            if isinstance(replica.engine, Engine):
+                replica.engine.dispose()
+
+
+# ==========================
+# READ-YOUR-WRITES
+# ==========================
+
+def is_pinned(cookies: dict[str, str]) -> bool:
+    try:
+        return float(cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_to_primary(response, seconds: float = READ_YOUR_WRITES_SECONDS) -> None:
+    if seconds > 0:
+        response.set_cookie(
+            PIN_COOKIE, f"{time.time() + seconds:.3f}", max_age=max(1, int(seconds) + 1), httponly=True
+        )
@@ -0,0 +1,383 @@
+"""
+Слой хранения каталога для эндпоинтов (src/service.py).
+
+CatalogRepository — операции над книгами, филиалами, факультетами,
+остатками и привязками к факультетам, выдачи/возвраты и импорт книг.
+Две реализации:
+
+* SqlCatalog — PostgreSQL, запросы из src.queries на сессии запроса;
+* WriteThroughCatalog — чтения из MemoryCatalog (src.memory_catalog,
+  индексы в памяти процесса), записи — сначала в PostgreSQL через SqlCatalog
+  (id выдаёт БД), после коммита — в память. Для горячих read-mostly
+  развёртываний в один процесс: другие воркеры чужих записей не видят.
+
+CATALOG_BACKEND=sql (по умолчанию) | memory выбирает реализацию для
+catalog_for; в режиме memory каталог при старте загружается из БД.
+Статистика, поиск, экспорт, журнал выдач и версии для ETag читаются из PostgreSQL.
+Страницы возвращают limit + 1 строк (см. trim_page), при limit None — все;
+строки страниц книг/филиалов/факультетов годятся для json_rows.
+Согласие реализаций держит общий набор тестов (test_repository_conformance).
+"""
+import os
+from typing import Iterable, Iterator, Protocol, Sequence
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from src import changes, etags, queries
+from src.bulk_import import IMPORT_BATCH_SIZE, import_books
+from src.memory_catalog import MemoryCatalog
+from src.models import (
+    Book as BookORM,
+    Branch as BranchORM,
+    Faculty as FacultyORM,
+    BranchStock as BranchStockORM,
+)
+from src.pagination import fetch_limit
+from src.schemas import (
+    Book,
+    BookBase,
+    BookFacultiesResponse,
+    BookFacultyLink,
+    BookFacultyLinkResult,
+    Branch,
+    BranchBase,
+    BookImportReport,
+    BranchBookPair,
+    CopiesBatchItem,
+    Faculty,
+    Loan,
+)
+from src.streaming import iter_ndjson
+
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "sql").strip().lower()
+
+
+class CatalogRepository(Protocol):
+    def books_page(self, after_id: int | None, limit: int | None) -> Sequence: ...
+    def get_book(self, book_id: int) -> Book | None: ...
+    def create_book(self, data: BookBase) -> Book: ...
+    def update_book(self, book_id: int, data: BookBase) -> Book | None: ...
+
+    def branches_page(self, after_id: int | None, limit: int | None) -> Sequence: ...
+    def get_branch(self, branch_id: int) -> Branch | None: ...
+    def create_branch(self, data: BranchBase) -> Branch: ...
+    def update_branch(self, branch_id: int, data: BranchBase) -> Branch | None: ...
+
+    def faculties_page(self, after_id: int | None, limit: int | None) -> Sequence: ...
+    def get_faculty(self, faculty_id: int) -> Faculty | None: ...
+    def create_faculty(self, name: str) -> Faculty: ...
+
+    def stream(self, table: str, after_id: int | None, limit: int | None) -> Iterator[bytes]:
+        """NDJSON books / branches / faculties по id, без ограничения limit — до конца."""
+
+    def set_copies(self, branch_id: int, book_id: int, copies: int) -> None: ...
+    def copies(self, branch_id: int, book_id: int) -> int: ...
+    def copies_batch(self, pairs: Sequence[BranchBookPair]) -> list[CopiesBatchItem]: ...
+
+    def book_faculties(self, branch_id: int, book_id: int) -> BookFacultiesResponse: ...
+    def branch_book_faculties(self, branch_id: int, after_id: int | None, limit: int | None) -> list: ...
+    def book_faculties_batch(self, branch_id: int, book_ids: Iterable[int]) -> list[BookFacultiesResponse]: ...
+    def add_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]: ...
+    def remove_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]: ...
+
+    def faculty_books(
+        self, faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None
+    ) -> Sequence: ...
+
+    def checkout(self, branch_id: int, book_id: int, student_id: str) -> Loan | None:
+        """None — выдачи нет: нет филиала, книги или свободных экземпляров."""
+
+    def checkin(self, loan_id: int) -> Loan | None:
+        """None — нет такой выдачи или книга уже возвращена."""
+
+    def import_books(self, lines: Iterable[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> BookImportReport: ...
+
+
+class SqlCatalog:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _commit(self, tables: Sequence[str] = (), *events: dict) -> None:
+        """Версии tables (etags) и события ленты (changes) — тем же коммитом, что и данные."""
+        self.db.flush()
+        etags.bump(self.db, *tables)
+        changes.publish(self.db, *events)
+        self.db.commit()
+
+    # ==========================
+    # BOOKS / BRANCHES / FACULTIES
+    # ==========================
+
+    def books_page(self, after_id: int | None, limit: int | None):
+        return self.db.execute(queries.books_page(after_id).limit(fetch_limit(limit))).all()
+
+    def get_book(self, book_id: int) -> Book | None:
+        book = self.db.get(BookORM, book_id)
+        return None if book is None else Book(id=book.id, title=book.title, author=book.author, year=book.year)
+
+    def create_book(self, data: BookBase) -> Book:
+        book = BookORM(**data.model_dump())
+        self.db.add(book)
+        self.db.flush()
+        self._commit([etags.BOOKS], changes.event(changes.BOOK, "create", id=book.id))
+        self.db.refresh(book)
+        return Book(id=book.id, title=book.title, author=book.author, year=book.year)
+
+    def update_book(self, book_id: int, data: BookBase) -> Book | None:
+        book = self.db.get(BookORM, book_id)
+        if book is None:
+            return None
+        book.title, book.author, book.year = data.title, data.author, data.year
+        self._commit([etags.BOOKS], changes.event(changes.BOOK, "update", id=book_id))
+        self.db.refresh(book)
+        return Book(id=book.id, title=book.title, author=book.author, year=book.year)
+
+    def branches_page(self, after_id: int | None, limit: int | None):
+        return self.db.execute(queries.branches_page(after_id).limit(fetch_limit(limit))).all()
+
+    def get_branch(self, branch_id: int) -> Branch | None:
+        branch = self.db.get(BranchORM, branch_id)
+        return None if branch is None else Branch(id=branch.id, name=branch.name, address=branch.address)
+
+    def create_branch(self, data: BranchBase) -> Branch:
+        branch = BranchORM(**data.model_dump())
+        self.db.add(branch)
+        self.db.flush()
+        self._commit([etags.BRANCHES], changes.event(changes.BRANCH, "create", id=branch.id))
+        self.db.refresh(branch)
+        return Branch(id=branch.id, name=branch.name, address=branch.address)
+
+    def update_branch(self, branch_id: int, data: BranchBase) -> Branch | None:
+        branch = self.db.get(BranchORM, branch_id)
+        if branch is None:
+            return None
+        branch.name, branch.address = data.name, data.address
+        self._commit([etags.BRANCHES], changes.event(changes.BRANCH, "update", id=branch_id))
+        self.db.refresh(branch)
+        return Branch(id=branch.id, name=branch.name, address=branch.address)
+
+    def faculties_page(self, after_id: int | None, limit: int | None):
+        return self.db.execute(queries.faculties_page(after_id).limit(fetch_limit(limit))).all()
+
+    def get_faculty(self, faculty_id: int) -> Faculty | None:
+        faculty = self.db.get(FacultyORM, faculty_id)
+        return None if faculty is None else Faculty(id=faculty.id, name=faculty.name)
+
+    def create_faculty(self, name: str) -> Faculty:
+        faculty = FacultyORM(name=name)
+        self.db.add(faculty)
+        self._commit([etags.FACULTIES])
+        self.db.refresh(faculty)
+        return Faculty(id=faculty.id, name=faculty.name)
+
+    def stream(self, table: str, after_id: int | None, limit: int | None) -> Iterator[bytes]:
+        stmt = queries.PAGES[table](after_id)
+        return iter_ndjson(stmt if limit is None else stmt.limit(limit))
+
+    # ==========================
+    # STOCK
+    # ==========================
+
+    def set_copies(self, branch_id: int, book_id: int, copies: int) -> None:
+        stmt = pg_insert(BranchStockORM).values(branch_id=branch_id, book_id=book_id, copies=copies)
+        self.db.execute(stmt.on_conflict_do_update(
+            index_elements=[BranchStockORM.branch_id, BranchStockORM.book_id], set_={"copies": copies}
+        ))
+        self._commit([etags.STOCK])
+
+    def copies(self, branch_id: int, book_id: int) -> int:
+        return int(self.db.scalar(queries.copies(branch_id, book_id)) or 0)
+
+    def copies_batch(self, pairs: Sequence[BranchBookPair]) -> list[CopiesBatchItem]:
+        return queries.copies_batch_items(self.db.execute(queries.copies_batch(pairs)).all())
+
+    # ==========================
+    # FACULTY LINKS
+    # ==========================
+
+    def book_faculties(self, branch_id: int, book_id: int) -> BookFacultiesResponse:
+        rows = self.db.execute(queries.book_faculties(branch_id, book_id)).all()
+        return queries.book_faculties_response(branch_id, book_id, rows)
+
+    def branch_book_faculties(
+        self, branch_id: int, after_id: int | None, limit: int | None
+    ) -> list[BookFacultiesResponse]:
+        page = queries.branch_books_page(branch_id, after_id, limit)
+        rows = self.db.execute(queries.faculties_for_books(branch_id, page))
+        return queries.faculties_for_books_items(branch_id, rows)
+
+    def book_faculties_batch(self, branch_id: int, book_ids: Iterable[int]) -> list[BookFacultiesResponse]:
+        stmt = queries.faculties_for_books(branch_id, queries.existing_books(book_ids))
+        return queries.faculties_for_books_items(branch_id, self.db.execute(stmt))
+
+    def _apply_links(self, stmt, done: str, noop: str) -> list[BookFacultyLinkResult]:
+        items = queries.faculty_links_items(self.db.execute(stmt).all(), done, noop)
+        events = changes.link_events(items, done)
+        self._commit([etags.BOOK_FACULTIES] if events else [], *events)
+        return items
+
+    def add_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        return self._apply_links(queries.add_faculty_links(links), queries.LINK_ADDED, queries.LINK_EXISTS)
+
+    def remove_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        return self._apply_links(queries.remove_faculty_links(links), queries.LINK_REMOVED, queries.LINK_ABSENT)
+
+    def faculty_books(self, faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None):
+        return self.db.execute(queries.faculty_books_page(faculty_id, branch_id, after_id, limit)).all()
+
+    # ==========================
+    # LOANS / IMPORT
+    # ==========================
+
+    def _loan(self, stmt, op: str) -> Loan | None:
+        row = self.db.execute(stmt).one_or_none()
+        if row is None:
+            self.db.rollback()
+            return None
+        loan = queries.loan_from_row(row)
+        self._commit([], changes.stock_event(op, loan.branch_id, loan.book_id))
+        return loan
+
+    def checkout(self, branch_id: int, book_id: int, student_id: str) -> Loan | None:
+        return self._loan(queries.checkout(branch_id, book_id, student_id), "checkout")
+
+    def checkin(self, loan_id: int) -> Loan | None:
+        return self._loan(queries.checkin(loan_id), "checkin")
+
+    def import_books(self, lines: Iterable[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> BookImportReport:
+        return import_books(self.db, lines, fmt, batch_size)
+
+
+class WriteThroughCatalog:
+    """Чтения — из памяти; запись — в PostgreSQL, после коммита тот же результат — в память."""
+
+    def __init__(self, db: Session, memory: MemoryCatalog):
+        self.sql = SqlCatalog(db)
+        self.memory = memory
+
+    # ==========================
+    # BOOKS / BRANCHES / FACULTIES
+    # ==========================
+
+    def books_page(self, after_id: int | None, limit: int | None):
+        return self.memory.books_page(after_id, limit)
+
+    def get_book(self, book_id: int) -> Book | None:
+        return self.memory.get_book(book_id)
+
+    def create_book(self, data: BookBase) -> Book:
+        book = self.sql.create_book(data)
+        self.memory.put_book(book)
+        return book
+
+    def update_book(self, book_id: int, data: BookBase) -> Book | None:
+        book = self.sql.update_book(book_id, data)
+        if book is not None:
+            self.memory.put_book(book)
+        return book
+
+    def branches_page(self, after_id: int | None, limit: int | None):
+        return self.memory.branches_page(after_id, limit)
+
+    def get_branch(self, branch_id: int) -> Branch | None:
+        return self.memory.get_branch(branch_id)
+
+    def create_branch(self, data: BranchBase) -> Branch:
+        branch = self.sql.create_branch(data)
+        self.memory.put_branch(branch)
+        return branch
+
+    def update_branch(self, branch_id: int, data: BranchBase) -> Branch | None:
+        branch = self.sql.update_branch(branch_id, data)
+        if branch is not None:
+            self.memory.put_branch(branch)
+        return branch
+
+    def faculties_page(self, after_id: int | None, limit: int | None):
+        return self.memory.faculties_page(after_id, limit)
+
+    def get_faculty(self, faculty_id: int) -> Faculty | None:
+        return self.memory.get_faculty(faculty_id)
+
+    def create_faculty(self, name: str) -> Faculty:
+        faculty = self.sql.create_faculty(name)
+        self.memory.put_faculty(faculty)
+        return faculty
+
+    def stream(self, table: str, after_id: int | None, limit: int | None) -> Iterator[bytes]:
+        return self.memory.stream(table, after_id, limit)
+
+    # ==========================
+    # STOCK
+    # ==========================
+
+    def set_copies(self, branch_id: int, book_id: int, copies: int) -> None:
+        self.sql.set_copies(branch_id, book_id, copies)
+        self.memory.set_copies(branch_id, book_id, copies)
+
+    def copies(self, branch_id: int, book_id: int) -> int:
+        return self.memory.copies(branch_id, book_id)
+
+    def copies_batch(self, pairs: Sequence[BranchBookPair]) -> list[CopiesBatchItem]:
+        return self.memory.copies_batch(pairs)
+
+    # ==========================
+    # FACULTY LINKS
+    # ==========================
+
+    def book_faculties(self, branch_id: int, book_id: int) -> BookFacultiesResponse:
+        return self.memory.book_faculties(branch_id, book_id)
+
+    def branch_book_faculties(
+        self, branch_id: int, after_id: int | None, limit: int | None
+    ) -> list[BookFacultiesResponse]:
+        return self.memory.branch_book_faculties(branch_id, after_id, limit)
+
+    def book_faculties_batch(self, branch_id: int, book_ids: Iterable[int]) -> list[BookFacultiesResponse]:
+        return self.memory.book_faculties_batch(branch_id, book_ids)
+
+    def add_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        items = self.sql.add_faculty_links(links)
+        self.memory.sync_links(items)
+        return items
+
+    def remove_faculty_links(self, links: Sequence[BookFacultyLink]) -> list[BookFacultyLinkResult]:
+        items = self.sql.remove_faculty_links(links)
+        self.memory.sync_links(items)
+        return items
+
+    def faculty_books(self, faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None):
+        return self.memory.faculty_books(faculty_id, branch_id, after_id, limit)
+
+    # ==========================
+    # LOANS / IMPORT
+    # ==========================
+
+    def checkout(self, branch_id: int, book_id: int, student_id: str) -> Loan | None:
+        loan = self.sql.checkout(branch_id, book_id, student_id)
+        if loan is not None:
+            self.memory.add_copies(branch_id, book_id, -1)
+        return loan
+
+    def checkin(self, loan_id: int) -> Loan | None:
+        loan = self.sql.checkin(loan_id)
+        if loan is not None:
+            self.memory.add_copies(loan.branch_id, loan.book_id, 1)
+        return loan
+
+    def import_books(self, lines: Iterable[str], fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> BookImportReport:
+        report = self.sql.import_books(lines, fmt, batch_size)
+        if report.inserted or report.updated:
+            self.memory.load_books(self.sql.db)
+        return report
+
+
+# Каталог процесса для CATALOG_BACKEND=memory (загружается при старте, см. src.main).
+memory_catalog = MemoryCatalog()
+
+
+def catalog_for(db: Session) -> CatalogRepository:
+    if CATALOG_BACKEND == "memory":
+        return WriteThroughCatalog(db, memory_catalog)
+    return SqlCatalog(db)
@@ -0,0 +1,174 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BookBase(BaseModel):
+    title: str
+    author: str
+    year: int | None = None
+
+
+class Book(BookBase):
+    id: int
+
+
+class BookSearchHit(Book):
+    score: float
+
+
+class BranchBase(BaseModel):
+    name: str
+    address: str | None = None
+
+
+class Branch(BranchBase):
+    id: int
+
+
+class Faculty(BaseModel):
+    id: int
+    name: str
+
+
+class FacultyBook(Book):
+    # экземпляров в филиале (если задан branch_id) или во всей библиотеке
+    copies: int
+    # филиалы, где книга привязана к факультету
+    branch_ids: List[int]
+
+
+class BranchBookInfo(BaseModel):
+    branch_id: int
+    book_id: int
+    copies: int
+
+
+class BookFacultiesResponse(BaseModel):
+    branch_id: int
+    book_id: int
+    faculty_count: int
+    faculties: List[Faculty]
+
+
+MAX_BATCH_SIZE = 1000
+
+
+class BranchBookPair(BaseModel):
+    branch_id: int
+    book_id: int
+
+
+class CopiesBatchRequest(BaseModel):
+    items: List[BranchBookPair] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class CopiesBatchItem(BaseModel):
+    branch_id: int
+    book_id: int
+    copies: int | None = None
+    error: str | None = None
+
+
+class CopiesBatchResponse(BaseModel):
+    items: List[CopiesBatchItem]
+
+
+class BookIdsRequest(BaseModel):
+    book_ids: List[int] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class BookFacultiesBatchResponse(BaseModel):
+    items: List[BookFacultiesResponse]
+    missing_book_ids: List[int]
+
+
+class BookFacultyLink(BaseModel):
+    branch_id: int
+    book_id: int
+    faculty_id: int
+
+
+class BookFacultyLinksRequest(BaseModel):
+    items: List[BookFacultyLink] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class BookFacultyLinkResult(BookFacultyLink):
+    # added / exists — при добавлении, removed / absent — при удалении, error — см. error
+    status: str
+    error: str | None = None
+
+
+class BookFacultyLinksResponse(BaseModel):
+    items: List[BookFacultyLinkResult]
+    changed: int
+
+
+class BookImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BookImportReport(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    unchanged: int
+    rejected: int
+    errors: List[BookImportError]
+
+
+class LoanCreate(BaseModel):
+    student_id: str = Field(min_length=1, max_length=64)
+
+
+class Loan(BaseModel):
+    id: int
+    branch_id: int
+    book_id: int
+    student_id: str
+    issued_at: datetime
+    returned_at: datetime | None = None
+
+
+class CirculationStats(BaseModel):
+    branch_id: int
+    book_id: int
+    loans_total: int
+    active_loans: int
+    students: int
+    last_loan_at: datetime | None = None
+
+
+class BookCirculation(BaseModel):
+    book_id: int
+    loans_total: int
+    active_loans: int
+    students: int
+    branches: List[CirculationStats]
+
+
+class CirculationTopItem(BaseModel):
+    book_id: int
+    title: str
+    author: str
+    loans_total: int
+    students: int
+
+
+class BranchCopies(BaseModel):
+    branch_id: int
+    copies: int
+
+
+class BookAvailability(BaseModel):
+    book_id: int
+    total_copies: int
+    branch_count: int
+    branches: List[BranchCopies] | None = None
+
+
+class BookAvailabilityBatchResponse(BaseModel):
+    items: List[BookAvailability]
+    missing_book_ids: List[int]
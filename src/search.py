@@ -0,0 +1,109 @@
+"""
+Поиск книг по названию и автору.
+
+Полнотекстовый: tsvector по title (вес A) и author (вес B) с конфигурацией
+SEARCH_CONFIG в колонке books.search_doc, GIN-индекс по ней, ранжирование ts_rank.
+Нечёткий: word_similarity из pg_trgm по «title author» с GIN-индексом
+gin_trgm_ops — находит слова с опечатками. Если расширение pg_trgm
+недоступно (нет пакета или прав), поиск работает только полнотекстовый.
+
+Выдача отсортирована по score (сумма рангов) и постранично листается
+курсором «score:id», а не OFFSET.
+"""
+import re
+
+from sqlalchemy import Engine, TextClause, text
+
+SEARCH_CONFIG = "russian"
+MAX_QUERY_LENGTH = 200
+
+# tsvector хранится в books.search_doc (generated column): ts_rank по частому
+# слову считается для десятков тысяч строк, и пересчитывать to_tsvector
+# для каждой из них дороже самого ранжирования.
+DOCUMENT = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', author), 'B')"
+)
+# Выражение должно совпадать с индексным буква в букву, иначе планировщик
+# не узнает в условии индекс.
+TRIGRAM_TEXT = "(title || ' ' || author)"
+
+SEARCH_DDL = [
+    f"ALTER TABLE books ADD COLUMN IF NOT EXISTS search_doc tsvector GENERATED ALWAYS AS ({DOCUMENT}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_books_search_fts ON books USING gin (search_doc)",
+    """
+    DO $$
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN undefined_file OR insufficient_privilege OR feature_not_supported THEN
+        RAISE NOTICE 'pg_trgm недоступно, нечёткий поиск выключен';
+    END
+    $$
+    """,
+    f"""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS ix_books_search_trgm ON books USING gin ({TRIGRAM_TEXT} gin_trgm_ops);
+        END IF;
+    END
+    $$
+    """,  # nosec B608: подставляются только константы модуля
+]
+
+_CURSOR_RE = re.compile(r"^(?P<score>[0-9.eE+-]+):(?P<id>\d+)$")
+CURSOR_PATTERN = _CURSOR_RE.pattern
+
+# Определяется при старте (detect_trigram); до этого — только полнотекстовый.
+trigram_enabled = False
+
+
+def detect_trigram(engine: Engine) -> bool:
+    global trigram_enabled
+    with engine.connect() as conn:
+        installed = conn.scalar(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"))
+    trigram_enabled = bool(installed)
+    return trigram_enabled
+
+
+def search_query(fuzzy: bool, paged: bool) -> TextClause:
+    """
+    Параметры (search_params): cfg, q, limit; для следующих страниц (paged) — score и after_id из курсора.
+    Колонки books не квалифицированы — так выражение для pg_trgm совпадает с индексным.
+    """
+    score = "ts_rank(search_doc, q.query)"
+    match = "search_doc @@ q.query"
+    if fuzzy:
+        # raw <% text — в тексте есть слово, похожее на запрос не меньше word_similarity_threshold
+        score += f" + word_similarity(q.raw, {TRIGRAM_TEXT})"
+        match += f" OR q.raw <% {TRIGRAM_TEXT}"
+    # score в курсоре — текстовое представление real; сравнивать тоже в real
+    after = "WHERE (s.score, -s.id) < (CAST(:score AS real), -:after_id)" if paged else ""
+    return text(
+        f"""
+        SELECT s.id, s.title, s.author, s.year, s.score
+        FROM (
+            SELECT id, title, author, year, CAST({score} AS real) AS score
+            FROM books
+            CROSS JOIN (
+                SELECT websearch_to_tsquery(CAST(:cfg AS regconfig), :q) AS query, CAST(:q AS text) AS raw
+            ) AS q
+            WHERE {match}
+        ) AS s
+        {after}
+        ORDER BY s.score DESC, s.id
+        LIMIT :limit
+        """  # nosec B608: подставляются только фрагменты SQL из кода
+    )
+
+
+def search_params(q: str, limit: int, cursor: str | None) -> dict:
+    params = {"cfg": SEARCH_CONFIG, "q": q, "limit": limit}
+    if cursor:
+        m = _CURSOR_RE.match(cursor)
+        params.update(score=float(m["score"]), after_id=int(m["id"]))
+    return params
+
+
+def search_cursor(row) -> str:
+    return f"{row.score!r}:{row.id}"
@@ -0,0 +1,311 @@
+"""
+Тела эндпоинтов каталога, общие для sync- (src/main.py) и async-маршрутов
+(src/async_api.py).
+
+Каждая функция принимает синхронную Session первым аргументом: sync-маршрут
+вызывает её в своём потоке threadpool, async-маршрут — через
+AsyncSession.run_sync, то есть в greenlet поверх async-драйвера, не занимая
+поток. Данные — через CatalogRepository из catalog_for, поэтому оба режима
+работают и с CATALOG_BACKEND=memory. За маршрутами остаются параметры
+запроса, ops-кэш и потоковые ответы.
+"""
+from typing import Iterator
+
+from fastapi import HTTPException, Response
+from sqlalchemy.orm import Session
+
+from src import etags, queries, search
+from src.cache import invalidate_book, invalidate_branch, invalidate_pair
+from src.pagination import DEFAULT_PAGE_LIMIT, fetch_limit, page_limit, trim_page
+from src.repository import CatalogRepository, catalog_for
+from src.schemas import (
+    Book,
+    BookAvailability,
+    BookAvailabilityBatchResponse,
+    BookBase,
+    BookCirculation,
+    BookFacultiesBatchResponse,
+    BookFacultiesResponse,
+    BookFacultyLink,
+    BookFacultyLinkResult,
+    BookFacultyLinksRequest,
+    BookFacultyLinksResponse,
+    BookIdsRequest,
+    BookSearchHit,
+    Branch,
+    BranchBase,
+    BranchBookInfo,
+    CirculationStats,
+    CirculationTopItem,
+    CopiesBatchRequest,
+    CopiesBatchResponse,
+    Faculty,
+    FacultyBook,
+    Loan,
+    LoanCreate,
+)
+from src.serialization import json_rows
+
+
+def _require_branch(catalog: CatalogRepository, branch_id: int) -> None:
+    if not catalog.get_branch(branch_id):
+        raise HTTPException(status_code=404, detail="Филиал не найден")
+
+
+def _require_book(catalog: CatalogRepository, book_id: int) -> None:
+    if not catalog.get_book(book_id):
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+
+
+def stream(db: Session, table: str, after_id: int | None, limit: int | None) -> Iterator[bytes]:
+    return catalog_for(db).stream(table, after_id, limit)
+
+
+# ==========================
+# BOOKS
+# ==========================
+
+def list_books(db: Session, response: Response, after_id: int | None, limit: int | None) -> Response:
+    limit = page_limit(limit, after_id)
+    rows = trim_page(catalog_for(db).books_page(after_id, limit), limit, response)
+    return json_rows(rows, Book, response)
+
+
+def search_books(
+    db: Session, response: Response, q: str, limit: int | None, cursor: str | None
+) -> list[BookSearchHit]:
+    limit = limit or DEFAULT_PAGE_LIMIT
+    stmt = search.search_query(fuzzy=search.trigram_enabled, paged=cursor is not None)
+    rows = db.execute(stmt, search.search_params(q, limit + 1, cursor)).all()
+    return [BookSearchHit(**r._mapping) for r in trim_page(rows, limit, response, cursor=search.search_cursor)]
+
+
+def get_book(db: Session, book_id: int) -> Book:
+    book = catalog_for(db).get_book(book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+    return book
+
+
+def create_book(db: Session, data: BookBase) -> Book:
+    result = catalog_for(db).create_book(data)
+    return result
+
+
+def update_book(db: Session, book_id: int, data: BookBase) -> Book:
+    result = catalog_for(db).update_book(book_id, data)
+    if not result:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+    invalidate_book(book_id)
+    return result
+
+
+# ==========================
+# BRANCHES
+# ==========================
+
+def list_branches(db: Session, response: Response, after_id: int | None, limit: int | None) -> Response:
+    limit = page_limit(limit, after_id)
+    rows = trim_page(catalog_for(db).branches_page(after_id, limit), limit, response)
+    return json_rows(rows, Branch, response)
+
+
+def get_branch(db: Session, branch_id: int) -> Branch:
+    branch = catalog_for(db).get_branch(branch_id)
+    if not branch:
+        raise HTTPException(status_code=404, detail="Филиал не найден")
+    return branch
+
+
+def create_branch(db: Session, data: BranchBase) -> Branch:
+    result = catalog_for(db).create_branch(data)
+    return result
+
+
+def update_branch(db: Session, branch_id: int, data: BranchBase) -> Branch:
+    result = catalog_for(db).update_branch(branch_id, data)
+    if not result:
+        raise HTTPException(status_code=404, detail="Филиал не найден")
+    invalidate_branch(branch_id)
+    return result
+
+
+# ==========================
+# FACULTIES
+# ==========================
+
+def list_faculties(db: Session, response: Response, after_id: int | None, limit: int | None) -> Response:
+    limit = page_limit(limit, after_id)
+    rows = trim_page(catalog_for(db).faculties_page(after_id, limit), limit, response)
+    return json_rows(rows, Faculty, response)
+
+
+def list_faculty_books(
+    db: Session, response: Response, faculty_id: int, branch_id: int | None, after_id: int | None, limit: int | None
+) -> Response:
+    catalog = catalog_for(db)
+    if not catalog.get_faculty(faculty_id):
+        raise HTTPException(status_code=404, detail="Факультет не найден")
+    if branch_id is not None:
+        _require_branch(catalog, branch_id)
+    limit = page_limit(limit, after_id)
+    rows = catalog.faculty_books(faculty_id, branch_id, after_id, limit)
+    return json_rows(trim_page(rows, limit, response), FacultyBook, response)
+
+
+# ==========================
+# OPS (ТЗ)
+# ==========================
+
+def copies(db: Session, branch_id: int, book_id: int) -> tuple[BranchBookInfo, str]:
+    """(ответ, ETag) — то, что маршрут кладёт в ops-кэш."""
+    catalog = catalog_for(db)
+    _require_branch(catalog, branch_id)
+    _require_book(catalog, book_id)
+    info = BranchBookInfo(branch_id=branch_id, book_id=book_id, copies=catalog.copies(branch_id, book_id))
+    return info, etags.content_etag(info)
+
+
+def copies_batch(db: Session, data: CopiesBatchRequest) -> CopiesBatchResponse:
+    if not data.items:
+        return CopiesBatchResponse(items=[])
+    return CopiesBatchResponse(items=catalog_for(db).copies_batch(data.items))
+
+
+def book_faculties(db: Session, branch_id: int, book_id: int) -> tuple[BookFacultiesResponse, str]:
+    """(ответ, ETag) для ops-кэша, как copies."""
+    catalog = catalog_for(db)
+    _require_branch(catalog, branch_id)
+    _require_book(catalog, book_id)
+    result = catalog.book_faculties(branch_id, book_id)
+    return result, etags.content_etag(result)
+
+
+def list_branch_book_faculties(
+    db: Session, response: Response, branch_id: int, after_id: int | None, limit: int | None
+) -> list[BookFacultiesResponse]:
+    catalog = catalog_for(db)
+    _require_branch(catalog, branch_id)
+    limit = page_limit(limit, after_id)
+    items = catalog.branch_book_faculties(branch_id, after_id, limit)
+    return trim_page(items, limit, response, cursor=lambda x: x.book_id)
+
+
+def book_faculties_batch(db: Session, branch_id: int, data: BookIdsRequest) -> BookFacultiesBatchResponse:
+    catalog = catalog_for(db)
+    _require_branch(catalog, branch_id)
+
+    requested = set(data.book_ids)
+    if not requested:
+        return BookFacultiesBatchResponse(items=[], missing_book_ids=[])
+
+    items = catalog.book_faculties_batch(branch_id, requested)
+    missing = sorted(requested - {x.book_id for x in items})
+    return BookFacultiesBatchResponse(items=items, missing_book_ids=missing)
+
+
+def _links_changed(items: list[BookFacultyLinkResult], done: str) -> list[BookFacultyLinkResult]:
+    for pair in queries.changed_pairs(items, done):
+        invalidate_pair(*pair)
+    return items
+
+
+def add_book_faculty(db: Session, branch_id: int, book_id: int, faculty_id: int) -> None:
+    """Ответ маршрут берёт через ops-кэш (book_faculties)."""
+    link = BookFacultyLink(branch_id=branch_id, book_id=book_id, faculty_id=faculty_id)
+    [item] = _links_changed(catalog_for(db).add_faculty_links([link]), queries.LINK_ADDED)
+    if item.error:
+        raise HTTPException(status_code=404, detail=item.error)
+
+
+def add_book_faculties(db: Session, data: BookFacultyLinksRequest) -> BookFacultyLinksResponse:
+    if not data.items:
+        return BookFacultyLinksResponse(items=[], changed=0)
+    items = _links_changed(catalog_for(db).add_faculty_links(data.items), queries.LINK_ADDED)
+    return BookFacultyLinksResponse(items=items, changed=sum(x.status == queries.LINK_ADDED for x in items))
+
+
+def remove_book_faculties(db: Session, data: BookFacultyLinksRequest) -> BookFacultyLinksResponse:
+    if not data.items:
+        return BookFacultyLinksResponse(items=[], changed=0)
+    items = _links_changed(catalog_for(db).remove_faculty_links(data.items), queries.LINK_REMOVED)
+    return BookFacultyLinksResponse(items=items, changed=sum(x.status == queries.LINK_REMOVED for x in items))
+
+
+# ==========================
+# LOANS
+# ==========================
+
+def checkout_book(db: Session, branch_id: int, book_id: int, data: LoanCreate) -> Loan:
+    catalog = catalog_for(db)
+    loan = catalog.checkout(branch_id, book_id, data.student_id)
+    if loan is None:
+        _require_branch(catalog, branch_id)
+        _require_book(catalog, book_id)
+        raise HTTPException(status_code=409, detail="Нет свободных экземпляров")
+    invalidate_pair(branch_id, book_id)
+    return loan
+
+
+def checkin_book(db: Session, loan_id: int) -> Loan:
+    loan = catalog_for(db).checkin(loan_id)
+    if loan is None:
+        if db.execute(queries.loan(loan_id)).one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Выдача не найдена")
+        raise HTTPException(status_code=409, detail="Книга уже возвращена")
+    invalidate_pair(loan.branch_id, loan.book_id)
+    return loan
+
+
+def get_loan(db: Session, loan_id: int) -> Loan:
+    row = db.execute(queries.loan(loan_id)).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Выдача не найдена")
+    return queries.loan_from_row(row)
+
+
+# ==========================
+# CIRCULATION
+# ==========================
+
+def book_circulation(db: Session, book_id: int) -> BookCirculation:
+    _require_book(catalog_for(db), book_id)
+    rows = db.execute(queries.book_circulation(book_id)).all()
+    return queries.book_circulation_response(book_id, rows)
+
+
+def list_branch_circulation(
+    db: Session, response: Response, branch_id: int, after_id: int | None, limit: int | None
+) -> list[CirculationStats]:
+    _require_branch(catalog_for(db), branch_id)
+    limit = page_limit(limit, after_id)
+    rows = db.execute(queries.branch_circulation_page(branch_id, after_id).limit(fetch_limit(limit))).all()
+    return [CirculationStats(**r._mapping) for r in trim_page(rows, limit, response, cursor=lambda r: r.book_id)]
+
+
+def circulation_top(db: Session, limit: int, by: str, branch_id: int | None) -> list[CirculationTopItem]:
+    rows = db.execute(queries.circulation_top(limit, by, branch_id)).all()
+    return [CirculationTopItem(**r._mapping) for r in rows]
+
+
+# ==========================
+# AVAILABILITY
+# ==========================
+
+def book_availability(db: Session, book_id: int, branches: bool) -> BookAvailability:
+    totals = db.execute(queries.availability([book_id])).all()
+    if not totals:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+    branch_rows = db.execute(queries.availability_branches([book_id])).all() if branches else None
+    return queries.availability_items(totals, branch_rows)[0]
+
+
+def books_availability(db: Session, data: BookIdsRequest, branches: bool) -> BookAvailabilityBatchResponse:
+    requested = set(data.book_ids)
+    if not requested:
+        return BookAvailabilityBatchResponse(items=[], missing_book_ids=[])
+    totals = db.execute(queries.availability(requested)).all()
+    branch_rows = db.execute(queries.availability_branches(requested)).all() if branches else None
+    items = queries.availability_items(totals, branch_rows)
+    missing = sorted(requested - {x.book_id for x in items})
+    return BookAvailabilityBatchResponse(items=items, missing_book_ids=missing)
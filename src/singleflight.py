@@ -0,0 +1,106 @@
+"""
+Single-flight: одинаковые одновременные чтения внутри воркера сливаются
+в один поход в БД, результат (или исключение) получают все ожидающие.
+
+SingleFlight — для sync-обработчиков (threadpool): ожидающие потоки ждут
+threading.Event. AsyncSingleFlight — для DB_MODE=async: ожидающие корутины
+ждут future. Ключ должен включать всё, от чего зависит результат; вызов,
+начатый до записи, не должен подхватываться после неё (см. src.cache).
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _Counters:
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class SingleFlight(_Counters):
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight(_Counters):
+    def __init__(self):
+        super().__init__()
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        joined = False
+        while (future := self._calls.get(key)) is not None:
+            if not joined:
+                self.coalesced += 1
+                joined = True
+            try:
+                # shield: отмена одного ожидающего не отменяет общий вызов
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # отменили ведущего (клиент ушёл) — пробуем сами, если отменили не нас
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+        if joined:
+            self.coalesced -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # исключение забирают ожидающие; если их нет — не ругаться «never retrieved»
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
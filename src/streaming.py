@@ -0,0 +1,38 @@
+import json
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import Select
+
+from src.db import SessionLocal, get_async_sessionmaker
+
+# Сколько строк забираем с серверного курсора за один fetch.
+STREAM_BATCH_SIZE = 1000
+
+
+def _encode_partition(partition) -> bytes:
+    return "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in partition).encode()
+
+
+def iter_ndjson(stmt: Select, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Построчно отдаёт результат запроса в формате NDJSON.
+
+    Строки читаются через серверный курсор (stream_results + yield_per),
+    поэтому память не зависит от размера таблицы. Сессия открывается
+    своя: генератор живёт дольше, чем зависимость get_db запроса.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for partition in result.mappings().partitions():
+            yield _encode_partition(partition)
+    finally:
+        db.close()
+
+
+async def aiter_ndjson(stmt: Select, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Async-вариант iter_ndjson для DB_MODE=async (AsyncSession.stream)."""
+    async with get_async_sessionmaker()() as db:
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.mappings().partitions():
+            yield _encode_partition(partition)
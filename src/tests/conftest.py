@@ -1,8 +1,15 @@
 import os
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# допуск по умолчанию выключен; тесты гоняют приложение с ним (test_api_admission)
+os.environ.setdefault("ADMISSION_ENABLED", "1")
 
-from src.main import app
+from src.main import app  # noqa: E402
 
 
 # --- constants required by tests (must exist in DB before pytest) ---
@@ -95,3 +102,37 @@ def seeded_ids(client):
         "fac_it_id": fac_it["id"],
         "fac_math_id": fac_math["id"],
     }
+
+
+@pytest.fixture()
+def statements():
+    """SQL-запросы, выполненные за время теста."""
+    seen = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    # на класс Engine — чтобы ловить и sync-, и async-движок (DB_MODE=async)
+    event.listen(Engine, "before_cursor_execute", _count)
+    try:
+        yield seen
+    finally:
+        event.remove(Engine, "before_cursor_execute", _count)
+
+
+@pytest.fixture()
+def stocked(client):
+    """Фабрика: новые филиал и книга с заданным числом экземпляров в branch_stock."""
+    from src.db import SessionLocal
+    from src.repository import catalog_for
+
+    def make(copies):
+        tag = uuid.uuid4().hex[:8]
+        branch_id = client.post("/branches", json={"name": f"Stock Branch {tag}"}).json()["id"]
+        book_id = client.post("/books", json={"title": f"Stock Book {tag}", "author": "Stock Author"}).json()["id"]
+        # через репозиторий — чтобы при CATALOG_BACKEND=memory остаток попал и в каталог в памяти
+        with SessionLocal() as db:
+            catalog_for(db).set_copies(branch_id, book_id, copies)
+        return branch_id, book_id
+
+    return make
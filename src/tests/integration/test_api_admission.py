@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+
+from src import admission, repository
+from src.admission import Limiter
+from src.db import engine
+
+LOCK_SECONDS = 1.5
+
+
+def _p99(values):
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * 0.99) - 1)]
+
+
+@pytest.mark.skipif(repository.CATALOG_BACKEND == "memory", reason="каталог в памяти: /books не ходит в БД")
+def test_overload_sheds_bulk_and_keeps_priority_routes_fast(client, branch1, monkeypatch):
+    monkeypatch.setitem(admission.limiters, admission.BULK, Limiter(admission.BULK, limit=2, queue=2, timeout=0.3))
+    locked = threading.Event()
+
+    def slow_database():
+        # «БД тормозит»: чтение books ждёт снятия блокировки
+        with engine.begin() as conn:
+            conn.execute(text("LOCK TABLE books IN ACCESS EXCLUSIVE MODE"))
+            locked.set()
+            time.sleep(LOCK_SECONDS)
+
+    def timed(method, path, **kwargs):
+        started = time.perf_counter()
+        r = client.request(method, path, **kwargs)
+        return r, time.perf_counter() - started
+
+    branch = {"name": branch1["name"], "address": branch1.get("address")}
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        holder = pool.submit(slow_database)
+        assert locked.wait(5)
+        bulk = [pool.submit(timed, "GET", "/books") for _ in range(40)]
+        priority = [pool.submit(timed, "GET", "/health") for _ in range(10)]
+        priority += [pool.submit(timed, "PUT", f"/branches/{branch1['id']}", json=branch) for _ in range(5)]
+        bulk = [f.result(timeout=30) for f in bulk]
+        priority = [f.result(timeout=30) for f in priority]
+        holder.result()
+
+    admitted = [elapsed for r, elapsed in bulk if r.status_code == 200]
+    shed = [(r, elapsed) for r, elapsed in bulk if r.status_code != 200]
+    # в БД пускаем не больше limit + queue, остальные — сразу 503
+    assert 1 <= len(admitted) <= 4
+    assert {r.status_code for r, _ in shed} == {503}
+    assert all(r.headers["Retry-After"] == str(admission.RETRY_AFTER) for r, _ in shed)
+    assert max(elapsed for _, elapsed in shed) < LOCK_SECONDS
+    # допущенные ждут только саму БД
+    assert _p99(admitted) < LOCK_SECONDS + 2
+
+    # health и запись не стоят за списками
+    assert [r.status_code for r, _ in priority] == [200] * len(priority)
+    assert _p99([elapsed for _, elapsed in priority]) < LOCK_SECONDS
+
+    body = client.get("/metrics").text
+    assert 'http_admission_total{class="bulk",outcome="rejected"}' in body
+    assert 'http_requests_total{method="GET",route="/books",status="503"}' in body
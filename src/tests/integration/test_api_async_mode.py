@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from src import main
+
+
+@pytest.fixture(scope="module")
+def async_client(client):
+    # client из conftest гарантирует, что startup (схема + сиды) уже отработал
+    app = FastAPI()
+    app.router.routes = list(main.app.router.routes)
+    main._use_async_routes(app)
+    with TestClient(app) as c:
+        yield c
+
+
+def _endpoint(app, path, method):
+    for route in app.router.routes:
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+            return route.endpoint
+    raise AssertionError(f"no route {method} {path}")
+
+
+def test_async_routes_replace_sync_ones(async_client):
+    app = async_client.app
+    for path, method in [
+        ("/books", "GET"),
+        ("/books/{book_id}", "PUT"),
+        ("/branches/{branch_id}/books/{book_id}/copies", "GET"),
+        ("/branches/{branch_id}/books/{book_id}/faculties/{faculty_id}", "POST"),
+    ]:
+        assert asyncio.iscoroutinefunction(_endpoint(app, path, method))
+
+    # маршруты без async-версии остаются
+    assert _endpoint(app, "/health", "GET") is main.health_check
+    paths = [(r.path, tuple(sorted(r.methods))) for r in app.router.routes if isinstance(r, APIRoute)]
+    assert len(paths) == len(set(paths))
+
+
+@pytest.mark.parametrize("endpoint", ["/books", "/branches", "/faculties"])
+def test_async_lists_match_sync(client, async_client, endpoint):
+    assert async_client.get(endpoint).json() == client.get(endpoint).json()
+
+
+def test_async_ops_match_sync(client, async_client, seeded_ids):
+    for branch_id in (seeded_ids["main_branch_id"], seeded_ids["it_branch_id"]):
+        for book_id in (seeded_ids["book1_id"], seeded_ids["book2_id"]):
+            for tail in ("copies", "faculties"):
+                path = f"/branches/{branch_id}/books/{book_id}/{tail}"
+                assert async_client.get(path).json() == client.get(path).json()
+
+    r = async_client.get(f"/branches/999999/books/{seeded_ids['book1_id']}/copies")
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Филиал не найден"
+
+
+def test_async_book_crud(async_client):
+    r = async_client.post("/books", json={"title": "Async Book", "author": "Async Author", "year": 2021})
+    assert r.status_code == 201
+    book = r.json()
+
+    r = async_client.put(f"/books/{book['id']}", json={"title": "Async Book 2", "author": "A", "year": None})
+    assert r.status_code == 200
+    assert r.json() == {"id": book["id"], "title": "Async Book 2", "author": "A", "year": None}
+
+    assert async_client.get(f"/books/{book['id']}").json()["title"] == "Async Book 2"
+    assert async_client.get("/books/999999").status_code == 404
+
+
+def test_async_branch_crud(async_client):
+    r = async_client.post("/branches", json={"name": "Async Branch", "address": None})
+    assert r.status_code == 201
+    branch = r.json()
+
+    r = async_client.put(f"/branches/{branch['id']}", json={"name": "Async Branch 2", "address": "Somewhere"})
+    assert r.status_code == 200
+    assert async_client.get(f"/branches/{branch['id']}").json()["address"] == "Somewhere"
+
+
+def test_async_add_book_faculty_404(async_client, seeded_ids):
+    r = async_client.post(
+        f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/faculties/999999"
+    )
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Факультет не найден"
+
+
+def test_async_stream_and_pagination(client, async_client):
+    streamed = async_client.get("/books", params={"stream": "true"}).text.splitlines()
+    assert len(streamed) == len(client.get("/books", params={"stream": "true"}).text.splitlines())
+
+    r = async_client.get("/books", params={"limit": 1})
+    assert r.headers["X-Next-Cursor"] == str(r.json()[0]["id"])
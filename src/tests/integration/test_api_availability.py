@@ -0,0 +1,135 @@
+from sqlalchemy import delete, func, insert, select, text, update
+
+from src import queries
+from src.bootstrap import AVAILABILITY_RECOMPUTE, AVAILABILITY_SHARDS
+from src.db import SessionLocal
+from src.models import BookAvailability as BookAvailabilityORM, BranchStock as BranchStockORM
+from src.repository import catalog_for
+
+
+def _summary_mismatches():
+    """Книги, у которых сводка расходится с агрегатом по branch_stock."""
+    with SessionLocal() as db:
+        actual = {
+            r.book_id: (r.total, r.branches)
+            for r in db.execute(
+                select(
+                    BranchStockORM.book_id,
+                    func.sum(BranchStockORM.copies).label("total"),
+                    func.count().filter(BranchStockORM.copies > 0).label("branches"),
+                ).group_by(BranchStockORM.book_id)
+            )
+        }
+        summary = {
+            r.book_id: (r.total, r.branches)
+            for r in db.execute(
+                select(
+                    BookAvailabilityORM.book_id,
+                    func.sum(BookAvailabilityORM.total_copies).label("total"),
+                    func.sum(BookAvailabilityORM.branch_count).label("branches"),
+                ).group_by(BookAvailabilityORM.book_id)
+            )
+        }
+    return {k for k in actual.keys() | summary.keys() if actual.get(k, (0, 0)) != summary.get(k, (0, 0))}
+
+
+def test_book_availability(client, seeded_ids):
+    r = client.get(f"/books/{seeded_ids['book1_id']}/availability")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total_copies"] == sum(x["copies"] for x in body["branches"])
+    assert body["branch_count"] == len(body["branches"])
+    by_branch = {x["branch_id"]: x["copies"] for x in body["branches"]}
+    for branch_id in (seeded_ids["main_branch_id"], seeded_ids["it_branch_id"]):
+        copies = client.get(f"/branches/{branch_id}/books/{seeded_ids['book1_id']}/copies").json()["copies"]
+        assert by_branch[branch_id] == copies
+
+    r = client.get(f"/books/{seeded_ids['book1_id']}/availability", params={"branches": "false"})
+    assert r.json()["branches"] is None
+    assert r.json()["total_copies"] == body["total_copies"]
+
+    assert client.get("/books/999999/availability").status_code == 404
+
+
+def test_book_without_stock_has_zero_availability(client):
+    book_id = client.post("/books", json={"title": "No Stock Book", "author": "Nobody"}).json()["id"]
+    r = client.get(f"/books/{book_id}/availability")
+    assert r.json() == {"book_id": book_id, "total_copies": 0, "branch_count": 0, "branches": []}
+
+
+def test_availability_batch(client, seeded_ids):
+    ids = [seeded_ids["book2_id"], seeded_ids["book1_id"], 999999]
+    r = client.post("/books/availability/batch", json={"book_ids": ids})
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["book_id"] for x in body["items"]] == sorted(ids[:2])
+    assert body["missing_book_ids"] == [999999]
+    for item in body["items"]:
+        assert item == client.get(f"/books/{item['book_id']}/availability").json()
+
+    assert client.post("/books/availability/batch", json={"book_ids": []}).json() == {
+        "items": [],
+        "missing_book_ids": [],
+    }
+
+
+def test_summary_follows_every_kind_of_stock_change(client, stocked):
+    branch_id, book_id = stocked(3)
+    other_book = client.post("/books", json={"title": "Moved Stock", "author": "Mover"}).json()["id"]
+    path = f"/books/{book_id}/availability"
+    assert client.get(path).json()["total_copies"] == 3
+
+    loan_id = client.post(
+        f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "avail"}
+    ).json()["id"]
+    assert client.get(path).json()["total_copies"] == 2
+    client.post(f"/loans/{loan_id}/checkin")
+    assert client.get(path).json()["total_copies"] == 3
+
+    with SessionLocal() as db:
+        stock = (BranchStockORM.branch_id == branch_id) & (BranchStockORM.book_id == book_id)
+        db.execute(update(BranchStockORM).where(stock).values(copies=0))
+        db.commit()
+        assert client.get(path).json()["branch_count"] == 0
+
+        db.execute(update(BranchStockORM).where(stock).values(copies=4, book_id=other_book))
+        db.commit()
+        assert client.get(path).json()["total_copies"] == 0
+        assert client.get(f"/books/{other_book}/availability").json()["total_copies"] == 4
+
+        db.execute(delete(BranchStockORM).where(BranchStockORM.book_id == other_book))
+        db.commit()
+        assert client.get(f"/books/{other_book}/availability").json()["total_copies"] == 0
+
+    assert _summary_mismatches() == set()
+
+
+def test_checkouts_in_other_branches_do_not_wait_on_the_summary(client, stocked):
+    branch_a, book_id = stocked(1)
+    branch_b = client.post("/branches", json={"name": f"Shard Branch {book_id}"}).json()["id"]
+    assert branch_a % AVAILABILITY_SHARDS != branch_b % AVAILABILITY_SHARDS
+    with SessionLocal() as db:
+        catalog_for(db).set_copies(branch_b, book_id, 1)
+
+    with SessionLocal() as first, SessionLocal() as second:
+        second.execute(text("SET lock_timeout = '2s'"))
+        assert first.execute(queries.checkout(branch_a, book_id, "shard-a")).one_or_none() is not None
+        # первая выдача ещё не закоммичена — вторая в другом филиале не ждёт её
+        assert second.execute(queries.checkout(branch_b, book_id, "shard-b")).one_or_none() is not None
+        second.rollback()
+        first.rollback()
+
+
+def test_recompute_drops_stale_summary_rows(client):
+    book_id = client.post("/books", json={"title": "Stale Summary", "author": "Nobody"}).json()["id"]
+    with SessionLocal() as db:
+        db.execute(insert(BookAvailabilityORM).values(book_id=book_id, shard=0, total_copies=7, branch_count=1))
+        db.commit()
+        assert client.get(f"/books/{book_id}/availability").json()["total_copies"] == 7
+
+        for ddl in AVAILABILITY_RECOMPUTE:
+            db.execute(text(ddl))
+        db.commit()
+
+    assert client.get(f"/books/{book_id}/availability").json()["total_copies"] == 0
+    assert _summary_mismatches() == set()
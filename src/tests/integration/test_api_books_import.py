@@ -0,0 +1,123 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import delete, func, select, text
+
+from src import repository
+from src.bulk_import import BookImporter, iter_lines
+from src.db import SessionLocal
+from src.models import Book as BookORM
+from src.repository import catalog_for
+
+
+@pytest.fixture()
+def author():
+    """Уникальный автор на тест; книги этого автора удаляются после теста."""
+    name = f"Import Author {uuid.uuid4().hex[:8]}"
+    yield name
+    with SessionLocal() as db:
+        db.execute(delete(BookORM).where(BookORM.author == name))
+        db.commit()
+        # удаления книг в API нет — каталог в памяти перечитывает их сам
+        if repository.CATALOG_BACKEND == "memory":
+            repository.memory_catalog.load_books(db)
+
+
+def _books_by(author):
+    with SessionLocal() as db:
+        rows = db.execute(select(BookORM.title, BookORM.year).where(BookORM.author == author)).all()
+    return {title: year for title, year in rows}
+
+
+def test_import_csv_reports_rejected_rows(client, author):
+    body = (
+        "title,author,year\n"
+        f"Import One,{author},2001\n"
+        f"Import Two,{author},\n"
+        f",{author},2003\n"
+        f"Import Four,{author},soon\n"
+    )
+    r = client.post("/books/import", content=body.encode(), headers={"Content-Type": "text/csv"})
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert report["received"] == 4
+    assert report["inserted"] == 2
+    assert report["rejected"] == 2
+    assert [e["line"] for e in report["errors"]] == [4, 5]
+
+    assert _books_by(author) == {"Import One": 2001, "Import Two": None}
+
+
+def test_import_ndjson_merges_with_existing(client, author):
+    r = client.post("/books", json={"title": "Merge Me", "author": author, "year": 1999})
+    assert r.status_code == 201
+    existing_id = r.json()["id"]
+
+    lines = [
+        {"title": "Merge Me", "author": author, "year": 2000},
+        {"title": "Brand New", "author": author, "year": 2020},
+        {"title": "Brand New", "author": author, "year": 2021},
+    ]
+    body = "\n".join(json.dumps(x) for x in lines)
+    r = client.post("/books/import", params={"format": "ndjson"}, content=body.encode())
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (1, 1, 0)
+
+    assert client.get(f"/books/{existing_id}").json()["year"] == 2000
+    assert _books_by(author) == {"Merge Me": 2000, "Brand New": 2021}
+
+    r = client.post("/books/import", params={"format": "ndjson"}, content=body.encode())
+    assert r.json()["unchanged"] == 2
+
+
+def test_import_in_several_copy_batches(author):
+    n = 25
+    lines = iter_lines([b"title,author,year\n"] + [f"Batch {i},{author},{i}\n".encode() for i in range(n)])
+    with SessionLocal() as db:
+        report = catalog_for(db).import_books(lines, "csv", batch_size=4)
+    assert report.inserted == n
+    assert len(_books_by(author)) == n
+
+
+def test_parallel_imports_lock_only_the_merge(author):
+    with SessionLocal() as first, SessionLocal() as second:
+        # вторая загрузка не должна ждать первую, пока та только грузит staging
+        second.execute(text("SET lock_timeout = '2s'"))
+        a = BookImporter(first, batch_size=1)
+        a.add(1, {"title": "Parallel A", "author": author, "year": 2001})
+        b = BookImporter(second, batch_size=1)
+        b.add(1, {"title": "Parallel B", "author": author, "year": 2002})
+        assert a.finish().inserted == 1
+        assert b.finish().inserted == 1
+    assert _books_by(author) == {"Parallel A": 2001, "Parallel B": 2002}
+
+
+def test_import_rejects_unknown_format(client):
+    assert client.post("/books/import", params={"format": "xml"}, content=b"").status_code == 422
+
+
+def test_import_empty_body(client):
+    r = client.post("/books/import", params={"format": "ndjson"}, content=b"")
+    assert r.status_code == 200
+    assert r.json()["received"] == 0
+
+
+def test_import_error_list_is_capped(client, author, monkeypatch):
+    from src import bulk_import
+
+    monkeypatch.setattr(bulk_import, "MAX_REPORTED_ERRORS", 3)
+    body = "\n".join("not json" for _ in range(10))
+    r = client.post("/books/import", params={"format": "ndjson"}, content=body.encode())
+    report = r.json()
+    assert report["rejected"] == 10
+    assert len(report["errors"]) == 3
+
+
+def test_book_count_unchanged_by_rejected_only_import(client):
+    with SessionLocal() as db:
+        before = db.scalar(select(func.count()).select_from(BookORM))
+    client.post("/books/import", params={"format": "ndjson"}, content=b'{"title": ""}\n')
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(BookORM)) == before
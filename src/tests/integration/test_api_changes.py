@@ -0,0 +1,143 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import func, select, text
+
+from src import changes
+from src.db import SessionLocal
+from src.models import ChangeEvent
+from src.repository import SqlCatalog
+
+
+def _head() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.coalesce(func.max(ChangeEvent.id), 0)))
+
+
+def _journal(after: int) -> list[dict]:
+    with SessionLocal() as db:
+        rows = db.execute(select(ChangeEvent).where(ChangeEvent.id > after).order_by(ChangeEvent.id)).scalars()
+        return [{"entity": r.entity, "op": r.op, "data": r.data} for r in rows]
+
+
+def _sse_event(chunk: bytes) -> tuple[int, dict]:
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().splitlines())
+    assert fields["event"] == "change"
+    return int(fields["id"]), json.loads(fields["data"])
+
+
+def test_writes_publish_compact_events(client, stocked):
+    before = _head()
+    branch_id, book_id = stocked(1)
+    client.put(f"/books/{book_id}", json={"title": "Changed", "author": "Stock Author"})
+    loan = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "feed"}).json()
+    client.post(f"/loans/{loan['id']}/checkin")
+    r = client.post(
+        "/book-faculties/batch",
+        json={"items": [{"branch_id": branch_id, "book_id": book_id, "faculty_id": 2_000_000_000}]},
+    )
+    assert r.json()["changed"] == 0
+
+    assert _journal(before) == [
+        {"entity": "branch", "op": "create", "data": {"id": branch_id}},
+        {"entity": "book", "op": "create", "data": {"id": book_id}},
+        {"entity": "book", "op": "update", "data": {"id": book_id}},
+        {"entity": "stock", "op": "checkout", "data": {"branch_id": branch_id, "book_id": book_id, "delta": -1}},
+        {"entity": "stock", "op": "checkin", "data": {"branch_id": branch_id, "book_id": book_id, "delta": 1}},
+    ]
+
+
+def test_link_events(client, stocked, seeded_ids):
+    branch_id, book_id = stocked(1)
+    link = {"branch_id": branch_id, "book_id": book_id, "faculty_id": seeded_ids["fac_it_id"]}
+    before = _head()
+    client.post("/book-faculties/batch", json={"items": [link, link]})
+    client.post("/book-faculties/batch/delete", json={"items": [link]})
+    assert _journal(before) == [
+        {"entity": "book_faculty", "op": "added", "data": link},
+        {"entity": "book_faculty", "op": "removed", "data": link},
+    ]
+
+
+def test_event_commits_with_data(client, stocked, monkeypatch):
+    def broken(db, *events):
+        raise RuntimeError("publish failed")
+
+    branch_id, book_id = stocked(1)
+    before = _head()
+    # событие не записалось — выдачи тоже нет: данные без события не коммитятся
+    monkeypatch.setattr(changes, "publish", broken)
+    with SessionLocal() as db:
+        with pytest.raises(RuntimeError):
+            SqlCatalog(db).checkout(branch_id, book_id, "unpublished")
+    with SessionLocal() as db:
+        assert SqlCatalog(db).copies(branch_id, book_id) == 1
+    assert _head() == before
+
+
+def test_sse_replays_then_goes_live(client):
+    tag = uuid.uuid4().hex[:8]
+    before = _head()
+    book = client.post("/books", json={"title": f"Feed {tag}", "author": "F"}).json()
+    client.post("/branches", json={"name": f"Feed {tag}"})
+
+    async def scenario():
+        feed = changes.ChangeFeed()
+        stream = changes.sse(feed.events(before, frozenset({changes.BOOK})))
+        try:
+            assert (await anext(stream)).startswith(b"retry:")
+            replayed = _sse_event(await anext(stream))
+            # живое событие: запись из другого потока, приходит через LISTEN
+            await asyncio.to_thread(client.put, f"/books/{book['id']}", json={"title": f"Feed {tag}'", "author": "F"})
+            live = _sse_event(await asyncio.wait_for(anext(stream), 10))
+            return replayed, live, feed.subscribers
+        finally:
+            await stream.aclose()
+            await feed.stop()
+
+    (seq1, replayed), (seq2, live), subscribers = asyncio.run(scenario())
+    assert replayed == {"seq": seq1, "entity": "book", "op": "create", "data": {"id": book["id"]}}
+    assert live == {"seq": seq2, "entity": "book", "op": "update", "data": {"id": book["id"]}}
+    assert seq2 > seq1 > before
+    assert subscribers == 1
+
+
+def test_websocket_resume_from_sequence(client, stocked):
+    branch_id, book_id = stocked(2)
+    before = _head()
+    loan = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "ws"}).json()
+
+    with client.websocket_connect(f"/changes/ws?after={before}&entity=stock") as ws:
+        first = ws.receive_json()
+        client.post(f"/loans/{loan['id']}/checkin")
+        second = ws.receive_json()
+    assert (first["op"], first["data"]["delta"]) == ("checkout", -1)
+    assert (second["op"], second["data"]["delta"]) == ("checkin", 1)
+    assert second["seq"] > first["seq"] > before
+
+    # переподключение с последнего seq: ничего старого, только новое
+    client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "ws"})
+    with client.websocket_connect(f"/changes/ws?after={second['seq']}&entity=stock") as ws:
+        third = ws.receive_json()
+    assert third["seq"] > second["seq"] and third["op"] == "checkout"
+    # отключившийся клиент сразу снимается с раздачи
+    assert changes.feed.subscribers == 0
+
+
+def test_resume_older_than_journal_resets(client):
+    client.post("/branches", json={"name": f"Feed reset {uuid.uuid4().hex[:8]}"})
+    with SessionLocal() as db:
+        # как _PRUNE: последнее событие остаётся
+        db.execute(text("DELETE FROM change_events WHERE id < (SELECT max(id) FROM change_events)"))
+        db.commit()
+
+    with client.websocket_connect("/changes/ws?after=0") as ws:
+        message = ws.receive_json()
+    assert message["entity"] == "feed" and message["op"] == "reset"
+    assert message["seq"] >= _head()
+
+
+def test_sse_endpoint_validates_entity(client):
+    assert client.get("/changes", params={"entity": "loans"}).status_code == 422
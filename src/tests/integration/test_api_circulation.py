@@ -0,0 +1,126 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select, update
+
+from src.circulation import rebuild_stats
+from src.db import SessionLocal
+from src.models import CirculationStats as CirculationStatsORM
+from src.repository import catalog_for
+
+
+def _checkout(client, branch_id, book_id, student):
+    r = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": student})
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _branch_stats(client, branch_id):
+    r = client.get(f"/branches/{branch_id}/circulation")
+    assert r.status_code == 200
+    return {x["book_id"]: x for x in r.json()}
+
+
+def test_stats_follow_loans(client, stocked):
+    branch_id, book_id = stocked(5)
+    first = _checkout(client, branch_id, book_id, "alice")
+    client.post(f"/loans/{first}/checkin")
+    _checkout(client, branch_id, book_id, "alice")
+    _checkout(client, branch_id, book_id, "bob")
+
+    stats = _branch_stats(client, branch_id)[book_id]
+    assert (stats["loans_total"], stats["active_loans"], stats["students"]) == (3, 2, 2)
+    assert stats["last_loan_at"] is not None
+
+    book = client.get(f"/books/{book_id}/circulation").json()
+    assert (book["loans_total"], book["active_loans"], book["students"]) == (3, 2, 2)
+    assert [x["branch_id"] for x in book["branches"]] == [branch_id]
+
+
+def test_book_circulation_sums_branches(client, stocked):
+    branch_a, book_id = stocked(2)
+    branch_b = client.post("/branches", json={"name": f"Stats Branch {uuid.uuid4().hex[:8]}"}).json()["id"]
+    with SessionLocal() as db:
+        catalog_for(db).set_copies(branch_b, book_id, 2)
+
+    _checkout(client, branch_a, book_id, "carol")
+    _checkout(client, branch_b, book_id, "carol")
+    _checkout(client, branch_b, book_id, "dave")
+
+    book = client.get(f"/books/{book_id}/circulation").json()
+    assert [(x["branch_id"], x["loans_total"]) for x in book["branches"]] == [(branch_a, 1), (branch_b, 2)]
+    assert book["loans_total"] == 3
+    assert book["students"] == 3
+
+
+def test_circulation_without_loans_and_404(client, seeded_ids):
+    r = client.get(f"/books/{seeded_ids['book2_id']}/circulation")
+    assert r.status_code == 200
+    assert client.get("/books/999999/circulation").status_code == 404
+    assert client.get("/branches/999999/circulation").status_code == 404
+
+
+def test_top(client, stocked):
+    branch_id, book_a = stocked(10)
+    book_b = client.post("/books", json={"title": f"Stats Book {uuid.uuid4().hex[:8]}", "author": "X"}).json()["id"]
+    with SessionLocal() as db:
+        catalog_for(db).set_copies(branch_id, book_b, 10)
+
+    for student in ("s1", "s1", "s1"):
+        _checkout(client, branch_id, book_a, student)
+    for student in ("s1", "s2"):
+        _checkout(client, branch_id, book_b, student)
+
+    by_loans = client.get("/circulation/top", params={"branch_id": branch_id}).json()
+    assert [(x["book_id"], x["loans_total"]) for x in by_loans] == [(book_a, 3), (book_b, 2)]
+    by_students = client.get("/circulation/top", params={"branch_id": branch_id, "by": "students"}).json()
+    assert [x["book_id"] for x in by_students] == [book_b, book_a]
+
+    overall = client.get("/circulation/top", params={"limit": 5}).json()
+    totals = [x["loans_total"] for x in overall]
+    assert totals == sorted(totals, reverse=True)
+    for item in overall:
+        assert item["loans_total"] == client.get(f"/books/{item['book_id']}/circulation").json()["loans_total"]
+
+    assert client.get("/circulation/top", params={"by": "pages"}).status_code == 422
+
+
+def test_concurrent_checkouts_keep_stats_exact(client, stocked):
+    copies, attempts = 30, 120
+    branch_id, book_id = stocked(copies)
+    path = f"/branches/{branch_id}/books/{book_id}/checkout"
+
+    def checkout(i):
+        r = client.post(path, json={"student_id": f"student-{i % 7}"})
+        return r.json()["student_id"] if r.status_code == 201 else None
+
+    with ThreadPoolExecutor(max_workers=60) as pool:
+        students = [s for s in pool.map(checkout, range(attempts), timeout=120) if s]
+
+    stats = _branch_stats(client, branch_id)[book_id]
+    assert stats["loans_total"] == stats["active_loans"] == copies
+    assert stats["students"] == len(set(students))
+
+
+def test_rebuild_matches_incremental(client, stocked):
+    branch_id, book_id = stocked(3)
+    loan_id = _checkout(client, branch_id, book_id, "erin")
+    _checkout(client, branch_id, book_id, "frank")
+    client.post(f"/loans/{loan_id}/checkin")
+    incremental = _branch_stats(client, branch_id)
+
+    with SessionLocal() as db:
+        db.execute(
+            update(CirculationStatsORM)
+            .where(CirculationStatsORM.branch_id == branch_id)
+            .values(loans_total=0, active_loans=0, students=0)
+        )
+        db.commit()
+        assert rebuild_stats(db) > 0
+        assert db.scalar(
+            select(CirculationStatsORM.loans_total).where(
+                CirculationStatsORM.branch_id == branch_id, CirculationStatsORM.book_id == book_id
+            )
+        ) == 2
+
+    assert _branch_stats(client, branch_id) == incremental
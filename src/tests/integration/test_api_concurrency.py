@@ -0,0 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.db import MAX_OVERFLOW, POOL_SIZE
+
+
+def test_sync_endpoints_survive_more_requests_than_connections(client, seeded_ids):
+    # Раньше при > POOL_SIZE + MAX_OVERFLOW одновременных запросов потоки
+    # threadpool ждали соединения, а соединения — поток для ответа.
+    path = f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/copies"
+    n = 4 * (POOL_SIZE + MAX_OVERFLOW) + 40
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        statuses = list(pool.map(lambda _: client.get(path).status_code, range(n), timeout=60))
+
+    assert statuses == [200] * n
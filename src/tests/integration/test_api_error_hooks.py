@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from sqlalchemy import select
+
+from src import error_hooks
+from src.db import SessionLocal
+from src.error_hooks import CLIENT_ERROR, EXCEPTION, ErrorEvent, TableSink, WebhookSink
+from src.models import ErrorLogEntry
+
+MISSING = 2_000_000_000
+
+
+@pytest.fixture()
+def seen():
+    """События глобального конвейера за время теста (хук на все виды)."""
+    events = []
+    hook = error_hooks.pipeline.register(events.append)
+    try:
+        yield events
+    finally:
+        error_hooks.pipeline.flush()
+        error_hooks.pipeline.unregister(hook)
+
+
+def test_client_error_reaches_hooks(client, seen):
+    assert client.get(f"/books/{MISSING}").status_code == 404
+    assert client.get("/books", params={"limit": 0}).status_code == 422
+    assert error_hooks.pipeline.flush()
+
+    not_found, invalid = seen[-2:]
+    assert (not_found.kind, not_found.status, not_found.route) == (CLIENT_ERROR, 404, "/books/{book_id}")
+    assert not_found.path == f"/books/{MISSING}"
+    assert not_found.detail == "Книга не найдена"
+    assert invalid.status == 422 and "limit" in invalid.detail
+
+
+def test_unhandled_exception_reaches_hooks(client, seen):
+    from src.main import app
+
+    def boom():
+        raise RuntimeError("error hooks test")
+
+    app.add_api_route("/_error_hooks_boom", boom)
+    try:
+        with pytest.raises(RuntimeError):
+            client.get("/_error_hooks_boom")
+    finally:
+        app.router.routes = [r for r in app.router.routes if getattr(r, "path", None) != "/_error_hooks_boom"]
+    assert error_hooks.pipeline.flush()
+
+    [event] = [e for e in seen if e.kind == EXCEPTION]
+    assert event.status == 500 and event.route == "/_error_hooks_boom"
+    assert "RuntimeError: error hooks test" in event.error
+
+
+def test_slow_sink_adds_no_latency(client, seen):
+    class SlowSink:
+        name = "slow"
+
+        def write(self, batch):
+            time.sleep(1)
+
+    sink = SlowSink()
+    error_hooks.pipeline.sinks.append(sink)
+    try:
+        started = time.perf_counter()
+        for _ in range(3):
+            assert client.get(f"/books/{MISSING}").status_code == 404
+        assert time.perf_counter() - started < 0.5
+    finally:
+        error_hooks.pipeline.sinks.remove(sink)
+
+
+def _events(tag: str) -> list[ErrorEvent]:
+    return [
+        ErrorEvent(CLIENT_ERROR, 404, "GET", "/books/{book_id}", f"/books/{tag}", time.time(),
+                   json.dumps({"detail": "Книга не найдена"}).encode()),
+        ErrorEvent(EXCEPTION, 500, "POST", "/books", f"/books?{tag}", time.time(), exc=ValueError(tag)),
+    ]
+
+
+def test_table_sink_writes_batch():
+    tag = uuid.uuid4().hex[:8]
+    TableSink().write(_events(tag))
+    with SessionLocal() as db:
+        rows = db.scalars(
+            select(ErrorLogEntry).where(ErrorLogEntry.path.contains(tag)).order_by(ErrorLogEntry.id)
+        ).all()
+    assert [(r.kind, r.status, r.detail) for r in rows] == [
+        (CLIENT_ERROR, 404, "Книга не найдена"), (EXCEPTION, 500, tag),
+    ]
+    assert rows[1].error.endswith(f"ValueError: {tag}\n")
+
+
+def test_webhook_sink_posts_batch():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+    try:
+        WebhookSink(f"http://127.0.0.1:{server.server_port}/hook").write(_events("hook"))
+        thread.join(5)
+    finally:
+        server.server_close()
+
+    [batch] = received
+    assert [(e["kind"], e["status"], e["detail"]) for e in batch] == [
+        (CLIENT_ERROR, 404, "Книга не найдена"), (EXCEPTION, 500, "hook"),
+    ]
+    with pytest.raises(ValueError):
+        WebhookSink("file:///etc/passwd")
@@ -0,0 +1,114 @@
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from src import etags
+from src.db import SessionLocal
+from src.models import Book as BookORM
+from src.repository import SqlCatalog
+from src.schemas import BookBase
+
+
+def _revalidate(client, path, etag, **kwargs):
+    return client.get(path, headers={"If-None-Match": etag}, **kwargs)
+
+
+def test_list_not_modified_skips_query(client, statements):
+    r = client.get("/books")
+    etag = r.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert "must-revalidate" in r.headers["cache-control"]
+
+    statements.clear()
+    r = _revalidate(client, "/books", etag)
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+    # только чтение версий — сам список не запрашивается
+    assert len(statements) == 1
+    assert "change_versions" in statements[0]
+
+
+def test_write_changes_etag(client):
+    etag = client.get("/books").headers["etag"]
+    book_id = client.post("/books", json={"title": "ETag Book", "author": "A"}).json()["id"]
+    r = _revalidate(client, "/books", etag)
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+    book_etag = client.get(f"/books/{book_id}").headers["etag"]
+    assert _revalidate(client, f"/books/{book_id}", book_etag).status_code == 304
+    client.put(f"/books/{book_id}", json={"title": "ETag Book 2", "author": "A"})
+    r = _revalidate(client, f"/books/{book_id}", book_etag)
+    assert r.status_code == 200
+    assert r.json()["title"] == "ETag Book 2"
+
+    # изменение книг не трогает ETag филиалов
+    branches_etag = client.get("/branches").headers["etag"]
+    client.post("/books", json={"title": "ETag Book 3", "author": "A"})
+    assert _revalidate(client, "/branches", branches_etag).status_code == 304
+
+
+def test_version_commits_with_data(client, monkeypatch):
+    def broken(db, *tables):
+        raise RuntimeError("bump failed")
+
+    # версия не поднялась — книги тоже нет: отдельного коммита данных до версии не бывает
+    monkeypatch.setattr(etags, "bump", broken)
+    title = f"Unversioned {uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        with pytest.raises(RuntimeError):
+            SqlCatalog(db).create_book(BookBase(title=title, author="A"))
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(BookORM).where(BookORM.title == title)) == 0
+
+
+def test_etag_depends_on_query(client):
+    full = client.get("/faculties").headers["etag"]
+    page = client.get("/faculties", params={"limit": 1}).headers["etag"]
+    assert full != page
+    assert _revalidate(client, "/faculties", page).status_code == 200
+
+
+def test_if_none_match_forms(client):
+    etag = client.get("/branches").headers["etag"]
+    assert _revalidate(client, "/branches", f'"other", W/{etag}').status_code == 304
+    assert _revalidate(client, "/branches", "*").status_code == 304
+    assert _revalidate(client, "/branches", '"other"').status_code == 200
+
+
+def test_ops_pair_etag(client, stocked, statements):
+    branch_id, book_id = stocked(2)
+    path = f"/branches/{branch_id}/books/{book_id}/copies"
+    etag = client.get(path).headers["etag"]
+
+    # попадание в ops-кэш: 304 без единого запроса к БД
+    statements.clear()
+    assert _revalidate(client, path, etag).status_code == 304
+    assert statements == []
+
+    client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "etag"})
+    r = _revalidate(client, path, etag)
+    assert r.status_code == 200
+    assert r.json()["copies"] == 1
+
+
+def test_add_book_faculty_changes_branch_list_etag(client, seeded_ids, stocked):
+    branch_id, book_id = stocked(1)
+    path = f"/branches/{branch_id}/books/faculties"
+    etag = client.get(path).headers["etag"]
+    pair = f"/branches/{branch_id}/books/{book_id}/faculties"
+    pair_etag = client.get(pair).headers["etag"]
+
+    client.post(f"/branches/{branch_id}/books/{book_id}/faculties/{seeded_ids['fac_it_id']}")
+    assert _revalidate(client, path, etag).status_code == 200
+    r = _revalidate(client, pair, pair_etag)
+    assert r.status_code == 200
+    assert r.json()["faculty_count"] == 1
+
+
+def test_errors_have_no_etag(client):
+    r = client.get("/books/999999")
+    assert r.status_code == 404
+    assert "etag" not in r.headers
@@ -0,0 +1,137 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from src.export import accepts_gzip, gzip_chunks, iter_export
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+def _csv(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _ndjson(text):
+    return [json.loads(line) for line in text.splitlines() if line]
+
+
+def test_export_books_csv(client):
+    r = client.get("/export/books", headers=IDENTITY)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert "content-encoding" not in r.headers
+    assert 'filename="books.csv"' in r.headers["content-disposition"]
+
+    rows = _csv(r.text)
+    streamed = _ndjson(client.get("/books", params={"stream": "true"}).text)
+    assert [int(x["id"]) for x in rows] == [b["id"] for b in streamed]
+    first = streamed[0]
+    assert rows[0] == {
+        "id": str(first["id"]),
+        "title": first["title"],
+        "author": first["author"],
+        "year": "" if first["year"] is None else str(first["year"]),
+    }
+
+
+def test_export_books_ndjson_matches_stream(client):
+    r = client.get("/export/books", params={"format": "ndjson"}, headers=IDENTITY)
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert _ndjson(r.text) == _ndjson(client.get("/books", params={"stream": "true"}).text)
+
+
+def test_export_stock_denormalized(client, seeded_ids):
+    r = client.get("/export/stock", params={"denormalized": "true"}, headers=IDENTITY)
+    rows = _csv(r.text)
+    assert list(rows[0]) == ["branch_id", "branch_name", "book_id", "book_title", "book_author", "copies"]
+
+    pair = [
+        x for x in rows
+        if int(x["branch_id"]) == seeded_ids["main_branch_id"] and int(x["book_id"]) == seeded_ids["book1_id"]
+    ]
+    assert len(pair) == 1
+    assert pair[0]["branch_name"] == "Главный филиал"
+    copies = client.get(
+        f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/copies"
+    ).json()["copies"]
+    assert int(pair[0]["copies"]) == copies
+
+    keys = [(int(x["branch_id"]), int(x["book_id"])) for x in rows]
+    assert keys == sorted(keys)
+
+
+def test_export_book_faculties(client, seeded_ids):
+    plain = _ndjson(client.get("/export/book-faculties", params={"format": "ndjson"}, headers=IDENTITY).text)
+    denorm = _ndjson(
+        client.get(
+            "/export/book-faculties", params={"format": "ndjson", "denormalized": "true"}, headers=IDENTITY
+        ).text
+    )
+    assert [(x["branch_id"], x["book_id"], x["faculty_id"]) for x in denorm] == [
+        (x["branch_id"], x["book_id"], x["faculty_id"]) for x in plain
+    ]
+    assert set(plain[0]) == {"branch_id", "book_id", "faculty_id"}
+
+    facs = client.get(
+        f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/faculties"
+    ).json()["faculties"]
+    exported = [
+        {"id": x["faculty_id"], "name": x["faculty_name"]}
+        for x in denorm
+        if x["branch_id"] == seeded_ids["main_branch_id"] and x["book_id"] == seeded_ids["book1_id"]
+    ]
+    assert exported == facs
+
+
+def test_export_gzip(client):
+    plain = client.get("/export/books", headers=IDENTITY).content
+
+    r = client.get("/export/books", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.content == plain  # httpx распаковывает сам
+
+    with client.stream("GET", "/export/books", headers={"Accept-Encoding": "gzip"}) as r:
+        raw = b"".join(r.iter_raw())
+    assert gzip.decompress(raw) == plain
+
+    # q=0 — запрет, подстрока в чужом токене — не gzip
+    for refused in ("gzip;q=0, identity", "x-gzipped, br"):
+        r = client.get("/export/books", headers={"Accept-Encoding": refused})
+        assert "content-encoding" not in r.headers and r.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("deflate, GZIP;q=0.5", True),
+    ("gzip; q=0", False),
+    ("gzip;q=0.000, *", False),
+    ("*;q=0.1", True),
+    ("br, *;q=0", False),
+    ("x-gzip", True),
+    ("gzip;q=abc", False),
+    ("gzipped", False),
+    ("", False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_export_validation(client):
+    assert client.get("/export/books", params={"format": "xml"}).status_code == 422
+    assert client.get("/export/loans").status_code == 422
+
+
+def test_gzip_chunks_roundtrip():
+    chunks = [b"a" * 100_000, b"", "привет\n".encode()]
+    assert gzip.decompress(b"".join(gzip_chunks(chunks))) == b"".join(chunks)
+
+
+def test_iter_export_chunks_are_bounded(client):
+    from src import export
+
+    chunks = list(iter_export("books", "csv"))
+    assert chunks
+    assert all(len(c) < export.EXPORT_CHUNK_SIZE + 1024 for c in chunks)
@@ -0,0 +1,99 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from src import queries
+from src.db import SessionLocal
+from src.pagination import NEXT_CURSOR_HEADER
+from src.repository import catalog_for
+
+MISSING = 2_000_000_000
+LINK_INDEXES = ("ix_book_faculties_faculty", "book_faculties_pkey")
+
+
+@pytest.fixture()
+def faculty_books(client, stocked):
+    """Новый факультет: книга A в двух филиалах (2 и 3 экз.), книга B — в одном."""
+    branch_a, book_a = stocked(2)
+    branch_b, book_b = stocked(4)
+    with SessionLocal() as db:
+        catalog = catalog_for(db)
+        faculty_id = catalog.create_faculty(f"Reverse Faculty {uuid.uuid4().hex[:8]}").id
+        catalog.set_copies(branch_b, book_a, 3)
+    links = [(branch_a, book_a), (branch_b, book_a), (branch_b, book_b)]
+    r = client.post(
+        "/book-faculties/batch",
+        json={"items": [{"branch_id": br, "book_id": bk, "faculty_id": faculty_id} for br, bk in links]},
+    )
+    assert r.json()["changed"] == 3
+    return faculty_id, (branch_a, book_a), (branch_b, book_b)
+
+
+def test_faculty_books_library_wide(client, faculty_books):
+    faculty_id, (branch_a, book_a), (branch_b, book_b) = faculty_books
+    r = client.get(f"/faculties/{faculty_id}/books")
+    assert r.status_code == 200, r.text
+    assert [(x["id"], x["copies"], x["branch_ids"]) for x in r.json()] == [
+        (book_a, 5, sorted([branch_a, branch_b])),
+        (book_b, 4, [branch_b]),
+    ]
+    assert r.json()[0]["title"].startswith("Stock Book")
+    assert NEXT_CURSOR_HEADER not in r.headers
+
+
+def test_faculty_books_per_branch(client, faculty_books):
+    faculty_id, (branch_a, book_a), (branch_b, book_b) = faculty_books
+    rows = client.get(f"/faculties/{faculty_id}/books", params={"branch_id": branch_b}).json()
+    assert [(x["id"], x["copies"], x["branch_ids"]) for x in rows] == [(book_a, 3, [branch_b]), (book_b, 4, [branch_b])]
+    rows = client.get(f"/faculties/{faculty_id}/books", params={"branch_id": branch_a}).json()
+    assert [(x["id"], x["copies"]) for x in rows] == [(book_a, 2)]
+
+
+def test_faculty_books_pagination(client, faculty_books):
+    faculty_id, (_, book_a), (branch_b, book_b) = faculty_books
+    for params in ({}, {"branch_id": branch_b}):
+        first = client.get(f"/faculties/{faculty_id}/books", params={**params, "limit": 1})
+        assert [x["id"] for x in first.json()] == [book_a]
+        assert first.headers[NEXT_CURSOR_HEADER] == str(book_a)
+        rest = client.get(
+            f"/faculties/{faculty_id}/books", params={**params, "limit": 1, "after_id": book_a}
+        )
+        assert [x["id"] for x in rest.json()] == [book_b]
+        assert NEXT_CURSOR_HEADER not in rest.headers
+
+
+def test_faculty_books_not_found(client, seeded_ids):
+    assert client.get(f"/faculties/{MISSING}/books").status_code == 404
+    r = client.get(f"/faculties/{seeded_ids['fac_it_id']}/books", params={"branch_id": MISSING})
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Филиал не найден"
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.mark.parametrize("branch", [False, True])
+def test_faculty_books_use_reverse_index(client, seeded_ids, branch):
+    branch_id = seeded_ids["main_branch_id"] if branch else None
+    stmt = queries.faculty_books_page(seeded_ids["fac_it_id"], branch_id, 0, 100)
+    sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    with SessionLocal() as db:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = db.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(_plan_nodes(plan[0]["Plan"]))
+    assert not [n for n in nodes if n["Node Type"] == "Seq Scan"]
+    # Index Scan / Index Only Scan / Bitmap Index Scan — по какому индексу book_faculties
+    links = [n for n in nodes if n.get("Index Name") in LINK_INDEXES]
+    assert links and all("faculty_id" in n["Index Cond"] for n in links)
+    if not branch:
+        # без филиала обслужить faculty_id может только обратный индекс;
+        # в филиале планировщик волен взять и PK (branch_id, book_id, faculty_id)
+        assert {n["Index Name"] for n in links} == {"ix_book_faculties_faculty"}
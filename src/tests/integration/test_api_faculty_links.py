@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.schemas import MAX_BATCH_SIZE
+
+MISSING = 2_000_000_000
+
+
+def _faculty_ids(client, branch_id, book_id):
+    return [f["id"] for f in client.get(f"/branches/{branch_id}/books/{book_id}/faculties").json()["faculties"]]
+
+
+def test_bulk_add_reports_per_item(client, stocked, seeded_ids):
+    branch_id, book_id = stocked(1)
+    fac_it, fac_math = seeded_ids["fac_it_id"], seeded_ids["fac_math_id"]
+    # прогреваем ops-кэш: после записи он должен сброситься
+    assert _faculty_ids(client, branch_id, book_id) == []
+
+    items = [
+        {"branch_id": branch_id, "book_id": book_id, "faculty_id": fac_it},
+        {"branch_id": branch_id, "book_id": book_id, "faculty_id": fac_it},
+        {"branch_id": branch_id, "book_id": book_id, "faculty_id": fac_math},
+        {"branch_id": MISSING, "book_id": book_id, "faculty_id": fac_it},
+        {"branch_id": branch_id, "book_id": MISSING, "faculty_id": fac_it},
+        {"branch_id": branch_id, "book_id": book_id, "faculty_id": MISSING},
+    ]
+    r = client.post("/book-faculties/batch", json={"items": items})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [(x["status"], x["error"]) for x in body["items"]] == [
+        ("added", None),
+        ("exists", None),
+        ("added", None),
+        ("error", "Филиал не найден"),
+        ("error", "Книга не найдена"),
+        ("error", "Факультет не найден"),
+    ]
+    assert [x["faculty_id"] for x in body["items"]] == [i["faculty_id"] for i in items]
+    assert body["changed"] == 2
+    assert sorted(_faculty_ids(client, branch_id, book_id)) == sorted([fac_it, fac_math])
+
+    again = client.post("/book-faculties/batch", json={"items": items[:3]}).json()
+    assert [x["status"] for x in again["items"]] == ["exists"] * 3
+    assert again["changed"] == 0
+
+
+def test_bulk_remove(client, stocked, seeded_ids):
+    branch_id, book_id = stocked(1)
+    fac_it, fac_math = seeded_ids["fac_it_id"], seeded_ids["fac_math_id"]
+    link = {"branch_id": branch_id, "book_id": book_id, "faculty_id": fac_it}
+    client.post("/book-faculties/batch", json={"items": [link, {**link, "faculty_id": fac_math}]})
+    assert len(_faculty_ids(client, branch_id, book_id)) == 2
+
+    r = client.post(
+        "/book-faculties/batch/delete",
+        json={"items": [link, link, {**link, "book_id": MISSING}, {**link, "branch_id": MISSING}]},
+    )
+    assert r.status_code == 200, r.text
+    assert [x["status"] for x in r.json()["items"]] == ["removed", "absent", "error", "error"]
+    assert r.json()["changed"] == 1
+    assert _faculty_ids(client, branch_id, book_id) == [fac_math]
+
+
+def test_bulk_add_is_one_statement(client, stocked, seeded_ids, statements):
+    branch_id, book_id = stocked(1)
+    items = [
+        {"branch_id": branch_id, "book_id": book_id, "faculty_id": f}
+        for f in (seeded_ids["fac_it_id"], seeded_ids["fac_math_id"])
+    ]
+    statements.clear()
+    assert client.post("/book-faculties/batch", json={"items": items}).json()["changed"] == 2
+    touching = [s for s in statements if "book_faculties" in s]
+    assert len(touching) == 1
+    assert touching[0].lstrip().upper().startswith("WITH")
+    # сама вставка + отметка версии для ETag
+    assert len(statements) <= 3
+
+
+def test_bulk_empty_and_size_limit(client):
+    assert client.post("/book-faculties/batch", json={"items": []}).json() == {"items": [], "changed": 0}
+    item = {"branch_id": 1, "book_id": 1, "faculty_id": 1}
+    r = client.post("/book-faculties/batch", json={"items": [item] * (MAX_BATCH_SIZE + 1)})
+    assert r.status_code == 422
+
+
+def test_concurrent_single_adds_do_not_conflict(client, stocked, seeded_ids):
+    # раньше два одновременных запроса проходили SELECT и падали на PK с 500
+    branch_id, book_id = stocked(1)
+    path = f"/branches/{branch_id}/books/{book_id}/faculties/{seeded_ids['fac_it_id']}"
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        responses = list(pool.map(lambda _: client.post(path), range(20)))
+
+    assert [r.status_code for r in responses] == [200] * 20
+    assert all(r.json()["faculty_count"] == 1 for r in responses)
+
+
+def test_single_add_404(client, stocked, seeded_ids):
+    branch_id, book_id = stocked(1)
+    r = client.post(f"/branches/{branch_id}/books/{book_id}/faculties/{MISSING}")
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Факультет не найден"
+    r = client.post(f"/branches/{MISSING}/books/{book_id}/faculties/{seeded_ids['fac_it_id']}")
+    assert r.json()["detail"] == "Филиал не найден"
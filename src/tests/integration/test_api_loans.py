@@ -0,0 +1,98 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from src.db import SessionLocal
+from src.models import BranchStock as BranchStockORM, Loan as LoanORM
+
+
+def _stock(branch_id, book_id):
+    with SessionLocal() as db:
+        return db.scalar(
+            select(BranchStockORM.copies).where(
+                BranchStockORM.branch_id == branch_id, BranchStockORM.book_id == book_id
+            )
+        )
+
+
+def test_checkout_and_checkin(client, stocked):
+    branch_id, book_id = stocked(1)
+    copies_path = f"/branches/{branch_id}/books/{book_id}/copies"
+    assert client.get(copies_path).json()["copies"] == 1
+
+    r = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "s-1"})
+    assert r.status_code == 201, r.text
+    loan = r.json()
+    assert (loan["branch_id"], loan["book_id"], loan["student_id"]) == (branch_id, book_id, "s-1")
+    assert loan["returned_at"] is None
+    assert client.get(copies_path).json()["copies"] == 0
+
+    r = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "s-2"})
+    assert r.status_code == 409
+    assert r.json()["detail"] == "Нет свободных экземпляров"
+
+    r = client.post(f"/loans/{loan['id']}/checkin")
+    assert r.status_code == 200
+    assert r.json()["returned_at"] is not None
+    assert client.get(copies_path).json()["copies"] == 1
+    assert client.get(f"/loans/{loan['id']}").json() == r.json()
+
+    r = client.post(f"/loans/{loan['id']}/checkin")
+    assert r.status_code == 409
+    assert r.json()["detail"] == "Книга уже возвращена"
+    assert _stock(branch_id, book_id) == 1
+
+
+def test_checkout_errors(client, seeded_ids):
+    book_id = seeded_ids["book1_id"]
+    r = client.post(f"/branches/999999/books/{book_id}/checkout", json={"student_id": "s"})
+    assert (r.status_code, r.json()["detail"]) == (404, "Филиал не найден")
+
+    r = client.post(f"/branches/{seeded_ids['main_branch_id']}/books/999999/checkout", json={"student_id": "s"})
+    assert (r.status_code, r.json()["detail"]) == (404, "Книга не найдена")
+
+    # пары нет в branch_stock — экземпляров тоже нет
+    r = client.post(
+        f"/branches/{seeded_ids['it_branch_id']}/books/{seeded_ids['book2_id']}/checkout", json={"student_id": "s"}
+    )
+    assert r.status_code == 409
+
+    r = client.post(f"/branches/{seeded_ids['main_branch_id']}/books/{book_id}/checkout", json={"student_id": ""})
+    assert r.status_code == 422
+
+    assert client.post("/loans/999999/checkin").status_code == 404
+    assert client.get("/loans/999999").status_code == 404
+
+
+def test_concurrent_checkouts_never_oversell(client, stocked):
+    copies, attempts = 25, 300
+    branch_id, book_id = stocked(copies)
+    path = f"/branches/{branch_id}/books/{book_id}/checkout"
+
+    def checkout(i):
+        return client.post(path, json={"student_id": f"stress-{i}"}).status_code
+
+    with ThreadPoolExecutor(max_workers=100) as pool:
+        statuses = Counter(pool.map(checkout, range(attempts), timeout=120))
+
+    assert statuses == {201: copies, 409: attempts - copies}
+    assert _stock(branch_id, book_id) == 0
+    with SessionLocal() as db:
+        loans = db.scalar(
+            select(func.count()).select_from(LoanORM).where(LoanORM.branch_id == branch_id, LoanORM.book_id == book_id)
+        )
+    assert loans == copies
+
+
+def test_concurrent_checkin_returns_copy_once(client, stocked):
+    branch_id, book_id = stocked(1)
+    loan_id = client.post(
+        f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "s"}
+    ).json()["id"]
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        statuses = Counter(pool.map(lambda _: client.post(f"/loans/{loan_id}/checkin").status_code, range(20)))
+
+    assert statuses == {200: 1, 409: 19}
+    assert _stock(branch_id, book_id) == 1
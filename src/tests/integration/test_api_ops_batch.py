@@ -0,0 +1,134 @@
+import pytest
+
+from src import repository
+
+
+def test_copies_batch_matches_single_lookups(client, seeded_ids):
+    pairs = [
+        (seeded_ids["main_branch_id"], seeded_ids["book1_id"]),
+        (seeded_ids["main_branch_id"], seeded_ids["book2_id"]),
+        (seeded_ids["it_branch_id"], seeded_ids["book1_id"]),
+        (seeded_ids["it_branch_id"], seeded_ids["book2_id"]),
+    ]
+    r = client.post("/copies/batch", json={"items": [{"branch_id": b, "book_id": k} for b, k in pairs]})
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    assert [(x["branch_id"], x["book_id"]) for x in items] == pairs
+
+    for (branch_id, book_id), item in zip(pairs, items):
+        single = client.get(f"/branches/{branch_id}/books/{book_id}/copies").json()
+        assert item["copies"] == single["copies"]
+        assert item["error"] is None
+
+
+def test_copies_batch_reports_unknown_per_item(client, seeded_ids):
+    r = client.post(
+        "/copies/batch",
+        json={
+            "items": [
+                {"branch_id": 999999, "book_id": seeded_ids["book1_id"]},
+                {"branch_id": seeded_ids["main_branch_id"], "book_id": 999999},
+                {"branch_id": seeded_ids["main_branch_id"], "book_id": seeded_ids["book1_id"]},
+            ]
+        },
+    )
+    assert r.status_code == 200, r.text
+    items = r.json()["items"]
+    assert items[0]["error"] == "Филиал не найден"
+    assert items[0]["copies"] is None
+    assert items[1]["error"] == "Книга не найдена"
+    assert items[2]["error"] is None
+    assert items[2]["copies"] == 5
+
+
+def test_copies_batch_keeps_duplicates_and_order(client, seeded_ids):
+    pair = {"branch_id": seeded_ids["main_branch_id"], "book_id": seeded_ids["book1_id"]}
+    r = client.post("/copies/batch", json={"items": [pair, pair]})
+    assert r.status_code == 200
+    assert len(r.json()["items"]) == 2
+
+
+def test_copies_batch_empty(client):
+    r = client.post("/copies/batch", json={"items": []})
+    assert r.status_code == 200
+    assert r.json() == {"items": []}
+
+
+def test_copies_batch_size_limit(client):
+    items = [{"branch_id": 1, "book_id": 1}] * 1001
+    assert client.post("/copies/batch", json={"items": items}).status_code == 422
+
+
+@pytest.mark.skipif(repository.CATALOG_BACKEND == "memory", reason="каталог в памяти: чтения не ходят в БД")
+def test_copies_batch_is_one_query(client, seeded_ids, statements):
+    items = [{"branch_id": seeded_ids["main_branch_id"], "book_id": seeded_ids["book1_id"]}] * 500
+    r = client.post("/copies/batch", json={"items": items})
+    assert r.status_code == 200
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+
+def test_branch_book_faculties_match_single_lookups(client, seeded_ids):
+    branch_id = seeded_ids["main_branch_id"]
+    r = client.get(f"/branches/{branch_id}/books/faculties")
+    assert r.status_code == 200, r.text
+    items = r.json()
+
+    book_ids = [x["book_id"] for x in items]
+    assert seeded_ids["book1_id"] in book_ids
+    assert seeded_ids["book2_id"] in book_ids
+    assert book_ids == sorted(book_ids)
+
+    for item in items:
+        single = client.get(f"/branches/{branch_id}/books/{item['book_id']}/faculties").json()
+        assert item == single
+
+
+def test_branch_book_faculties_pagination(client, seeded_ids):
+    branch_id = seeded_ids["main_branch_id"]
+    full = client.get(f"/branches/{branch_id}/books/faculties").json()
+
+    r = client.get(f"/branches/{branch_id}/books/faculties", params={"limit": 1})
+    assert r.status_code == 200
+    assert r.json() == full[:1]
+    cursor = r.headers["X-Next-Cursor"]
+
+    r2 = client.get(f"/branches/{branch_id}/books/faculties", params={"after_id": cursor, "limit": 1})
+    assert r2.json() == full[1:2]
+
+
+def test_branch_book_faculties_branch_404(client):
+    r = client.get("/branches/999999/books/faculties")
+    assert r.status_code == 404
+    assert r.json()["detail"] == "Филиал не найден"
+
+
+def test_book_faculties_batch(client, seeded_ids):
+    branch_id = seeded_ids["main_branch_id"]
+    r = client.post(
+        f"/branches/{branch_id}/books/faculties/batch",
+        json={"book_ids": [seeded_ids["book2_id"], seeded_ids["book1_id"], 999999]},
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["missing_book_ids"] == [999999]
+
+    by_book = {x["book_id"]: x for x in body["items"]}
+    assert by_book[seeded_ids["book1_id"]]["faculty_count"] == 2
+    assert by_book[seeded_ids["book2_id"]]["faculty_count"] == 1
+    assert [f["name"] for f in by_book[seeded_ids["book2_id"]]["faculties"]] == ["Математический факультет"]
+
+
+def test_book_faculties_batch_book_without_links(client, seeded_ids):
+    r = client.post(
+        f"/branches/{seeded_ids['it_branch_id']}/books/faculties/batch",
+        json={"book_ids": [seeded_ids["book2_id"]]},
+    )
+    assert r.status_code == 200
+    item = r.json()["items"][0]
+    assert item["faculty_count"] == 0
+    assert item["faculties"] == []
+
+
+def test_book_faculties_batch_branch_404(client, seeded_ids):
+    r = client.post("/branches/999999/books/faculties/batch", json={"book_ids": [seeded_ids["book1_id"]]})
+    assert r.status_code == 404
@@ -0,0 +1,64 @@
+import pytest
+
+from src.cache import ops_cache
+
+
+@pytest.fixture()
+def fresh_pair(client):
+    branch = client.post("/branches", json={"name": "Cache Branch", "address": "Cache st."}).json()
+    book = client.post("/books", json={"title": "Cache Book", "author": "Cacher", "year": 2010}).json()
+    return branch["id"], book["id"]
+
+
+def test_repeated_reads_hit_cache(client, fresh_pair):
+    branch_id, book_id = fresh_pair
+    path = f"/branches/{branch_id}/books/{book_id}/copies"
+
+    first = client.get(path).json()
+    hits = ops_cache.hits
+    assert client.get(path).json() == first
+    assert ops_cache.hits == hits + 1
+
+
+def test_add_book_faculty_invalidates_pair(client, fresh_pair, seeded_ids):
+    branch_id, book_id = fresh_pair
+    path = f"/branches/{branch_id}/books/{book_id}/faculties"
+    assert client.get(path).json()["faculty_count"] == 0
+    assert client.get(path).json()["faculty_count"] == 0  # из кэша
+
+    r = client.post(f"{path}/{seeded_ids['fac_it_id']}")
+    assert r.status_code == 200
+    assert r.json()["faculty_count"] == 1
+    assert client.get(path).json()["faculty_count"] == 1
+
+
+def test_update_book_and_branch_invalidate_only_their_keys(client, fresh_pair, seeded_ids):
+    branch_id, book_id = fresh_pair
+    other = f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/copies"
+    mine = f"/branches/{branch_id}/books/{book_id}/copies"
+    client.get(other)
+    client.get(mine)
+
+    r = client.put(f"/books/{book_id}", json={"title": "Cache Book 2", "author": "Cacher", "year": 2011})
+    assert r.status_code == 200
+    assert ("copies", branch_id, book_id) not in ops_cache._data
+    assert ("copies", seeded_ids["main_branch_id"], seeded_ids["book1_id"]) in ops_cache._data
+
+    client.get(mine)
+    r = client.put(f"/branches/{branch_id}", json={"name": "Cache Branch 2", "address": None})
+    assert r.status_code == 200
+    assert ("copies", branch_id, book_id) not in ops_cache._data
+
+
+def test_not_found_is_not_cached(client, seeded_ids):
+    path = f"/branches/999999/books/{seeded_ids['book1_id']}/copies"
+    assert client.get(path).status_code == 404
+    assert ("copies", 999999, seeded_ids["book1_id"]) not in ops_cache._data
+
+
+def test_cache_stats_endpoint(client):
+    r = client.get("/cache/stats")
+    assert r.status_code == 200
+    body = r.json()
+    for field in ("hits", "misses", "evictions", "size", "maxsize"):
+        assert field in body
@@ -0,0 +1,97 @@
+import json
+
+from src import pagination
+
+
+def _walk_pages(client, endpoint, limit):
+    ids = []
+    after_id = None
+    for _ in range(1000):
+        params = {"limit": limit}
+        if after_id is not None:
+            params["after_id"] = after_id
+        r = client.get(endpoint, params=params)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        assert len(page) <= limit
+        ids.extend(x["id"] for x in page)
+
+        after_id = r.headers.get("X-Next-Cursor")
+        if after_id is None:
+            return ids
+        assert int(after_id) == page[-1]["id"]
+    raise AssertionError("pagination did not terminate")
+
+
+def test_books_pages_cover_full_list(client):
+    for i in range(3):
+        r = client.post("/books", json={"title": f"Page Book {i}", "author": "Pager", "year": 2000 + i})
+        assert r.status_code == 201
+
+    full = [b["id"] for b in client.get("/books", params={"limit": 5000}).json()]
+    assert _walk_pages(client, "/books", limit=2) == full
+    assert full == sorted(full)
+
+
+def test_branches_and_faculties_pages(client):
+    for endpoint in ("/branches", "/faculties"):
+        full = [x["id"] for x in client.get(endpoint).json()]
+        assert _walk_pages(client, endpoint, limit=1) == full
+
+
+def test_list_without_paging_params_is_complete(client, monkeypatch):
+    monkeypatch.setattr(pagination, "DEFAULT_PAGE_LIMIT", 1)
+    for endpoint in ("/books", "/branches", "/faculties"):
+        r = client.get(endpoint)
+        assert r.status_code == 200
+        assert "X-Next-Cursor" not in r.headers
+        assert [x["id"] for x in r.json()] == _walk_pages(client, endpoint, limit=5000)
+
+        # after_id без limit — страница по умолчанию
+        r = client.get(endpoint, params={"after_id": 0})
+        assert len(r.json()) == 1
+        assert "X-Next-Cursor" in r.headers
+
+
+def _first_book_id(client):
+    r = client.get("/books", params={"limit": 1})
+    assert r.status_code == 200
+    return r.json()[0]["id"]
+
+
+def test_after_id_skips_earlier_rows(client):
+    first_id = _first_book_id(client)
+    r = client.get("/books", params={"after_id": first_id})
+    assert r.status_code == 200
+    assert all(b["id"] > first_id for b in r.json())
+
+
+def test_last_page_has_no_cursor(client):
+    r = client.get("/faculties", params={"limit": 5000})
+    assert r.status_code == 200
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_limit_is_validated(client):
+    assert client.get("/books", params={"limit": 0}).status_code == 422
+    assert client.get("/books", params={"limit": 10**6}).status_code == 422
+
+
+def test_books_ndjson_stream_matches_list(client):
+    r = client.get("/books", params={"stream": "true"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    streamed = [json.loads(line) for line in r.text.splitlines() if line]
+    assert [b["id"] for b in streamed] == _walk_pages(client, "/books", limit=5000)
+
+    first_page = client.get("/books", params={"limit": 100}).json()
+    assert streamed[: len(first_page)] == first_page
+
+
+def test_stream_respects_after_id_and_limit(client):
+    first_id = _first_book_id(client)
+    r = client.get("/books", params={"stream": "true", "after_id": first_id, "limit": 1})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert len(lines) <= 1
+    assert all(b["id"] > first_id for b in lines)
@@ -0,0 +1,87 @@
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from src import search
+from src.db import SessionLocal
+
+
+@pytest.fixture()
+def word():
+    """Уникальное «слово» для теста: латиница без цифр, чтобы стеммер не трогал."""
+    return "zq" + "".join(chr(ord("a") + int(c, 16) % 26) for c in uuid.uuid4().hex[:10])
+
+
+def _search(client, **params):
+    r = client.get("/books/search", params=params)
+    assert r.status_code == 200, r.text
+    return r
+
+
+def test_search_finds_seeded_book_by_stemmed_title_and_author(client, seeded_ids):
+    # «анализы» -> «анализ»; слова без заглавных: в БД с локалью C кириллица не приводится к нижнему регистру
+    hits = _search(client, q="анализы").json()
+    assert seeded_ids["book1_id"] in [x["id"] for x in hits]
+
+    hits = _search(client, q="Кормен").json()
+    assert seeded_ids["book1_id"] in [x["id"] for x in hits]
+
+
+def test_title_match_ranks_above_author_match(client, word):
+    by_author = client.post("/books", json={"title": "Something else", "author": word}).json()["id"]
+    by_title = client.post("/books", json={"title": f"{word} handbook", "author": "Someone"}).json()["id"]
+
+    hits = _search(client, q=word).json()
+    assert [x["id"] for x in hits] == [by_title, by_author]
+    assert hits[0]["score"] > hits[1]["score"]
+    assert set(hits[0]) == {"id", "title", "author", "year", "score"}
+
+
+def test_search_pagination_by_cursor(client, word):
+    ids = {client.post("/books", json={"title": f"{word} vol {i}", "author": "Pager"}).json()["id"] for i in range(7)}
+
+    full = [x["id"] for x in _search(client, q=word, limit=100).json()]
+    assert set(full) == ids
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": word, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        r = _search(client, **params)
+        seen.extend(x["id"] for x in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == full
+
+
+def test_search_validation(client):
+    assert client.get("/books/search").status_code == 422
+    assert client.get("/books/search", params={"q": ""}).status_code == 422
+    assert client.get("/books/search", params={"q": "x", "cursor": "bad"}).status_code == 422
+    assert client.get("/books/search", params={"q": "x" * 201}).status_code == 422
+
+
+def test_search_without_matches(client, word):
+    assert _search(client, q=word).json() == []
+    # одни стоп-слова: пустой tsquery не должен ронять запрос
+    assert _search(client, q="и в на").status_code == 200
+
+
+def test_fts_index_is_used(client):
+    with SessionLocal() as db:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = db.execute(
+            text("EXPLAIN " + search.search_query(fuzzy=False, paged=False).text),
+            search.search_params("анализ", 10, None),
+        ).scalars().all()
+    assert "ix_books_search_fts" in "\n".join(plan)
+
+
+@pytest.mark.skipif(not search.trigram_enabled, reason="pg_trgm недоступно")
+def test_fuzzy_search_tolerates_typos(client, word):
+    book_id = client.post("/books", json={"title": f"{word} chronicles", "author": "Typo"}).json()["id"]
+    typo = word[:-1] + ("a" if word[-1] != "a" else "b")
+    assert book_id in [x["id"] for x in _search(client, q=typo).json()]
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src import repository
+from src.cache import ops_aflight, ops_flight
+
+
+def _coalesced() -> int:
+    return ops_flight.coalesced + ops_aflight.coalesced
+
+
+@pytest.mark.skipif(repository.CATALOG_BACKEND == "memory", reason="каталог в памяти: чтения не ходят в БД")
+def test_identical_concurrent_reads_hit_db_once(client, stocked):
+    branch_id, book_id = stocked(3)
+    path = f"/branches/{branch_id}/books/{book_id}/copies"
+    queries = []
+
+    # запрос copies тормозим, чтобы одновременные запросы гарантированно пересеклись
+    def slow(conn, cursor, statement, parameters, context, executemany):
+        if "branch_stock" in statement and "copies" in statement:
+            queries.append(statement)
+            time.sleep(0.3)
+
+    before = _coalesced()
+    event.listen(Engine, "before_cursor_execute", slow)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            responses = list(pool.map(lambda _: client.get(path), range(8)))
+    finally:
+        event.remove(Engine, "before_cursor_execute", slow)
+
+    assert [r.json()["copies"] for r in responses] == [3] * 8
+    assert len(queries) == 1
+    assert _coalesced() - before == 7
+
+    stats = client.get("/cache/stats").json()["singleflight"]
+    assert stats["coalesced"] >= 7
+    assert "ops_singleflight_requests_total" in client.get("/metrics").text
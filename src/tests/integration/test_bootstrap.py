@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import delete, func, select, update
+
+from src import main, repository
+from src.bootstrap import ensure_schema, schema_fingerprint
+from src.db import SessionLocal, engine
+from src.models import Book as BookORM, BranchStock as BranchStockORM
+
+
+def _seed():
+    db = SessionLocal()
+    try:
+        main.seed_data(db)
+    finally:
+        db.close()
+
+
+def _count_titles(title):
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(BookORM).where(BookORM.title == title))
+
+
+def test_ensure_schema_skips_when_version_matches(client, statements):
+    assert ensure_schema(engine) is False
+    assert not any(s.lstrip().upper().startswith("CREATE") for s in statements)
+
+
+def test_ensure_schema_reapplies_when_ddl_changes(client):
+    assert schema_fingerprint(extra_ddl=["SELECT 1"]) != schema_fingerprint()
+    try:
+        assert ensure_schema(engine, extra_ddl=["SELECT 1"]) is True
+        assert ensure_schema(engine, extra_ddl=["SELECT 1"]) is False
+    finally:
+        assert ensure_schema(engine) is True
+
+
+def test_startup_uses_constant_number_of_statements(client, statements):
+    main.on_startup()
+    # CATALOG_BACKEND=memory: ещё снимок каталога — по запросу на каждую из пяти таблиц
+    assert len(statements) <= (15 if repository.CATALOG_BACKEND == "memory" else 10)
+
+
+def _main_book1_copies(db, main_book1):
+    return db.scalar(select(BranchStockORM.copies).where(*main_book1))
+
+
+def test_seed_restores_books_but_keeps_stock(client, seeded_ids):
+    main_book1 = (
+        BranchStockORM.branch_id == seeded_ids["main_branch_id"],
+        BranchStockORM.book_id == seeded_ids["book1_id"],
+    )
+    with SessionLocal() as db:
+        db.execute(update(BranchStockORM).where(*main_book1).values(copies=999))
+        db.execute(update(BookORM).where(BookORM.id == seeded_ids["book2_id"]).values(year=1900))
+        db.commit()
+    try:
+        _seed()
+
+        assert client.get(f"/books/{seeded_ids['book2_id']}").json()["year"] == 2020
+        # фонд меняют выдачи и возвраты — перезапуск его не сбрасывает
+        with SessionLocal() as db:
+            assert _main_book1_copies(db, main_book1) == 999
+
+        # а недостающую строку фонда досеивает
+        with SessionLocal() as db:
+            db.execute(delete(BranchStockORM).where(*main_book1))
+            db.commit()
+        _seed()
+        with SessionLocal() as db:
+            assert _main_book1_copies(db, main_book1) == 5
+    finally:
+        with SessionLocal() as db:
+            db.execute(update(BranchStockORM).where(*main_book1).values(copies=5))
+            db.commit()
+
+
+def test_concurrent_startup_does_not_duplicate_seed(client):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: (ensure_schema(engine), _seed()), range(8)))
+
+    assert _count_titles("Введение в машинное обучение") == 1
+    assert _count_titles("CI Book Two") == 1
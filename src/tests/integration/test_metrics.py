@@ -0,0 +1,84 @@
+import copy
+import re
+
+import pytest
+from sqlalchemy import text as sql
+from sqlalchemy.exc import DBAPIError
+
+from src import metrics
+from src.db import engine
+
+
+def _samples(text: str, name: str) -> dict[str, float]:
+    """Строки метрики name: «{labels}» -> значение."""
+    result = {}
+    for line in text.splitlines():
+        m = re.match(rf"^{name}(\{{.*\}})? (\S+)$", line)
+        if m:
+            result[m[1] or ""] = float(m[2])
+    return result
+
+
+def test_metrics_exposition(client, seeded_ids):
+    client.get(f"/books/{seeded_ids['book1_id']}")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for name in (
+        "http_requests_total",
+        "http_request_duration_seconds",
+        "http_request_db_statements",
+        "http_request_db_seconds",
+        "db_statement_duration_seconds",
+        "db_pool_checkout_wait_seconds",
+        "db_pool_connections",
+    ):
+        assert f"# TYPE {name} " in r.text
+    # маршрут — шаблон пути, а не конкретный URL
+    assert 'route="/books/{book_id}"' in r.text
+    assert f'route="/books/{seeded_ids["book1_id"]}"' not in r.text
+
+
+def test_request_statements_and_latency(client, seeded_ids, statements):
+    labels = ("GET", "/branches/{branch_id}/books/{book_id}/copies")
+    before_count = metrics.HTTP_LATENCY.count(*labels)
+    before_statements = metrics.DB_STATEMENTS.sum(*labels)
+
+    statements.clear()
+    r = client.get(f"/branches/{seeded_ids['main_branch_id']}/books/{seeded_ids['book1_id']}/copies")
+    assert r.status_code == 200
+
+    assert metrics.HTTP_LATENCY.count(*labels) == before_count + 1
+    assert metrics.DB_STATEMENTS.sum(*labels) - before_statements == len(statements)
+    assert metrics.HTTP_REQUESTS.value(*labels, "200") >= 1
+
+
+def test_failed_statement_leaves_no_timing_behind(client):
+    with engine.connect() as conn:
+        info = copy.deepcopy(conn.info)
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                conn.execute(sql("SELECT 1 / 0"))
+            conn.rollback()
+        before = metrics.DB_STATEMENT_LATENCY.count()
+        conn.execute(sql("SELECT 1"))
+        assert metrics.DB_STATEMENT_LATENCY.count() == before + 1
+        assert conn.info == info
+
+
+def test_status_and_unmatched_route(client):
+    client.get("/books/999999")
+    client.get("/no/such/path")
+    text = client.get("/metrics").text
+    requests = _samples(text, "http_requests_total")
+    assert requests['{method="GET",route="/books/{book_id}",status="404"}'] >= 1
+    assert requests['{method="GET",route="unmatched",status="404"}'] >= 1
+
+
+def test_histogram_buckets_are_cumulative(client):
+    client.get("/health")
+    buckets = _samples(client.get("/metrics").text, "http_request_duration_seconds_bucket")
+    health = [v for k, v in buckets.items() if 'route="/health"' in k]
+    assert health == sorted(health)
+    total = _samples(client.get("/metrics").text, "http_request_duration_seconds_count")
+    assert health[-1] <= total['{method="GET",route="/health"}']
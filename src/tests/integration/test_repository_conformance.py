@@ -0,0 +1,245 @@
+"""
+Общие тесты CatalogRepository: оба бэкенда должны вести себя одинаково.
+Оба пишут в общую тестовую БД, поэтому тесты заводят свои сущности
+и проверяют только их.
+"""
+import json
+import os
+import subprocess  # nosec B404 - прогон набора тестов с CATALOG_BACKEND=memory
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from src import repository
+from src.db import SessionLocal, get_db_mode
+from src.memory_catalog import MemoryCatalog
+from src.models import Book as BookORM
+from src.repository import SqlCatalog, WriteThroughCatalog
+from src.schemas import Book, BookBase, BookFacultyLink, BranchBase, BranchBookPair, FacultyBook
+from src.serialization import rows_to_dicts
+
+MISSING = 2_000_000_000
+
+
+@pytest.fixture(params=["memory", "sql"])
+def catalog(request):
+    db = SessionLocal()
+    try:
+        # в память попадает только то, что записано через этот каталог, — тестам этого хватает
+        yield WriteThroughCatalog(db, MemoryCatalog()) if request.param == "memory" else SqlCatalog(db)
+    finally:
+        db.close()
+
+
+@pytest.fixture()
+def tag():
+    return uuid.uuid4().hex[:8]
+
+
+@pytest.fixture()
+def linked(catalog, tag):
+    """Два филиала, две книги, два факультета; книга A — в обоих филиалах."""
+    br1 = catalog.create_branch(BranchBase(name=f"Repo Branch 1 {tag}")).id
+    br2 = catalog.create_branch(BranchBase(name=f"Repo Branch 2 {tag}")).id
+    book_a = catalog.create_book(BookBase(title=f"Repo Book A {tag}", author="Repo")).id
+    book_b = catalog.create_book(BookBase(title=f"Repo Book B {tag}", author="Repo", year=2001)).id
+    fac1 = catalog.create_faculty(f"Repo Faculty 1 {tag}").id
+    fac2 = catalog.create_faculty(f"Repo Faculty 2 {tag}").id
+    catalog.set_copies(br1, book_a, 2)
+    catalog.set_copies(br2, book_a, 3)
+    catalog.set_copies(br2, book_b, 1)
+    catalog.add_faculty_links([
+        BookFacultyLink(branch_id=br1, book_id=book_a, faculty_id=fac1),
+        BookFacultyLink(branch_id=br2, book_id=book_a, faculty_id=fac1),
+        BookFacultyLink(branch_id=br2, book_id=book_b, faculty_id=fac1),
+        BookFacultyLink(branch_id=br2, book_id=book_b, faculty_id=fac2),
+    ])
+    return {"br1": br1, "br2": br2, "book_a": book_a, "book_b": book_b, "fac1": fac1, "fac2": fac2}
+
+
+def test_books_crud_and_pages(catalog, tag):
+    first = catalog.create_book(BookBase(title=f"Repo {tag} 1", author="A", year=1999))
+    second = catalog.create_book(BookBase(title=f"Repo {tag} 2", author="B"))
+    assert second.id > first.id
+    assert catalog.get_book(first.id) == first
+    assert catalog.get_book(MISSING) is None
+
+    page = catalog.books_page(first.id - 1, 1)
+    assert len(page) == 2
+    assert rows_to_dicts(page, Book) == [first.model_dump(), second.model_dump()]
+    assert [r.id for r in catalog.books_page(second.id, 10)] == []
+
+    updated = catalog.update_book(first.id, BookBase(title=f"Repo {tag} 1'", author="A"))
+    assert updated.title == f"Repo {tag} 1'" and updated.year is None
+    assert catalog.get_book(first.id) == updated
+    assert catalog.update_book(MISSING, BookBase(title="x", author="y")) is None
+
+
+def test_branches_and_faculties(catalog, tag):
+    branch = catalog.create_branch(BranchBase(name=f"Repo {tag}", address="Street"))
+    assert catalog.get_branch(branch.id) == branch
+    assert catalog.update_branch(branch.id, BranchBase(name=f"Repo {tag}'")).address is None
+    assert catalog.update_branch(MISSING, BranchBase(name="x")) is None
+    assert [r.id for r in catalog.branches_page(branch.id - 1, 5)] == [branch.id]
+
+    faculty = catalog.create_faculty(f"Repo {tag}")
+    assert catalog.get_faculty(faculty.id) == faculty
+    assert catalog.get_faculty(MISSING) is None
+    assert [r.name for r in catalog.faculties_page(faculty.id - 1, 5)] == [faculty.name]
+
+
+def test_stream(catalog, tag):
+    ids = [catalog.create_book(BookBase(title=f"Repo {tag} {i}", author="S")).id for i in range(3)]
+    lines = b"".join(catalog.stream("books", ids[0] - 1, 2)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": i, "title": f"Repo {tag} {n}", "author": "S", "year": None} for n, i in enumerate(ids[:2])
+    ]
+    rest = b"".join(catalog.stream("books", ids[0], None)).decode().splitlines()
+    assert [json.loads(line)["id"] for line in rest] == ids[1:]
+
+
+def test_copies(catalog, linked):
+    br1, br2, book_a, book_b = linked["br1"], linked["br2"], linked["book_a"], linked["book_b"]
+    assert catalog.copies(br1, book_a) == 2
+    assert catalog.copies(br1, book_b) == 0
+    catalog.set_copies(br1, book_a, 7)
+    assert catalog.copies(br1, book_a) == 7
+    items = catalog.copies_batch([
+        BranchBookPair(branch_id=br2, book_id=book_b),
+        BranchBookPair(branch_id=br1, book_id=book_b),
+        BranchBookPair(branch_id=MISSING, book_id=book_a),
+        BranchBookPair(branch_id=br1, book_id=MISSING),
+    ])
+    assert [(x.copies, x.error) for x in items] == [
+        (1, None), (0, None), (None, "Филиал не найден"), (None, "Книга не найдена"),
+    ]
+
+
+def test_book_faculties(catalog, linked):
+    br1, br2, book_a, book_b = linked["br1"], linked["br2"], linked["book_a"], linked["book_b"]
+    fac1, fac2 = linked["fac1"], linked["fac2"]
+    result = catalog.book_faculties(br2, book_b)
+    assert [f.id for f in result.faculties] == [fac1, fac2]
+    assert result.faculty_count == 2
+    assert catalog.book_faculties(br1, book_b).faculties == []
+
+    page = catalog.branch_book_faculties(br2, None, 10)
+    assert [(x.book_id, x.faculty_count) for x in page] == [(book_a, 1), (book_b, 2)]
+    assert [x.book_id for x in catalog.branch_book_faculties(br2, book_a, 0)] == [book_b]
+
+    batch = catalog.book_faculties_batch(br1, [book_b, book_a, MISSING, book_a])
+    assert [(x.book_id, x.faculty_count) for x in batch] == [(book_a, 1), (book_b, 0)]
+
+
+def test_faculty_links(catalog, linked):
+    br1, book_b, fac1, fac2 = linked["br1"], linked["book_b"], linked["fac1"], linked["fac2"]
+    link = BookFacultyLink(branch_id=br1, book_id=book_b, faculty_id=fac2)
+    added = catalog.add_faculty_links([
+        link,
+        link,
+        link.model_copy(update={"faculty_id": fac1}),
+        link.model_copy(update={"branch_id": MISSING}),
+        link.model_copy(update={"book_id": MISSING}),
+        link.model_copy(update={"faculty_id": MISSING}),
+    ])
+    assert [(x.status, x.error) for x in added] == [
+        ("added", None),
+        ("exists", None),
+        ("added", None),
+        ("error", "Филиал не найден"),
+        ("error", "Книга не найдена"),
+        ("error", "Факультет не найден"),
+    ]
+    # книга без остатка, но с привязкой — тоже книга филиала
+    assert book_b in [x.book_id for x in catalog.branch_book_faculties(br1, None, 10)]
+
+    removed = catalog.remove_faculty_links([link, link, link.model_copy(update={"faculty_id": MISSING})])
+    assert [x.status for x in removed] == ["removed", "absent", "error"]
+    assert [f.id for f in catalog.book_faculties(br1, book_b).faculties] == [fac1]
+    catalog.remove_faculty_links([link.model_copy(update={"faculty_id": fac1})])
+    assert book_b not in [x.book_id for x in catalog.branch_book_faculties(br1, None, 10)]
+
+
+def test_faculty_books(catalog, linked):
+    br1, br2, book_a, book_b = linked["br1"], linked["br2"], linked["book_a"], linked["book_b"]
+    fac1, fac2 = linked["fac1"], linked["fac2"]
+
+    rows = rows_to_dicts(catalog.faculty_books(fac1, None, None, 10), FacultyBook)
+    assert [(x["id"], x["copies"], x["branch_ids"]) for x in rows] == [(book_a, 5, [br1, br2]), (book_b, 1, [br2])]
+    assert rows[0]["title"] == catalog.get_book(book_a).title
+
+    rows = catalog.faculty_books(fac1, br2, None, 10)
+    assert [(r.id, r.copies, r.branch_ids) for r in rows] == [(book_a, 3, [br2]), (book_b, 1, [br2])]
+    assert [r.id for r in catalog.faculty_books(fac1, None, book_a, 0)] == [book_b]
+    assert [r.id for r in catalog.faculty_books(fac2, br1, None, 10)] == []
+
+    catalog.remove_faculty_links([BookFacultyLink(branch_id=br1, book_id=book_a, faculty_id=fac1)])
+    assert [(r.id, r.branch_ids) for r in catalog.faculty_books(fac1, None, None, 10)] == [
+        (book_a, [br2]), (book_b, [br2]),
+    ]
+    assert catalog.faculty_books(fac1, br1, None, 10) == []
+
+
+@pytest.fixture()
+def memory_backend(client, monkeypatch):
+    """Эндпоинты на каталоге в памяти со снимком тестовой БД (как CATALOG_BACKEND=memory)."""
+    memory = MemoryCatalog()
+    with SessionLocal() as db:
+        memory.load(db)
+    monkeypatch.setattr(repository, "CATALOG_BACKEND", "memory")
+    monkeypatch.setattr(repository, "memory_catalog", memory)
+    return memory
+
+
+@pytest.mark.skipif(get_db_mode() == "async", reason="каталог в памяти — только для sync-эндпоинтов")
+def test_endpoints_on_memory_backend(client, memory_backend, seeded_ids, tag):
+    branch_id, book_id = seeded_ids["main_branch_id"], seeded_ids["book1_id"]
+    copies = client.get(f"/branches/{branch_id}/books/{book_id}/copies").json()["copies"]
+    faculties = client.get(f"/branches/{branch_id}/books/{book_id}/faculties").json()
+    assert faculties["faculty_count"] == 2
+
+    # запись — в PostgreSQL с id из БД, и сразу видна из памяти
+    created = client.post("/books", json={"title": f"Memory {tag}", "author": "M"}).json()
+    assert memory_backend.get_book(created["id"]).title == created["title"]
+    assert client.get(f"/books/{created['id']}").json() == created
+    with SessionLocal() as db:
+        assert db.scalar(select(BookORM.id).where(BookORM.title == created["title"])) == created["id"]
+
+    assert client.get("/books", params={"after_id": created["id"] - 1}).json() == [created]
+    streamed = client.get("/books", params={"after_id": created["id"] - 1, "stream": True}).text
+    assert [json.loads(line) for line in streamed.splitlines()] == [created]
+
+    # выдача и возврат меняют остаток и в БД, и в памяти
+    loan = client.post(f"/branches/{branch_id}/books/{book_id}/checkout", json={"student_id": "memory"}).json()
+    assert memory_backend.copies(branch_id, book_id) == copies - 1
+    client.post(f"/loans/{loan['id']}/checkin")
+    assert memory_backend.copies(branch_id, book_id) == copies
+    with SessionLocal() as db:
+        assert SqlCatalog(db).copies(branch_id, book_id) == copies
+
+    # импорт перечитывает книги
+    r = client.post("/books/import", content=f"title,author,year\nMemory import {tag},M,2001\n".encode(),
+                    headers={"Content-Type": "text/csv"})
+    assert r.json()["inserted"] == 1
+    imported = client.get("/books", params={"after_id": created["id"]}).json()
+    assert [b["title"] for b in imported] == [f"Memory import {tag}"]
+
+
+_INTEGRATION = Path(__file__).parent
+
+
+@pytest.mark.skipif(
+    get_db_mode() == "async" or repository.CATALOG_BACKEND == "memory",
+    reason="каталог в памяти — только для sync-эндпоинтов; внутри прогона не повторяется",
+)
+def test_api_suite_on_memory_backend():
+    """Весь набор интеграционных тестов API с CATALOG_BACKEND=memory — отдельным процессом."""
+    env = {**os.environ, "CATALOG_BACKEND": "memory"}
+    result = subprocess.run(  # nosec B603 - тот же интерпретатор, аргументы фиксированы
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", str(_INTEGRATION)],
+        env=env, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout[-5000:] + result.stderr[-2000:]
@@ -0,0 +1,77 @@
+import asyncio
+
+from fastapi.routing import APIRoute
+
+from src import admission
+from src.admission import Limiter
+from src.main import app
+
+
+def test_route_classes():
+    assert admission.route_class("GET", "/health") is None
+    assert admission.route_class("GET", "/books/{book_id}") == admission.READ
+    assert admission.route_class("GET", "/books") == admission.BULK
+    assert admission.route_class("POST", "/books") == admission.WRITE
+    assert admission.route_class("POST", "/copies/batch") == admission.OPS
+    assert admission.route_class("POST", "/branches/{branch_id}/books/{book_id}/faculties/{faculty_id}") == (
+        admission.WRITE
+    )
+
+
+def test_listed_paths_exist():
+    # переименованный маршрут молча уехал бы в read/write
+    paths = {(m, r.path) for r in app.routes if isinstance(r, APIRoute) for m in r.methods}
+    assert admission.BULK_ROUTES <= paths
+    assert admission.OPS_PATHS <= {path for _, path in paths}
+
+
+def test_limit_queue_and_fifo_handoff():
+    async def scenario():
+        limiter = Limiter("t", limit=1, queue=2, timeout=1)
+        assert await limiter.acquire()
+        order = []
+
+        async def waiter(i):
+            assert await limiter.acquire()
+            order.append(i)
+            limiter.release()
+
+        tasks = [asyncio.create_task(waiter(i)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+        # очередь полна — отказ сразу, без ожидания
+        assert not await limiter.acquire()
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == [0, 1]
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_queue_timeout():
+    async def scenario():
+        limiter = Limiter("t", limit=1, queue=4, timeout=0.05)
+        await limiter.acquire()
+        admitted = await limiter.acquire()
+        return admitted, limiter.stats()
+
+    admitted, stats = asyncio.run(scenario())
+    assert not admitted
+    assert stats["active"] == 1 and stats["waiting"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        limiter = Limiter("t", limit=1, queue=4, timeout=1)
+        await limiter.acquire()
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["waiting"] == 0
@@ -0,0 +1,42 @@
+from src.bulk_import import _validate, iter_lines, iter_records
+
+
+def test_iter_lines_handles_split_chunks_and_utf8():
+    data = "title,author\nАлгоритмы,Кормен\nlast,no newline".encode()
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+    assert list(iter_lines(chunks)) == ["title,author\n", "Алгоритмы,Кормен\n", "last,no newline"]
+
+
+def test_iter_lines_strips_bom():
+    assert list(iter_lines([b"\xef\xbb\xbftitle\n"])) == ["title\n"]
+
+
+def test_csv_records_with_quoted_newline_and_errors():
+    lines = iter_lines([b'title,author,year\n"A\nB",X,2001\nC,Y,\nD,Z,1,extra\n'])
+    records = list(iter_records(lines, "csv"))
+    assert records[0] == (3, {"title": "A\nB", "author": "X", "year": "2001"}, None)
+    assert records[1] == (4, {"title": "C", "author": "Y", "year": None}, None)
+    assert records[2][0] == 5
+    assert records[2][2] is not None
+
+
+def test_csv_requires_header_columns():
+    records = list(iter_records(iter_lines([b"name,year\nx,1\n"]), "csv"))
+    assert len(records) == 1
+    assert "title" in records[0][2]
+
+
+def test_ndjson_records():
+    lines = iter_lines([b'{"title": "A", "author": "B"}\n\nnot json\n[1]\n'])
+    records = list(iter_records(lines, "ndjson"))
+    assert records[0] == (1, {"title": "A", "author": "B"}, None)
+    assert [r[0] for r in records[1:]] == [3, 4]
+    assert all(r[2] for r in records[1:])
+
+
+def test_validate():
+    assert _validate({"title": " A ", "author": "B", "year": "2001"}) == (("A", "B", 2001), None)
+    assert _validate({"title": "A"})[1].startswith("author")
+    assert _validate({"title": "A", "author": "B", "year": "soon"})[1].startswith("year")
+    assert _validate({"title": " ", "author": "B"})[1] is not None
+    assert _validate({"title": "x" * 256, "author": "B"})[1] is not None
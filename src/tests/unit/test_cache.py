@@ -0,0 +1,79 @@
+from src.cache import TTLLRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_set_and_counters():
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TTLLRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_expiration():
+    clock = FakeClock()
+    cache = TTLLRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_invalidate_where_is_precise():
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+    cache.set(("copies", 1, 10), "x")
+    cache.set(("faculties", 1, 10), "y")
+    cache.set(("copies", 2, 20), "z")
+
+    cache.invalidate_where(lambda key: key[2] == 10)
+
+    assert cache.get(("copies", 1, 10)) is None
+    assert cache.get(("faculties", 1, 10)) is None
+    assert cache.get(("copies", 2, 20)) == "z"
+    assert cache.invalidations == 2
+
+
+def test_set_skipped_when_invalidated_during_read():
+    cache = TTLLRUCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate("a")  # запись случилась, пока читатель ходил в БД
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+
+    cache.set("a", "fresh", cache.generation)
+    assert cache.get("a") == "fresh"
+
+
+def test_zero_size_disables_cache():
+    cache = TTLLRUCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,44 @@
+from sqlalchemy.pool import NullPool, QueuePool
+
+from src import db
+
+
+def test_default_options(monkeypatch):
+    monkeypatch.setattr(db, "POOL_CLASS", "queue")
+    monkeypatch.setattr(db, "PGBOUNCER", False)
+    monkeypatch.setattr(db, "POOL_SIZE", 7)
+    options = db.engine_options()
+    assert options["pool_size"] == 7
+    assert options["max_overflow"] == db.MAX_OVERFLOW
+    assert "connect_args" not in options
+    assert issubclass(options.get("poolclass", QueuePool), QueuePool)
+
+
+def test_pgbouncer_null_pool(monkeypatch):
+    monkeypatch.setattr(db, "POOL_CLASS", "null")
+    monkeypatch.setattr(db, "PGBOUNCER", True)
+    options = db.engine_options(asyncio=True)
+    assert options["poolclass"] is NullPool
+    assert options["connect_args"] == {"prepare_threshold": None}
+    # у NullPool нет размера — параметры QueuePool он не принимает
+    assert "pool_size" not in options
+
+
+def test_session_limit(monkeypatch):
+    monkeypatch.setattr(db, "POOL_CLASS", "queue")
+    assert db.session_limit() == db.POOL_SIZE + db.MAX_OVERFLOW
+    # без пула сессии не ждут соединения: потолок только явный
+    monkeypatch.setattr(db, "POOL_CLASS", "null")
+    monkeypatch.setattr(db, "MAX_SESSIONS", 0)
+    assert db.session_limit() is None
+    monkeypatch.setattr(db, "MAX_SESSIONS", 200)
+    assert db.session_limit() == 200
+
+
+def test_env_flag(monkeypatch):
+    monkeypatch.setenv("X_FLAG", "0")
+    assert db._env_flag("X_FLAG", True) is False
+    monkeypatch.setenv("X_FLAG", "yes")
+    assert db._env_flag("X_FLAG", False) is True
+    monkeypatch.delenv("X_FLAG")
+    assert db._env_flag("X_FLAG", True) is True
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.error_hooks import (
+    CLIENT_ERROR,
+    EXCEPTION,
+    SAMPLE,
+    SERVER_ERROR,
+    ErrorEvent,
+    ErrorPipeline,
+)
+from src.metrics import ERROR_DROPPED, ERROR_FAILURES
+
+
+def _event(kind=CLIENT_ERROR, status=404, body=b"", exc=None):
+    return ErrorEvent(kind, status, "GET", "/books/{book_id}", "/books/1", time.time(), body, exc)
+
+
+class RecordingSink:
+    name = "recording"
+
+    def __init__(self, gate: threading.Event | None = None):
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = gate
+
+    def write(self, batch):
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(batch))
+
+
+def test_events_are_delivered_in_batches():
+    sink = RecordingSink()
+    pipeline = ErrorPipeline([sink], batch_size=3, flush_interval=0.5)
+    for _ in range(7):
+        pipeline.emit(_event())
+    assert pipeline.flush()
+    assert sum(len(b) for b in sink.batches) == 7
+    assert max(len(b) for b in sink.batches) == 3
+
+
+def test_slow_sink_does_not_block_emit_and_overflow_drops():
+    gate = threading.Event()
+    sink = RecordingSink(gate)
+    pipeline = ErrorPipeline([sink], queue_size=4, flush_interval=0)
+    dropped = ERROR_DROPPED.value("overflow")
+
+    pipeline.emit(_event())
+    assert sink.entered.wait(5)  # поток доставки завис в sink
+    started = time.perf_counter()
+    for _ in range(6):
+        pipeline.emit(_event())
+    assert time.perf_counter() - started < 0.1
+    assert pipeline.depth == 4
+    assert ERROR_DROPPED.value("overflow") - dropped == 2
+
+    gate.set()
+    assert pipeline.flush()
+    assert sum(len(b) for b in sink.batches) == 5
+
+
+@pytest.mark.parametrize("rate, accepted", [(0.0, 2), (1.0, 4)])
+def test_sample_overflow(rate, accepted):
+    gate = threading.Event()
+    sink = RecordingSink(gate)
+    pipeline = ErrorPipeline([sink], queue_size=4, flush_interval=0, overflow=SAMPLE, sample_rate=rate)
+    pipeline.emit(_event())
+    assert sink.entered.wait(5)
+    # с половины очереди принимается доля rate, дальше полной очереди — ничего
+    for _ in range(6):
+        pipeline.emit(_event())
+    assert pipeline.depth == accepted
+    gate.set()
+    assert pipeline.flush()
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        ErrorPipeline(overflow="block")
+
+
+def test_hooks_by_kind_and_failure_isolation():
+    sink = RecordingSink()
+    pipeline = ErrorPipeline([sink], flush_interval=0)
+    seen = {EXCEPTION: [], "all": []}
+    pipeline.register(lambda e: seen[EXCEPTION].append(e.status), EXCEPTION)
+    pipeline.register(lambda e: seen["all"].append(e.kind))
+
+    @pipeline.on_error(SERVER_ERROR)
+    def broken(event):
+        raise RuntimeError("hook bug")
+
+    failures = ERROR_FAILURES.value("hook")
+    pipeline.emit(_event())
+    pipeline.emit(_event(SERVER_ERROR, 503))
+    pipeline.emit(_event(EXCEPTION, 500, exc=ValueError("boom")))
+    assert pipeline.flush()
+
+    assert seen == {EXCEPTION: [500], "all": [CLIENT_ERROR, SERVER_ERROR, EXCEPTION]}
+    assert ERROR_FAILURES.value("hook") - failures == 1
+    assert sum(len(b) for b in sink.batches) == 3
+
+    pipeline.unregister(broken)
+    pipeline.emit(_event(SERVER_ERROR, 503))
+    assert pipeline.flush()
+    assert ERROR_FAILURES.value("hook") - failures == 1
+
+
+def test_event_detail_and_error():
+    assert _event(body=json.dumps({"detail": "Книга не найдена"}).encode()).detail == "Книга не найдена"
+    validation = _event(status=422, body=json.dumps({"detail": [{"loc": ["query", "limit"]}]}).encode())
+    assert json.loads(validation.detail) == [{"loc": ["query", "limit"]}]
+    assert _event(status=503, body=b"Service Unavailable").detail == "Service Unavailable"
+    assert _event().detail is None and _event().error is None
+
+    try:
+        raise ValueError("boom")
+    except ValueError as exc:
+        failed = _event(EXCEPTION, 500, exc=exc)
+    assert failed.detail == "boom"
+    assert failed.error.startswith("Traceback") and "ValueError: boom" in failed.error
+    assert failed.to_dict()["kind"] == EXCEPTION
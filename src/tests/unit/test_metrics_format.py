@@ -0,0 +1,32 @@
+from src.metrics import Counter, Histogram, Registry, gauge
+
+
+def test_histogram_render():
+    h = Histogram("t_seconds", "help", ("route",), buckets=(0.1, 1.0))
+    h.observe(0.05, "/a")
+    h.observe(0.5, "/a")
+    h.observe(5.0, "/a")
+    lines = list(h.render())
+    assert 't_seconds_bucket{route="/a",le="0.1"} 1.0' in lines
+    assert 't_seconds_bucket{route="/a",le="1.0"} 2.0' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 3.0' in lines
+    assert 't_seconds_sum{route="/a"} 5.55' in lines
+    assert 't_seconds_count{route="/a"} 3.0' in lines
+    assert h.count("/a") == 3
+
+
+def test_bucket_bound_is_inclusive():
+    h = Histogram("t", "help", buckets=(1, 2))
+    h.observe(1)
+    assert "t_bucket{le=\"1\"} 1.0" in list(h.render())
+
+
+def test_label_escaping_and_registry():
+    registry = Registry()
+    c = registry.register(Counter("c_total", "help", ("path",)))
+    c.inc(2, 'a"b\\c')
+    registry.add_collector(lambda: gauge("g", "help", [({"pool": "sync"}, 3)]))
+    text = registry.render()
+    assert 'c_total{path="a\\"b\\\\c"} 2.0' in text
+    assert 'g{pool="sync"} 3' in text
+    assert text.endswith("\n")
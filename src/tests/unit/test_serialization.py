@@ -0,0 +1,44 @@
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+from src import serialization
+from src.schemas import Book, Faculty
+
+
+def _rows(columns, values):
+    return IteratorResult(SimpleResultMetaData(columns), iter(values)).all()
+
+
+# колонки в порядке select(...), а не в порядке полей схемы
+BOOK_ROWS = [(1, "Война и мир", "Толстой", 1869), (2, 'Кавычки "и" \\ слэш', "Anon", None)]
+
+
+def test_body_matches_pydantic():
+    rows = _rows(["id", "title", "author", "year"], BOOK_ROWS)
+    expected = TypeAdapter(List[Book]).dump_json([Book(**r._mapping) for r in rows])
+    assert serialization.dumps(serialization.rows_to_dicts(rows, Book)) == expected
+
+
+def test_stdlib_fallback_matches(monkeypatch):
+    rows = _rows(["id", "title", "author", "year"], BOOK_ROWS)
+    expected = TypeAdapter(List[Book]).dump_json([Book(**r._mapping) for r in rows])
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.dumps(serialization.rows_to_dicts(rows, Book)) == expected
+
+
+def test_single_field_model_and_empty():
+    assert serialization.rows_to_dicts([], Faculty) == []
+    rows = _rows(["id", "name"], [(3, "ФКН")])
+    assert serialization.rows_to_dicts(rows, Faculty) == [{"id": 3, "name": "ФКН"}]
+
+
+def test_json_rows_keeps_endpoint_headers():
+    response = Response()
+    response.headers["X-Next-Cursor"] = "abc"
+    result = serialization.json_rows(_rows(["id", "name"], [(1, "x")]), Faculty, response)
+    assert result.headers["x-next-cursor"] == "abc"
+    assert result.media_type == "application/json"
+    assert result.body == b'[{"id":1,"name":"x"}]'
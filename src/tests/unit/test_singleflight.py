@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+    started = threading.Event()
+
+    def load():
+        nonlocal calls
+        calls += 1
+        started.set()
+        time.sleep(0.1)
+        return "value"
+
+    with ThreadPoolExecutor(8) as pool:
+        leader = pool.submit(flight.do, "k", load)
+        started.wait()
+        followers = [pool.submit(flight.do, "k", load) for _ in range(7)]
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == ["value"] * 8
+    assert calls == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 7}
+    # после завершения ключ свободен — следующий вызов идёт в БД заново
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_exception_is_shared():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.05)
+        raise LookupError("нет")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", fail)
+        started.wait()
+        follower = pool.submit(flight.do, "k", fail)
+        for future in (leader, follower):
+            with pytest.raises(LookupError):
+                future.result()
+
+
+def test_async_concurrent_calls_share_one_execution():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", load) for _ in range(10)))
+
+    assert asyncio.run(main()) == [1] * 10
+    assert flight.stats() == {"leaders": 1, "coalesced": 9}
+
+
+def test_async_follower_takes_over_when_leader_cancelled():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", load))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert calls == 2
+    assert flight.stats() == {"leaders": 2, "coalesced": 0}